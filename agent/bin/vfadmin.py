@@ -3,10 +3,14 @@ import sys
 import platform
 import subprocess
 import argparse
+import datetime
 
 
 _system = platform.system().lower()
 
+_agent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_agent_db = os.path.join(_agent_dir, 'db', 'agent.adb')
+
 _mac_plist_path = '/System/Library/LaunchDaemons/com.vfense.agent.plist'
 
 
@@ -140,6 +144,72 @@ def delete_agent():
         print error
 
 
+def _parse_time(value):
+    """ Accepts 'yyyy-mm-dd', 'yyyy-mm-dd hh:mm:ss' or a relative time such
+    as '7d', '12h' or '30m' (meaning that long ago).
+    """
+
+    if value is None:
+        return None
+
+    units = {'d': 86400, 'h': 3600, 'm': 60, 's': 1}
+
+    if value[-1] in units and value[:-1].isdigit():
+        seconds = int(value[:-1]) * units[value[-1]]
+        return datetime.datetime.now() - datetime.timedelta(seconds=seconds)
+
+    for time_format in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.datetime.strptime(value, time_format)
+        except ValueError:
+            pass
+
+    raise argparse.ArgumentTypeError('Invalid time: %s' % value)
+
+
+def _history_line(row):
+    """ One row of OperationHistory.query() as printed by -history. """
+
+    latency = row['latency']
+    if latency is not None:
+        latency = '%.1fs' % latency
+
+    return '%-26s  %-24s  %-6s  %8s  %s' % (
+        row['received'], row['operation_type'], row['status'],
+        latency or '-', row['operation_id'])
+
+
+def operation_history(args):
+
+    sys.path.insert(0, _agent_dir)
+    from src.data.operationhistory import OperationHistory
+
+    if not os.path.exists(_agent_db):
+        print 'Agent database not found: %s' % _agent_db
+        return
+
+    history = OperationHistory(db_path=_agent_db)
+
+    filters = {
+        'operation_type': args.type,
+        'since': args.since,
+        'until': args.until,
+        'status': args.status,
+        'min_latency': args.min_latency
+    }
+
+    if args.count:
+        print history.count(**filters)
+        return
+
+    rows = history.query(limit=args.limit, **filters)
+
+    for row in rows:
+        print _history_line(row)
+
+    print '%s operation(s).' % len(rows)
+
+
 if __name__== "__main__":
 
 
@@ -172,6 +242,38 @@ if __name__== "__main__":
             '(ie: On OSX the plist; On Linux the init.d script)'
         )
     )
+
+    parser.add_argument(
+        '-history',
+        action="store_true",
+        help=(
+            'Queries the operation history. '
+            '(ie: -history --type install_os_apps --since 7d '
+            '--min-latency 600, or -history --status unsent --count)'
+        )
+    )
+    parser.add_argument('--type', help='Operation type to filter by.')
+    parser.add_argument(
+        '--since', type=_parse_time,
+        help="Received at or after. 'yyyy-mm-dd' or relative like '7d'."
+    )
+    parser.add_argument(
+        '--until', type=_parse_time,
+        help="Received at or before. 'yyyy-mm-dd' or relative like '12h'."
+    )
+    parser.add_argument(
+        '--status', choices=['sent', 'unsent'],
+        help='Whether the results reached the server.'
+    )
+    parser.add_argument(
+        '--min-latency', type=float,
+        help='Minimum seconds between receiving and answering.'
+    )
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument(
+        '--count', action="store_true",
+        help='Only print the amount of matching operations.'
+    )
     args = parser.parse_args()
 
     # if os.geteuid() != 0:
@@ -189,10 +291,13 @@ if __name__== "__main__":
     elif args.delete:
         delete_agent()
 
+    elif args.history:
+        operation_history(args)
+
     else:
         print (
             'Please provide a valid action to perform: %s ' %
-            '(-start, -stop, -restart, -delete)'
+            '(-start, -stop, -restart, -delete, -history)'
         )
 
 
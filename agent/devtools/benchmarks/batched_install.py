@@ -0,0 +1,100 @@
+"""
+Benchmarks installing packages one apt transaction each, as install_update
+does, against a single transaction for all of them, as install_updates
+does.
+
+Builds the given amount of empty packages with dpkg-deb, installs them
+both ways and purges them again. Needs root and a Debian based host; the
+packages are installed from local files, so no repository is involved.
+
+Run from the agent directory:
+
+    sudo python devtools/benchmarks/batched_install.py [packages]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+APT_GET = '/usr/bin/apt-get'
+PREFIX = 'vfense-bench'
+
+_control = """Package: {name}
+Version: 1.0
+Architecture: all
+Maintainer: vFense <bench@example.com>
+Description: Empty package for benchmarking installs.
+"""
+
+
+def _run(cmd):
+    with open(os.devnull, 'w') as dev_null:
+        subprocess.check_call(cmd, stdout=dev_null, stderr=dev_null)
+
+
+def _build_packages(work_dir, count):
+    debs = []
+
+    for i in xrange(count):
+        name = '{0}-{1}'.format(PREFIX, i)
+        package_dir = os.path.join(work_dir, name)
+
+        os.makedirs(os.path.join(package_dir, 'DEBIAN'))
+        with open(os.path.join(package_dir, 'DEBIAN', 'control'), 'w') as f:
+            f.write(_control.format(name=name))
+
+        deb = os.path.join(work_dir, name + '.deb')
+        _run(['dpkg-deb', '--build', package_dir, deb])
+        debs.append(deb)
+
+    return debs
+
+
+def _purge(count):
+    _run(['dpkg', '--purge'] +
+         ['{0}-{1}'.format(PREFIX, i) for i in xrange(count)])
+
+
+def _timed(label, func, *args):
+    start = time.time()
+    func(*args)
+    elapsed = time.time() - start
+
+    print '%-45s %10.3f s' % (label, elapsed)
+
+    return elapsed
+
+
+def _one_by_one(debs):
+    for deb in debs:
+        _run([APT_GET, 'install', '-y', deb])
+
+
+def _batched(debs):
+    _run([APT_GET, 'install', '-y'] + debs)
+
+
+def main(count):
+    work_dir = tempfile.mkdtemp()
+
+    try:
+        debs = _build_packages(work_dir, count)
+
+        print 'Packages: %s' % count
+
+        serial = _timed('one apt-get install per package', _one_by_one, debs)
+        _purge(count)
+
+        batched = _timed('one apt-get install for all', _batched, debs)
+        _purge(count)
+
+        print '%-45s %10.1f x' % ('speedup', serial / batched)
+
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,138 @@
+"""
+Benchmarks the rpm inventory: 'rpm -qa' followed by one 'rpm -q' per
+package, as get_installed_applications used to do, against the single
+'rpm -qa --queryformat' query of rpmdb.RpmDb, and against RpmDb's cache.
+
+Runs anywhere: a stand-in 'rpm' shell script answers from a synthetic
+fixture of the given amount of packages, so only the cost of the
+subprocesses and of the parsing is measured, not rpm's own database work
+(which the per-package approach also repeats for every package).
+
+Run from the agent directory:
+
+    python devtools/benchmarks/rpm_inventory.py [packages]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.getcwd())
+
+from src.utils import utilcmds
+from plugins.patching.distro.redhat import rpmdb
+
+# -qa --queryformat FORMAT: the whole fixture. -qa: the names.
+# -q NAME --queryformat FORMAT: that package's record.
+_fake_rpm = """#!/bin/sh
+if [ "$1" = "-qa" ]; then
+    if [ "$2" = "--queryformat" ]; then
+        exec cat "{fixture_dir}/all"
+    fi
+    exec cat "{fixture_dir}/names"
+fi
+exec cat "{fixture_dir}/packages/$2"
+"""
+
+_old_separator = '**!VFENSE!**'
+_old_query_format = (
+    '"%{{NAME}}{0}%{{VERSION}}-%{{RELEASE}}{0}%{{INSTALLTIME}}'
+    '{0}%{{BUILDTIME}}{0}%{{SIZE}}{0}%{{VENDOR}}{0}'
+    '%{{URL}}{0}%{{DESCRIPTION}}"'.format(_old_separator)
+)
+
+
+def _package(i):
+    return (
+        'package-%s' % i,
+        '1.%s-1.el7' % i,
+        str(1400000000 + i),
+        str(1390000000 + i),
+        str(1000 * i),
+        'CentOS',
+        'http://example.com/%s' % i,
+        'Package %s.\nA description\nover several lines.' % i
+    )
+
+
+def _write_fixture(fixture_dir, count):
+    os.makedirs(os.path.join(fixture_dir, 'packages'))
+
+    with open(os.path.join(fixture_dir, 'all'), 'w') as all_file:
+        with open(os.path.join(fixture_dir, 'names'), 'w') as names_file:
+            for i in xrange(count):
+                fields = _package(i)
+                full_name = '%s-%s' % fields[:2]
+
+                all_file.write(
+                    rpmdb.FIELD_SEPARATOR.join(fields) +
+                    rpmdb.RECORD_SEPARATOR
+                )
+                names_file.write(full_name + '\n')
+
+                record = os.path.join(fixture_dir, 'packages', full_name)
+                with open(record, 'w') as _file:
+                    _file.write('"%s"' % _old_separator.join(fields))
+
+    rpm = os.path.join(fixture_dir, 'rpm')
+    with open(rpm, 'w') as _file:
+        _file.write(_fake_rpm.format(fixture_dir=fixture_dir))
+    os.chmod(rpm, 0755)
+
+    return rpm
+
+
+def _per_package(rpm):
+    cmds = utilcmds.UtilCmds()
+
+    output, _ = cmds.run_command([rpm, '-qa'])
+
+    packages = []
+    for name in output.splitlines():
+        output, _ = cmds.run_command(
+            [rpm, '-q', name, '--queryformat', _old_query_format]
+        )
+        packages.append(output.split(_old_separator))
+
+    return packages
+
+
+def _timed(label, func, *args):
+    start = time.time()
+    result = func(*args)
+    elapsed = time.time() - start
+
+    print '%-45s %10.3f s' % (label, elapsed)
+
+    return result, elapsed
+
+
+def main(count):
+    work_dir = tempfile.mkdtemp()
+
+    try:
+        rpmdb.RPM = _write_fixture(work_dir, count)
+
+        # Stands in for the rpm database files.
+        db_file = os.path.join(work_dir, 'all')
+        db = rpmdb.RpmDb([db_file])
+
+        print 'Packages: %s' % count
+
+        old, per_package = _timed(
+            'rpm -qa + one rpm -q per package', _per_package, rpmdb.RPM
+        )
+        new, single = _timed('single rpm -qa --queryformat', db.packages)
+        _, cached = _timed('RpmDb, database unchanged', db.packages)
+
+        assert len(old) == len(new) == count
+
+        print '%-45s %10.1f x' % ('speedup, single query', per_package / single)
+
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,133 @@
+"""
+Benchmarks the operations table of the agent db.
+
+Compares the old access pattern (rollback journal, one commit per
+operation, string built UPDATE without an index) with SqliteManager
+(WAL, batched inserts, parameterized UPDATE on an indexed operation_id).
+
+Run from the agent directory:
+
+    python devtools/benchmarks/sqlite_operations.py [rows]
+"""
+import os
+import sys
+import time
+import uuid
+import shutil
+import sqlite3
+import datetime
+import tempfile
+
+sys.path.insert(0, os.getcwd())
+
+from src.utils import settings
+from src.data import sqlitemanager
+
+
+class _Operation():
+
+    def __init__(self):
+        self.type = 'install_os_apps'
+        self.id = str(uuid.uuid4())
+        self.raw_operation = '{"operation": "install_os_apps"}'
+        self.raw_result = '{"success": "true"}'
+
+
+def _timed(label, func, *args):
+    start = time.time()
+    result = func(*args)
+    print '%-45s %10.3f s' % (label, time.time() - start)
+
+    return result
+
+
+def _legacy_insert(connection, operations):
+    for op in operations:
+        with connection:
+            connection.execute(
+                "INSERT INTO operations (%s) VALUES (?, ?, ?, ?, ?, ?, ?)" %
+                sqlitemanager.OperationColumn.AllColumns,
+                (op.type, op.id, op.raw_operation, '',
+                 str(datetime.datetime.now()), '', False)
+            )
+
+
+def _legacy_edit(connection, operations):
+    for op in operations:
+        with connection:
+            connection.execute(
+                "UPDATE operations SET raw_result = '%s' "
+                "WHERE operation_id = '%s'" % (op.raw_result, op.id)
+            )
+
+
+def _tuned_insert(manager, operations):
+    for op in operations:
+        manager.add_operation(op, str(datetime.datetime.now()))
+
+    manager.flush()
+
+
+def _tuned_edit(manager, operations):
+    for op in operations:
+        manager.edit_operation(op, True, str(datetime.datetime.now()))
+
+
+def main(rows):
+    work_dir = tempfile.mkdtemp()
+    sample = 2000
+
+    try:
+        print 'Rows: %s (per-row commit costs measured on %s rows)' % (
+            rows, sample)
+
+        # Old pattern.
+        settings.AgentDb = os.path.join(work_dir, 'legacy.adb')
+        legacy = sqlite3.connect(settings.AgentDb)
+        legacy.execute(
+            "CREATE TABLE operations (id INTEGER NOT NULL PRIMARY KEY "
+            "AUTOINCREMENT, operation_type TEXT NULL, operation_id TEXT NULL,"
+            " raw_operation TEXT NULL, raw_result TEXT NULL, "
+            "datetime_received TEXT NULL, datetime_sent TEXT NULL, "
+            "results_sent BOOL NULL)"
+        )
+
+        ops = [_Operation() for _ in xrange(sample)]
+        _timed('legacy: %s inserts, commit each' % sample,
+               _legacy_insert, legacy, ops)
+
+        fill = [_Operation() for _ in xrange(rows - sample)]
+        with legacy:
+            legacy.executemany(
+                "INSERT INTO operations (%s) VALUES (?, ?, ?, ?, ?, ?, ?)" %
+                sqlitemanager.OperationColumn.AllColumns,
+                [(op.type, op.id, op.raw_operation, '', '', '', False)
+                 for op in fill]
+            )
+
+        _timed('legacy: 100 edits at %s rows, no index' % rows,
+               _legacy_edit, legacy, ops[:100])
+        legacy.close()
+
+        # SqliteManager.
+        settings.AgentDb = os.path.join(work_dir, 'tuned.adb')
+        manager = sqlitemanager.SqliteManager()
+
+        _timed('tuned: %s inserts, batched' % sample,
+               _tuned_insert, manager, ops)
+        _timed('tuned: %s inserts, batched' % (rows - sample),
+               _tuned_insert, manager, fill)
+        _timed('tuned: 100 edits at %s rows, indexed' % rows,
+               _tuned_edit, manager, ops[:100])
+        _timed('tuned: retention down to %s rows' % (rows / 10),
+               manager.apply_retention, 3650, rows / 10)
+
+        print 'db size after retention: %.1f MB' % (
+            os.path.getsize(settings.AgentDb) / 1024.0 / 1024.0)
+
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import zlib
+import base64
+
+from src.utils import settings, logger
+from src.serveroperation.sofoperation import OperationKey, ResponseUris
+
+
+class LogChunkKey():
+    # The corresponding SOF equivalent. (Case sensitive)
+    FileName = 'file_name'
+    FileSize = 'file_size'
+    Offset = 'offset'
+    Length = 'length'
+    Encoding = 'encoding'
+    Content = 'content'
+    LastChunk = 'last_chunk'
+    Truncated = 'truncated'
+
+
+class AgentLogUploader():
+    """Streams agent log files to the server in compressed chunks.
+
+    Each chunk is read, compressed and sent on its own, so a log file is
+    never held in memory as a whole nor placed in the result queue. The
+    offset of the last chunk acknowledged by the server is saved to
+    settings.log_upload_file, which lets a retrieval for the same operation
+    resume where it left off.
+    """
+
+    Encoding = 'zlib+base64'
+
+    def __init__(self, send_message, chunk_size=None, max_bytes=None,
+                 retries=3):
+        """
+        Args:
+            send_message (function): Callback used to send a message to the
+                server. Must accept the data, uri and request method.
+            chunk_size (int): Uncompressed bytes read per chunk.
+            max_bytes (int): Cap on the uncompressed bytes sent for a
+                single retrieval. The newest log content is kept.
+            retries (int): Attempts made for each chunk before giving up.
+        """
+
+        self._send_message = send_message
+        self.chunk_size = chunk_size or settings.LogUploadChunkSize
+        self.max_bytes = max_bytes or settings.LogUploadMaxBytes
+        self.retries = retries
+
+    def _load_progress(self):
+        try:
+            if os.path.exists(settings.log_upload_file):
+                with open(settings.log_upload_file, 'r') as _file:
+                    return json.load(_file)
+
+        except Exception as e:
+            logger.error("Failed to load log upload progress.")
+            logger.exception(e)
+
+        return {}
+
+    def _save_progress(self, progress):
+        try:
+            with open(settings.log_upload_file, 'w') as _file:
+                json.dump(progress, _file)
+
+        except Exception as e:
+            logger.error("Failed to save log upload progress.")
+            logger.exception(e)
+
+    def _send_chunk(self, operation, chunk_data):
+        root = {
+            OperationKey.Operation: operation.type,
+            OperationKey.OperationId: operation.id,
+            OperationKey.AgentId: settings.AgentId,
+            OperationKey.Plugin: operation.plugin,
+            OperationKey.Data: chunk_data
+        }
+
+        message = json.dumps(root)
+        uri = ResponseUris.get_response_uri(operation.type)
+        method = ResponseUris.get_request_method(operation.type)
+
+        if not uri or not method:
+            logger.error(
+                "No response uri or request method for '{0}'."
+                .format(operation.type)
+            )
+
+            return False
+
+        for attempt in range(self.retries):
+            if self._send_message(message, uri, method):
+                return True
+
+            # Back off a little more on every failed attempt, but not
+            # after the last one.
+            if attempt < self.retries - 1:
+                time.sleep(2 ** attempt)
+
+        return False
+
+    def _upload_file(self, operation, log_path, start, file_size, truncated,
+                     progress):
+        file_name = os.path.basename(log_path)
+        offset = start
+
+        with open(log_path, 'rb') as log_file:
+            log_file.seek(offset)
+
+            while True:
+                content = log_file.read(
+                    min(self.chunk_size, file_size - offset)
+                )
+                last_chunk = offset + len(content) >= file_size
+
+                chunk_data = {
+                    LogChunkKey.FileName: file_name,
+                    LogChunkKey.FileSize: file_size,
+                    LogChunkKey.Offset: offset,
+                    LogChunkKey.Length: len(content),
+                    LogChunkKey.Encoding: self.Encoding,
+                    LogChunkKey.Content: base64.b64encode(
+                        zlib.compress(content)
+                    ),
+                    LogChunkKey.LastChunk: last_chunk,
+                    LogChunkKey.Truncated: truncated
+                }
+
+                if not self._send_chunk(operation, chunk_data):
+                    logger.error(
+                        "Failed to send {0} at offset {1}."
+                        .format(file_name, offset)
+                    )
+
+                    return False
+
+                offset += len(content)
+
+                progress.setdefault(operation.id, {})[file_name] = offset
+                self._save_progress(progress)
+
+                if last_chunk:
+                    return True
+
+    def upload(self, operation, log_paths):
+        """Sends the content of log_paths to the server.
+
+        Args:
+            operation (SofOperation): The agent log retrieval operation.
+            log_paths (list): Paths of the log files to send.
+
+        Returns:
+            (bool) True if every log was sent, False otherwise.
+        """
+
+        progress = self._load_progress()
+        sent = progress.get(operation.id, {})
+        budget = self.max_bytes
+
+        # Newest logs first so the cap drops the oldest content.
+        log_paths = sorted(log_paths, key=os.path.getmtime, reverse=True)
+
+        for log_path in log_paths:
+            if budget <= 0:
+                logger.info(
+                    "Log upload cap reached, skipping {0}.".format(log_path)
+                )
+                continue
+
+            # Snapshot the size, the current log keeps growing.
+            file_size = os.path.getsize(log_path)
+            start = max(0, file_size - budget)
+            truncated = start > 0
+
+            resume_offset = sent.get(os.path.basename(log_path), 0)
+            if resume_offset > start and resume_offset <= file_size:
+                start = resume_offset
+
+            if start >= file_size and file_size > 0:
+                continue
+
+            if not self._upload_file(
+                operation, log_path, start, file_size, truncated, progress
+            ):
+                return False
+
+            budget -= file_size - start
+
+        progress.pop(operation.id, None)
+        self._save_progress(progress)
+
+        return True
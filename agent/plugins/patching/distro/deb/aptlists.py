@@ -0,0 +1,484 @@
+"""Indexed reader for the Packages files apt keeps in /var/lib/apt/lists.
+
+Builds a compact {name: [PackageVersion, ...]} index straight from the
+index files, so looking up a candidate's Filename, Size or origin no
+longer needs an apt-cache process. The parsed files are cached on disk,
+keyed by each list file's mtime and size, and only the lists that changed
+since the last run are parsed again.
+
+Descriptions are left out of the index: only the packages that get
+reported need one. get_descriptions() reads them from the lists on demand,
+from the Translation files by Description-md5 first, as 'apt-cache show'
+does, then from the Packages list the entry came from.
+"""
+import os
+import bz2
+import glob
+import gzip
+import cPickle
+import threading
+import multiprocessing
+
+from collections import namedtuple
+
+from src.utils import settings, logger
+from plugins.patching.distro.deb import deb822
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+
+LISTS_DIR = '/var/lib/apt/lists'
+SOURCES_LIST = '/etc/apt/sources.list'
+SOURCES_PARTS = '/etc/apt/sources.list.d'
+
+# Bump whenever the layout of the cached entries changes.
+CACHE_VERSION = 3
+
+# Language of the Translation files read for the descriptions.
+TRANSLATION_LANGUAGE = 'en'
+
+# Lists bigger than this are parsed in a process pool when several of them
+# changed at once.
+POOL_THRESHOLD = 4 * 1024 * 1024
+
+# list_path: the Packages list the entry was read from.
+PackageVersion = namedtuple(
+    'PackageVersion',
+    ['version', 'architecture', 'filename', 'size', 'sha256', 'priority',
+     'homepage', 'installed_size', 'depends', 'pre_depends',
+     'description_md5', 'origin', 'list_path']
+)
+
+# uri: base uri of the repo, ending in '/'.
+# repo: the repo the way 'apt-cache madison' shows it.
+#       Ex: 'http://archive.ubuntu.com/ubuntu/ focal-updates/main amd64
+#            Packages'
+Origin = namedtuple('Origin', ['uri', 'repo'])
+
+_fields = ('Version', 'Architecture', 'Filename', 'Size', 'SHA256',
+           'Priority', 'Homepage', 'Installed-Size', 'Depends',
+           'Pre-Depends', 'Description-md5')
+
+_translation_suffix = '_i18n_Translation-' + TRANSLATION_LANGUAGE
+
+_openers = {
+    '.gz': gzip.open,
+    '.bz2': bz2.BZ2File,
+}
+
+if lzma is not None:
+    _openers['.xz'] = lzma.open
+
+
+def _open_list(path):
+    extension = os.path.splitext(path)[1]
+    opener = _openers.get(extension, open)
+
+    return opener(path, 'rb')
+
+
+def uri_to_file_name(uri):
+    """Mirror of apt's URItoFileName: the prefix apt gives list files of
+    the given uri.
+    """
+
+    uri = uri.split('://', 1)[-1]
+
+    # Drop any user:password@
+    if '@' in uri.split('/', 1)[0]:
+        uri = uri.split('@', 1)[1]
+
+    return uri.replace('_', '%5f').replace('/', '_')
+
+
+def read_source_uris(sources_list=SOURCES_LIST, sources_parts=SOURCES_PARTS):
+    """Gets the uris of every 'deb' source configured for apt.
+
+    Understands both the one-line format (*.list) and the deb822 format
+    (*.sources).
+    """
+
+    uris = set()
+
+    list_files = [sources_list] + glob.glob(
+        os.path.join(sources_parts, '*.list')
+    )
+
+    for list_file in list_files:
+        try:
+            with open(list_file, 'r') as _file:
+                for line in _file:
+                    words = line.split('#', 1)[0].split()
+
+                    if not words or words[0] != 'deb':
+                        continue
+
+                    # Skip options. Ex: deb [arch=amd64] http://...
+                    words = [w for w in words[1:] if '://' in w]
+                    if words:
+                        uris.add(words[0])
+
+        except IOError:
+            continue
+
+    for sources_file in glob.glob(os.path.join(sources_parts, '*.sources')):
+        try:
+            with open(sources_file, 'r') as _file:
+                for source in deb822.iter_paragraphs(_file):
+                    if 'deb' not in source.get('Types', '').split():
+                        continue
+
+                    uris.update(source.get('URIs', '').split())
+
+        except IOError:
+            continue
+
+    return uris
+
+
+def parse_origin(list_path, source_uris=()):
+    """Works out the Origin of a Packages list from its file name.
+
+    Ex: archive.ubuntu.com_ubuntu_dists_focal-updates_main_binary-amd64_
+        Packages -> Origin('http://archive.ubuntu.com/ubuntu/',
+                           'http://archive.ubuntu.com/ubuntu/
+                            focal-updates/main amd64 Packages')
+    """
+
+    name = os.path.basename(list_path).split('_Packages')[0]
+
+    if '_dists_' in name:
+        base, dist = name.split('_dists_', 1)
+        dist_parts = dist.split('_')
+
+        arch = dist_parts[-1].replace('binary-', '')
+        suite = '/'.join(dist_parts[:-1])
+
+    else:
+        # Flat repository. Ex: example.com_repo_._Packages
+        base = name.rstrip('.').rstrip('_')
+        arch = ''
+        suite = './'
+
+    uri = None
+
+    # The longest configured uri apt would have named this file after.
+    for source_uri in sorted(source_uris, key=len, reverse=True):
+        prefix = uri_to_file_name(source_uri.rstrip('/'))
+
+        if base == prefix:
+            uri = source_uri
+            break
+
+    if uri is None:
+        uri = 'http://' + base.replace('_', '/').replace('%5f', '_')
+
+    if not uri.endswith('/'):
+        uri += '/'
+
+    repo = ' '.join(x for x in (uri, suite, arch, 'Packages') if x)
+
+    return Origin(uri, repo)
+
+
+def parse_list_file(list_path):
+    """Parses one Packages list into {name: [entry tuple, ...]}.
+
+    Entries are plain tuples, in PackageVersion order minus the origin and
+    list path, so they pickle compactly.
+    """
+
+    packages = {}
+
+    try:
+        with _open_list(list_path) as _file:
+            for paragraph in deb822.iter_paragraphs(_file):
+                name = paragraph.get('Package')
+
+                if not name:
+                    continue
+
+                entry = tuple(paragraph.get(field, '') for field in _fields)
+
+                packages.setdefault(name, []).append(entry)
+
+    except Exception as e:
+        logger.error("Failed to parse {0}.".format(list_path))
+        logger.exception(e)
+
+    return packages
+
+
+def _scan_paragraphs(path, field, values):
+    """Yields the paragraphs of path whose field is one of values.
+
+    The other paragraphs are skipped line by line, without being parsed.
+    """
+
+    prefix = field + ':'
+
+    with _open_list(path) as _file:
+        lines = []
+        wanted = False
+
+        for line in _file:
+            if not line.strip():
+                if wanted:
+                    yield next(deb822.iter_paragraphs(lines))
+
+                lines = []
+                wanted = False
+
+                continue
+
+            if (line.startswith(prefix) and
+                    line[len(prefix):].strip() in values):
+                wanted = True
+
+            lines.append(line)
+
+        if wanted:
+            yield next(deb822.iter_paragraphs(lines))
+
+
+class AptListsIndex():
+    """name -> versions index over every Packages list apt knows of."""
+
+    def __init__(self, lists_dir=LISTS_DIR, cache_file=None):
+        self.lists_dir = lists_dir
+        self.cache_file = cache_file or settings.apt_lists_cache_file
+
+        self._lock = threading.Lock()
+
+        # {list_path: {'stamp': .., 'origin': Origin, 'packages': {..}}}
+        self._files = None
+        self._index = {}
+
+    def _glob_lists(self, suffix):
+        lists = []
+
+        for pattern in ('*' + suffix, '*' + suffix + '.*'):
+            lists.extend(glob.glob(os.path.join(self.lists_dir, pattern)))
+
+        return [path for path in lists
+                if os.path.splitext(path)[1] in _openers
+                or path.endswith(suffix)]
+
+    def _list_files(self):
+        return self._glob_lists('_Packages')
+
+    def _load_cache(self):
+        try:
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, 'rb') as _file:
+                    cache = cPickle.load(_file)
+
+                if cache.get('version') == CACHE_VERSION:
+                    return cache['files']
+
+        except Exception as e:
+            logger.error("Failed to load apt lists cache.")
+            logger.exception(e)
+
+        return {}
+
+    def _save_cache(self):
+        try:
+            temp_file = self.cache_file + '.tmp'
+
+            with open(temp_file, 'wb') as _file:
+                cPickle.dump(
+                    {'version': CACHE_VERSION, 'files': self._files},
+                    _file,
+                    cPickle.HIGHEST_PROTOCOL
+                )
+
+            os.rename(temp_file, self.cache_file)
+
+        except Exception as e:
+            logger.error("Failed to save apt lists cache.")
+            logger.exception(e)
+
+    def _parse_files(self, paths):
+        big = [p for p in paths if os.path.getsize(p) >= POOL_THRESHOLD]
+
+        if len(big) < 2:
+            return dict((p, parse_list_file(p)) for p in paths)
+
+        small = [p for p in paths if p not in big]
+        parsed = dict((p, parse_list_file(p)) for p in small)
+
+        pool = multiprocessing.Pool(
+            min(len(big), multiprocessing.cpu_count())
+        )
+
+        try:
+            parsed.update(zip(big, pool.map(parse_list_file, big)))
+        finally:
+            pool.close()
+            pool.join()
+
+        return parsed
+
+    def refresh(self):
+        """Brings the index up to date with the list files.
+
+        Returns:
+            (bool) True if any list had to be parsed.
+        """
+
+        with self._lock:
+            if self._files is None:
+                self._files = self._load_cache()
+
+            stamps = {}
+            for path in self._list_files():
+                try:
+                    stat = os.stat(path)
+                    stamps[path] = (stat.st_mtime, stat.st_size)
+                except OSError:
+                    continue
+
+            changed = [path for path, stamp in stamps.iteritems()
+                       if self._files.get(path, {}).get('stamp') != stamp]
+            removed = [path for path in self._files if path not in stamps]
+
+            if not changed and not removed and self._index:
+                return False
+
+            for path in removed:
+                del self._files[path]
+
+            if changed:
+                logger.debug(
+                    "Parsing {0} apt lists.".format(len(changed))
+                )
+
+                source_uris = read_source_uris()
+                parsed = self._parse_files(changed)
+
+                for path in changed:
+                    self._files[path] = {
+                        'stamp': stamps[path],
+                        'origin': tuple(parse_origin(path, source_uris)),
+                        'packages': parsed[path]
+                    }
+
+            self._build_index()
+
+            if changed or removed:
+                self._save_cache()
+
+            return bool(changed)
+
+    def _build_index(self):
+        index = {}
+
+        for path in sorted(self._files):
+            origin = Origin(*self._files[path]['origin'])
+
+            for name, entries in self._files[path]['packages'].iteritems():
+                versions = index.setdefault(name, [])
+
+                for entry in entries:
+                    versions.append(
+                        PackageVersion(*(entry + (origin, path)))
+                    )
+
+        self._index = index
+
+    def get_versions(self, name):
+        """Every version of name found in the lists."""
+
+        return self._index.get(name, [])
+
+    def get_version(self, name, version, architecture=None):
+        """The entry for an exact version of name, None if not found."""
+
+        for entry in self._index.get(name, []):
+            if entry.version != version:
+                continue
+
+            if (architecture and entry.architecture not in
+                    (architecture, 'all')):
+                continue
+
+            return entry
+
+        return None
+
+    def names(self):
+        return self._index.keys()
+
+    def _translated_descriptions(self, md5s):
+        """{Description-md5: description} of md5s in the Translation files.
+        """
+
+        descriptions = {}
+        field = 'Description-' + TRANSLATION_LANGUAGE
+
+        for path in sorted(self._glob_lists(_translation_suffix)):
+            for paragraph in _scan_paragraphs(path, 'Description-md5', md5s):
+                if field in paragraph:
+                    descriptions[paragraph['Description-md5']] = \
+                        paragraph[field]
+
+            if len(descriptions) == len(md5s):
+                break
+
+        return descriptions
+
+    def get_descriptions(self, packages):
+        """Descriptions of packages, read from the lists.
+
+        Args:
+            packages: [(name, PackageVersion)]
+
+        Returns:
+            (list) The description of each package, '' if not found.
+        """
+
+        descriptions = {}
+
+        try:
+            md5s = set(entry.description_md5 for _, entry in packages
+                       if entry.description_md5)
+
+            if md5s:
+                translated = self._translated_descriptions(md5s)
+
+                for name, entry in packages:
+                    if entry.description_md5 in translated:
+                        descriptions[(name, entry)] = \
+                            translated[entry.description_md5]
+
+            # Untranslated, from the Packages list of each entry.
+            by_list = {}
+            for name, entry in packages:
+                if (name, entry) not in descriptions:
+                    by_list.setdefault(entry.list_path, {}) \
+                        .setdefault(name, []).append(entry)
+
+            for path, entries in by_list.iteritems():
+                for paragraph in _scan_paragraphs(path, 'Package', entries):
+                    name = paragraph['Package']
+
+                    for entry in entries[name]:
+                        if (paragraph.get('Version') == entry.version and
+                                paragraph.get('Architecture') ==
+                                entry.architecture):
+                            descriptions[(name, entry)] = \
+                                paragraph.get('Description', '')
+
+        except Exception as e:
+            logger.error("Failed to read package descriptions.")
+            logger.exception(e)
+
+        return [descriptions.get((name, entry), '')
+                for name, entry in packages]
@@ -0,0 +1,93 @@
+"""Outcome of each package of an 'apt-get install' transaction, from its
+output.
+
+dpkg names packages 'name:arch' when they are Multi-Arch: same or of a
+foreign architecture, and apt takes 'name:arch' on its command line for
+the latter only. Names are therefore compared in canonical form: the bare
+name for the native architecture and 'all', 'name:arch' for any other.
+So 'Setting up libc6:amd64' on an amd64 host is 'libc6', and says nothing
+of a requested 'libc6:i386'.
+"""
+import os
+import re
+
+# Ex: 'Setting up libfoo1:amd64 (1.1-1) ...'
+#     'libfoo1 is already the newest version (1.1-1).'
+DONE_REGEX = re.compile(
+    r'^(?:Setting up (\S+) \(|(\S+) is already the newest version)'
+)
+
+# Ex: 'dpkg: error processing package libfoo1:amd64 (--configure):'
+#     'dpkg: error processing archive /var/cache/apt/archives/
+#      libfoo1_1.1-1_amd64.deb (--unpack):'
+DPKG_ERROR_REGEX = re.compile(
+    r'^dpkg: error processing (?:package |archive )?(\S+) '
+)
+
+# Followed by one indented package, or archive, per line.
+ERRORS_HEADER = 'Errors were encountered while processing:'
+
+
+def canonical_name(name, native_architecture):
+    """Canonical form of a package name, or of a .deb archive path.
+
+    Args:
+        native_architecture (str): None if unknown, every qualifier is then
+            dropped.
+    """
+
+    if name.endswith('.deb'):
+        # name_version_arch.deb
+        parts = os.path.basename(name)[:-len('.deb')].split('_')
+        name = parts[0]
+
+        if len(parts) == 3:
+            name += ':' + parts[2]
+
+    bare, _, architecture = name.partition(':')
+
+    if (not architecture or native_architecture is None or
+            architecture in ('all', native_architecture)):
+        return bare
+
+    return name
+
+
+def parse(output, native_architecture):
+    """
+    Returns:
+        (tuple) (set of names set up or already up to date,
+                 {name: error} of the packages dpkg failed on)
+    """
+
+    done = set()
+    failed = {}
+
+    in_error_list = False
+
+    for line in output.splitlines():
+        if in_error_list:
+            if line.startswith(' '):
+                name = canonical_name(line.strip(), native_architecture)
+                failed.setdefault(name, 'dpkg failed to process package.')
+                continue
+
+            in_error_list = False
+
+        match = DONE_REGEX.match(line)
+        if match:
+            done.add(canonical_name(
+                match.group(1) or match.group(2), native_architecture
+            ))
+            continue
+
+        match = DPKG_ERROR_REGEX.match(line)
+        if match:
+            failed[canonical_name(match.group(1), native_architecture)] = \
+                line.strip()
+            continue
+
+        if line.startswith(ERRORS_HEADER):
+            in_error_list = True
+
+    return done - set(failed), failed
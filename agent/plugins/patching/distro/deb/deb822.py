@@ -0,0 +1,152 @@
+"""Streaming parser for deb822 control files, such as /var/lib/dpkg/status
+or the Packages indexes under /var/lib/apt/lists.
+"""
+import os
+import threading
+
+from src.utils import logger
+
+
+def iter_paragraphs(lines):
+    """Yields one dictionary per paragraph of a deb822 file.
+
+    Lines are consumed one at a time, so the file is never held in memory
+    as a whole. Continuation lines (starting with a space or tab) are
+    appended to the previous field's value, separated by a newline.
+
+    Args:
+        lines: Any iterable of lines, like an open file.
+
+    Yields:
+        (dict) Field name -> value.
+    """
+
+    paragraph = {}
+    key = None
+
+    for line in lines:
+        line = line.rstrip('\r\n')
+
+        if not line.strip():
+            if paragraph:
+                yield paragraph
+
+            paragraph = {}
+            key = None
+
+            continue
+
+        if line[0] in ' \t':
+            if key is not None:
+                paragraph[key] += '\n' + line
+
+            continue
+
+        key, _, value = line.partition(':')
+        key = key.strip()
+        paragraph[key] = value.strip()
+
+    if paragraph:
+        yield paragraph
+
+
+def parse_packages(lines, key_field='Package'):
+    """Parses deb822 lines into {paragraph[key_field]: paragraph}.
+
+    Paragraphs without key_field are skipped. Later paragraphs win when a
+    key repeats, as in the previous regex based parser.
+    """
+
+    packages = {}
+
+    for paragraph in iter_paragraphs(lines):
+        name = paragraph.get(key_field)
+
+        if name:
+            packages[name] = paragraph
+
+    return packages
+
+
+class StatusFileCache():
+    """Keeps the parsed dpkg status file in memory.
+
+    The file is only parsed again once its inode, mtime or size change,
+    which dpkg does on every database update (it replaces the file through
+    a rename). Repeated queries in between are dictionary lookups.
+    """
+
+    def __init__(self, status_file):
+        self.status_file = status_file
+
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._packages = {}
+        self._installed = {}
+        self._installed_status = None
+
+    def _get_stamp(self):
+        try:
+            stat = os.stat(self.status_file)
+            return (stat.st_ino, stat.st_mtime, stat.st_size)
+
+        except OSError as e:
+            logger.error("Could not stat {0}.".format(self.status_file))
+            logger.exception(e)
+
+            return None
+
+    def _refresh(self):
+        stamp = self._get_stamp()
+
+        if stamp is not None and stamp == self._stamp:
+            return
+
+        try:
+            with open(self.status_file, 'r') as _file:
+                self._packages = parse_packages(_file)
+
+            self._stamp = stamp
+            self._installed_status = None
+
+            logger.debug(
+                "Parsed {0} packages from {1}."
+                .format(len(self._packages), self.status_file)
+            )
+
+        except IOError as ioe:
+            logger.error('Error while parsing file.')
+            logger.exception(ioe)
+
+            self._packages = {}
+            self._stamp = None
+            self._installed_status = None
+
+    def get_packages(self):
+        """Returns {'pkg_name': {...data...}} for every package in the file.
+
+        The paragraph dictionaries are shared with the cache and must not
+        be modified.
+        """
+
+        with self._lock:
+            self._refresh()
+
+            return dict(self._packages)
+
+    def get_installed(self, installed_status):
+        """Same as get_packages(), limited to packages whose Status field
+        equals installed_status.
+        """
+
+        with self._lock:
+            self._refresh()
+
+            if self._installed_status != installed_status:
+                self._installed = dict(
+                    (name, pkg) for name, pkg in self._packages.iteritems()
+                    if pkg.get('Status', '') == installed_status
+                )
+                self._installed_status = installed_status
+
+            return dict(self._installed)
@@ -0,0 +1,152 @@
+"""dpkg version ordering.
+
+Versions are turned into sort keys once, so comparing two versions, or
+sorting many, is a comparison of tuples (padded to the same length). Follows the algorithm described
+in deb-version(7):
+
+    [epoch:]upstream_version[-debian_revision]
+
+Upstream version and revision are split into alternating non-digit and
+digit parts. Non-digit parts compare character by character, with '~'
+sorting before everything, even the end of the part, and letters sorting
+before non-letters. Digit parts compare numerically.
+"""
+import threading
+
+# Sort keys are memoized up to this many versions.
+_CACHE_SIZE = 100000
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _char_order(char):
+    if char == '~':
+        return -1
+
+    if char.isalpha():
+        return ord(char)
+
+    return ord(char) + 256
+
+
+# End of a non-digit part. Greater than '~', less than anything else.
+_END = 0
+
+# Stands for the end of a version: an empty non-digit part, then 0.
+_SENTINEL = ((_END,), 0)
+
+
+class _PartKey(object):
+    """Key of an upstream version or revision.
+
+    The shorter of two keys is padded with _SENTINEL before comparing, as
+    dpkg carries on comparing past the end of the shorter version. A plain
+    tuple comparison would put it first, so '0' would sort before '0~'.
+    """
+
+    __slots__ = ('parts',)
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    def __cmp__(self, other):
+        a, b = self.parts, other.parts
+
+        if len(a) < len(b):
+            a += (_SENTINEL,) * (len(b) - len(a))
+        elif len(b) < len(a):
+            b += (_SENTINEL,) * (len(a) - len(b))
+
+        return cmp(a, b)
+
+    def __hash__(self):
+        return hash(self.parts)
+
+    def __repr__(self):
+        return '_PartKey({0!r})'.format(self.parts)
+
+
+def _part_key(part):
+    """Key of an upstream version or revision."""
+
+    key = []
+    i = 0
+    length = len(part)
+
+    while i < length:
+        start = i
+        while i < length and not part[i].isdigit():
+            i += 1
+        letters = tuple(_char_order(c) for c in part[start:i]) + (_END,)
+
+        start = i
+        while i < length and part[i].isdigit():
+            i += 1
+        number = int(part[start:i] or 0)
+
+        key.append((letters, number))
+
+    # Trailing sentinels change nothing once keys are padded, dropping
+    # them keeps equal versions ('1.0', '1.0-0') hashing the same.
+    while key and key[-1] == _SENTINEL:
+        key.pop()
+
+    return _PartKey(tuple(key))
+
+
+def parse(version):
+    """Splits version into (epoch, upstream_version, debian_revision).
+
+    Raises:
+        ValueError: The epoch isn't a number.
+    """
+
+    version = version.strip()
+
+    epoch = 0
+    if ':' in version:
+        epoch, version = version.split(':', 1)
+        epoch = int(epoch)
+
+    revision = ''
+    if '-' in version:
+        version, revision = version.rsplit('-', 1)
+
+    return epoch, version, revision
+
+
+def sort_key(version):
+    """Returns a key ordering versions the way dpkg does.
+
+    Ex: sorted(versions, key=sort_key)
+    """
+
+    key = _cache.get(version)
+
+    if key is None:
+        epoch, upstream, revision = parse(version)
+        key = (epoch, _part_key(upstream), _part_key(revision))
+
+        with _cache_lock:
+            if len(_cache) >= _CACHE_SIZE:
+                _cache.clear()
+
+            _cache[version] = key
+
+    return key
+
+
+def compare(version_a, version_b):
+    """Same as 'dpkg --compare-versions': -1, 0 or 1."""
+
+    return cmp(sort_key(version_a), sort_key(version_b))
+
+
+def newest(versions):
+    """The highest of versions, None if there are none."""
+
+    if not versions:
+        return None
+
+    return max(versions, key=sort_key)
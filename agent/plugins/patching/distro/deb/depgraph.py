@@ -0,0 +1,143 @@
+"""Dependency graph over a set of Debian packages, such as the pending
+updates.
+
+Edges come from the Depends and Pre-Depends fields and are limited to
+packages inside the set. The transitive closure of every package is
+computed in a single walk of the graph.
+"""
+
+
+def relation_names(relations):
+    """Get the package names out of a Depends style field.
+
+    Ex: 'libc6 (>= 2.14), python3:any, libfoo | libbar'
+        -> ['libc6', 'python3', 'libfoo', 'libbar']
+    """
+
+    names = []
+
+    for relation in relations.split(','):
+        for alternative in relation.split('|'):
+            name = alternative.strip().split(' ')[0].split('(')[0]
+            name = name.split(':')[0]
+
+            if name:
+                names.append(name)
+
+    return names
+
+
+class DependencyGraph():
+    """Adjacency of {name: set(names it depends on)}."""
+
+    def __init__(self, relations):
+        """
+        Args:
+            relations (dict): {name: 'Depends style field'}. Several fields
+                can be joined with ', '.
+        """
+
+        self.edges = {}
+
+        for name, field in relations.iteritems():
+            self.edges[name] = set(
+                dep for dep in relation_names(field)
+                if dep in relations and dep != name
+            )
+
+        self._closures = None
+
+    def closures(self):
+        """Every package each package pulls in, directly or not.
+
+        Uses Tarjan's strongly connected components, which come out with
+        their dependencies first, so each closure is the union of already
+        computed ones. Dependency cycles are handled; a package is never
+        part of its own closure.
+
+        Returns:
+            (dict) {name: set(names)}
+        """
+
+        if self._closures is not None:
+            return self._closures
+
+        closures = {}
+        component_of = {}
+
+        index = {}
+        lowlink = {}
+        on_stack = set()
+        stack = []
+        counter = [0]
+
+        def finish(root):
+            component = []
+
+            while True:
+                node = stack.pop()
+                on_stack.discard(node)
+                component.append(node)
+
+                if node == root:
+                    break
+
+            reached = set(component)
+            for node in component:
+                for dep in self.edges[node]:
+                    if dep not in reached:
+                        reached |= closures[component_of[dep]]
+                        reached.add(dep)
+
+            key = root
+            for node in component:
+                component_of[node] = key
+            closures[key] = reached
+
+        for start in self.edges:
+            if start in index:
+                continue
+
+            # Iterative DFS: (node, iterator over its deps)
+            work = [(start, iter(self.edges[start]))]
+            index[start] = lowlink[start] = counter[0]
+            counter[0] += 1
+            stack.append(start)
+            on_stack.add(start)
+
+            while work:
+                node, deps = work[-1]
+                advanced = False
+
+                for dep in deps:
+                    if dep not in index:
+                        index[dep] = lowlink[dep] = counter[0]
+                        counter[0] += 1
+                        stack.append(dep)
+                        on_stack.add(dep)
+
+                        work.append((dep, iter(self.edges[dep])))
+                        advanced = True
+                        break
+
+                    elif dep in on_stack:
+                        lowlink[node] = min(lowlink[node], index[dep])
+
+                if advanced:
+                    continue
+
+                work.pop()
+
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+                if lowlink[node] == index[node]:
+                    finish(node)
+
+        self._closures = dict(
+            (name, closures[component_of[name]] - set([name]))
+            for name in self.edges
+        )
+
+        return self._closures
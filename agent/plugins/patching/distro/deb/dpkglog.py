@@ -0,0 +1,82 @@
+"""Package changes recorded in /var/log/dpkg.log.
+
+dpkg logs one line per action, with the versions before and after:
+
+    2014-03-10 12:00:01 upgrade libfoo1:amd64 1.0-1 1.1-1
+    2014-03-10 12:00:02 remove bar:all 2.0 <none>
+    2014-03-10 12:00:03 status installed libfoo1:amd64 1.1-1
+"""
+from plugins.patching.logtail import LogTail
+
+DPKG_LOG = '/var/log/dpkg.log'
+
+_NONE = '<none>'
+
+_actions = ('install', 'upgrade', 'remove', 'purge')
+
+
+def parse_changes(lines):
+    """Nets out the actions in lines.
+
+    Returns:
+        (tuple) ([(name, version) added], [(name, version) removed])
+    """
+
+    # First version seen before any action, and the last one after.
+    before = {}
+    after = {}
+
+    for line in lines:
+        words = line.split()
+
+        if len(words) < 6 or words[2] not in _actions:
+            continue
+
+        name = words[3].split(':')[0]
+        old_version = words[4]
+        new_version = words[5]
+
+        before.setdefault(name, old_version)
+
+        if words[2] in ('remove', 'purge'):
+            after[name] = _NONE
+        else:
+            after[name] = new_version
+
+    added = []
+    removed = []
+
+    for name in sorted(before):
+        old_version = before[name]
+        new_version = after[name]
+
+        if old_version == new_version:
+            continue
+
+        if old_version != _NONE:
+            removed.append((name, old_version))
+
+        if new_version != _NONE:
+            added.append((name, new_version))
+
+    return added, removed
+
+
+class DpkgLog(LogTail):
+
+    def __init__(self, log_file=DPKG_LOG):
+        LogTail.__init__(self, log_file)
+
+    def changes_since(self, mark):
+        """Packages added and removed since mark.
+
+        Returns:
+            (tuple) See parse_changes(). None if the log couldn't be read.
+        """
+
+        lines = self.lines_since(mark)
+
+        if lines is None:
+            return None
+
+        return parse_changes(lines)
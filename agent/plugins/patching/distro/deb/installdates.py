@@ -0,0 +1,107 @@
+"""Install dates of Debian packages.
+
+dpkg rewrites /var/lib/dpkg/info/<name>[:<arch>].list when it installs a
+package, so its mtime is the install date. All of them are read in a
+single pass over the directory, which is only done again once the
+directory's mtime changes (dpkg renames the new .list files into place).
+"""
+import os
+import threading
+
+from src.utils import logger
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+DPKG_INFO_DIR = '/var/lib/dpkg/info'
+
+_LIST_EXTENSION = '.list'
+
+
+class InstallDateIndex():
+
+    def __init__(self, info_dir=DPKG_INFO_DIR):
+        self.info_dir = info_dir
+
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._dates = {}
+
+    def _scan(self):
+        """Returns {name: mtime}, for every architecture suffix."""
+
+        dates = {}
+
+        if scandir is not None:
+            entries = (
+                (entry.name, entry)
+                for entry in scandir(self.info_dir)
+                if entry.name.endswith(_LIST_EXTENSION)
+            )
+        else:
+            entries = (
+                (name, None)
+                for name in os.listdir(self.info_dir)
+                if name.endswith(_LIST_EXTENSION)
+            )
+
+        for file_name, entry in entries:
+            try:
+                if entry is not None:
+                    mtime = entry.stat().st_mtime
+                else:
+                    mtime = os.path.getmtime(
+                        os.path.join(self.info_dir, file_name)
+                    )
+
+            except OSError:
+                continue
+
+            # Ex: 'libc6:amd64.list' -> 'libc6'
+            name = file_name[:-len(_LIST_EXTENSION)].split(':')[0]
+
+            # Several architectures installed, the newest one counts.
+            if mtime > dates.get(name, 0):
+                dates[name] = mtime
+
+        return dates
+
+    def _refresh(self):
+        try:
+            mtime = os.path.getmtime(self.info_dir)
+
+        except OSError as e:
+            logger.error("Could not stat {0}.".format(self.info_dir))
+            logger.exception(e)
+
+            self._mtime = None
+            self._dates = {}
+
+            return
+
+        if mtime == self._mtime:
+            return
+
+        try:
+            self._dates = self._scan()
+            self._mtime = mtime
+
+        except OSError as e:
+            logger.error("Failed to scan {0}.".format(self.info_dir))
+            logger.exception(e)
+
+            self._mtime = None
+            self._dates = {}
+
+    def get(self, package_name):
+        """Install date of package_name as epoch, '' if not found."""
+
+        with self._lock:
+            self._refresh()
+
+            return self._dates.get(package_name, '')
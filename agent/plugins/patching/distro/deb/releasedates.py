@@ -0,0 +1,167 @@
+"""Release dates of .deb files, read from the Last-Modified header of the
+repository.
+
+Dates are fetched with HEAD requests, or a GET where HEAD is refused,
+several at a time and with a timeout, and kept in a cache on disk keyed
+by uri plus SHA256. A given .deb is only ever asked for once.
+"""
+import os
+import json
+import threading
+
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
+
+import requests
+
+from src.utils import settings, logger
+
+
+PARSE_DATE_FORMAT = '%a, %d %b %Y %H:%M:%S %Z'
+
+
+class ReleaseDateFetcher():
+
+    def __init__(self, cache_file=None, workers=None, timeout=None):
+        self.cache_file = cache_file or settings.release_dates_cache_file
+        self.workers = workers or settings.ReleaseDateWorkers
+        self.timeout = timeout or settings.ReleaseDateTimeout
+
+        self._lock = threading.Lock()
+        self._cache = None
+
+    def _key(self, uri, sha256):
+        return '{0}|{1}'.format(uri, sha256)
+
+    def _load_cache(self):
+        if self._cache is not None:
+            return
+
+        self._cache = {}
+
+        try:
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, 'r') as _file:
+                    self._cache = json.load(_file)
+
+        except Exception as e:
+            logger.error("Failed to load release dates cache.")
+            logger.exception(e)
+
+    def _save_cache(self):
+        try:
+            temp_file = self.cache_file + '.tmp'
+
+            with open(temp_file, 'w') as _file:
+                json.dump(self._cache, _file)
+
+            os.rename(temp_file, self.cache_file)
+
+        except Exception as e:
+            logger.error("Failed to save release dates cache.")
+            logger.exception(e)
+
+    def _last_modified(self, uri):
+        """Last-Modified header of uri.
+
+        Some mirrors refuse HEAD requests, those get a GET as before,
+        whose body is never read.
+        """
+
+        try:
+            response = requests.head(
+                uri, timeout=self.timeout, allow_redirects=True
+            )
+            response.raise_for_status()
+
+            return response.headers['last-modified']
+
+        except Exception as e:
+            logger.debug(
+                'HEAD request for {0} failed: {1}'.format(uri, e)
+            )
+
+        response = requests.get(uri, timeout=self.timeout, stream=True)
+
+        try:
+            response.raise_for_status()
+
+            return response.headers['last-modified']
+
+        finally:
+            response.close()
+
+    def _fetch(self, uri):
+        """Returns the formatted release date of uri, None on failure."""
+
+        try:
+            date_obj = datetime.strptime(
+                self._last_modified(uri), PARSE_DATE_FORMAT
+            )
+
+            return date_obj.strftime(settings.DATE_FORMAT)
+
+        except Exception as e:
+            logger.error('Could not get release date of {0}.'.format(uri))
+            logger.exception(e)
+
+            return None
+
+    def prefetch(self, files):
+        """Fetches the release dates of files not in the cache yet.
+
+        Args:
+            files: Iterable of (uri, sha256).
+        """
+
+        with self._lock:
+            self._load_cache()
+
+            missing = {}
+            for uri, sha256 in files:
+                key = self._key(uri, sha256)
+
+                if uri and key not in self._cache:
+                    missing[key] = uri
+
+        if not missing:
+            return
+
+        logger.debug(
+            'Fetching {0} release dates.'.format(len(missing))
+        )
+
+        keys = missing.keys()
+        pool = ThreadPool(min(self.workers, len(keys)))
+
+        try:
+            dates = pool.map(self._fetch, [missing[key] for key in keys])
+        finally:
+            pool.close()
+            pool.join()
+
+        with self._lock:
+            for key, date in zip(keys, dates):
+                # Failures are tried again next time.
+                if date is not None:
+                    self._cache[key] = date
+
+            self._save_cache()
+
+    def get(self, uri, sha256=''):
+        """Returns the release date of uri, '' if it can't be found."""
+
+        if not uri:
+            return ''
+
+        key = self._key(uri, sha256)
+
+        with self._lock:
+            self._load_cache()
+
+            if key in self._cache:
+                return self._cache[key]
+
+        self.prefetch([(uri, sha256)])
+
+        return self._cache.get(key, '')
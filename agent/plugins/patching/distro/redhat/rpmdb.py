@@ -0,0 +1,185 @@
+"""The installed rpm packages, from a single 'rpm -qa' query.
+
+Fields are separated by the ASCII unit separator and packages by the
+record separator, neither of which shows up in rpm headers, so multi-line
+descriptions need no special handling. The output is parsed as it is read.
+
+The packages are cached until the rpm database changes, as told by the
+mtime and size of its files.
+"""
+import os
+import tempfile
+import subprocess
+import threading
+
+from collections import namedtuple
+
+from src.utils import settings
+
+RPM = 'rpm'
+
+# Berkeley DB (rpm < 4.16) and sqlite backends, both locations.
+RPMDB_FILES = (
+    '/var/lib/rpm/Packages',
+    '/var/lib/rpm/rpmdb.sqlite',
+    '/usr/lib/sysimage/rpm/Packages',
+    '/usr/lib/sysimage/rpm/rpmdb.sqlite'
+)
+
+FIELD_SEPARATOR = '\x1f'
+RECORD_SEPARATOR = '\x1e'
+
+RpmPackage = namedtuple(
+    'RpmPackage',
+    ['name', 'version', 'install_time', 'build_time', 'size', 'vendor',
+     'url', 'description']
+)
+
+QUERY_FORMAT = FIELD_SEPARATOR.join([
+    '%{NAME}', '%{VERSION}-%{RELEASE}', '%{INSTALLTIME}', '%{BUILDTIME}',
+    '%{SIZE}', '%{VENDOR}', '%{URL}', '%{DESCRIPTION}'
+]) + RECORD_SEPARATOR
+
+_CHUNK_SIZE = 64 * 1024
+
+# rpm's value for a tag the package doesn't have.
+_NONE = '(none)'
+
+
+def _decode(text):
+    """As utilcmds.run_command does for the whole output."""
+
+    try:
+        return (
+            text.decode(settings.default_decoder)
+                .encode(settings.default_encoder)
+        )
+
+    except UnicodeDecodeError:
+        return (
+            text.replace('\\', '\\\\')
+                .decode(settings.default_decoder)
+                .encode(settings.default_encoder)
+        )
+
+
+def parse_record(record):
+    """Returns an RpmPackage, None if record is malformed."""
+
+    fields = _decode(record).split(FIELD_SEPARATOR)
+
+    if len(fields) != len(RpmPackage._fields):
+        return None
+
+    fields = ['' if field == _NONE else field for field in fields]
+
+    # Newlines would end up in the server's one line description.
+    fields[-1] = fields[-1].replace('\n', ' ').strip()
+
+    return RpmPackage(*fields)
+
+
+def iter_packages(stream):
+    """Yields an RpmPackage per record read from stream."""
+
+    pending = ''
+
+    while True:
+        chunk = stream.read(_CHUNK_SIZE)
+
+        if not chunk:
+            break
+
+        records = (pending + chunk).split(RECORD_SEPARATOR)
+        pending = records.pop()
+
+        for record in records:
+            package = parse_record(record.lstrip('\n'))
+
+            if package:
+                yield package
+
+    if pending.strip():
+        package = parse_record(pending.lstrip('\n'))
+
+        if package:
+            yield package
+
+
+class RpmDb():
+
+    def __init__(self, db_files=RPMDB_FILES):
+        self.db_files = db_files
+
+        self._lock = threading.Lock()
+        self._key = None
+        self._packages = []
+
+    def _db_key(self):
+        """(path, mtime, size) of the database files, None if none exist.
+        """
+
+        key = []
+
+        for path in self.db_files:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            key.append((path, stat.st_mtime, stat.st_size))
+
+        return tuple(key) or None
+
+    def _query(self):
+        # Not a pipe, it could fill up while stdout is being read.
+        with tempfile.TemporaryFile() as err:
+            proc = subprocess.Popen(
+                [RPM, '-qa', '--queryformat', QUERY_FORMAT],
+                stdout=subprocess.PIPE, stderr=err
+            )
+
+            try:
+                packages = list(iter_packages(proc.stdout))
+            finally:
+                proc.stdout.close()
+                proc.wait()
+
+            if proc.returncode != 0:
+                err.seek(0)
+
+                raise OSError(
+                    "rpm -qa returned {0}: {1}"
+                    .format(proc.returncode, err.read())
+                )
+
+        return packages
+
+    def packages(self):
+        """Every installed RpmPackage."""
+
+        with self._lock:
+            key = self._db_key()
+
+            if key is None or key != self._key:
+                packages = self._query()
+
+                # Looked up again after the query, so a change during it
+                # gets picked up next time.
+                if key == self._db_key():
+                    self._key = key
+                else:
+                    self._key = None
+
+                self._packages = packages
+
+            return list(self._packages)
+
+    def get(self, name, version):
+        """The installed RpmPackage, None if it isn't installed."""
+
+        for package in self.packages():
+            if package.name == name and package.version == version:
+                return package
+
+        return None
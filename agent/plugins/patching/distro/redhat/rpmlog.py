@@ -0,0 +1,137 @@
+"""Package changes recorded in the yum/dnf transaction logs.
+
+dnf logs both sides of an upgrade in /var/log/dnf.rpm.log:
+
+    2014-03-10T12:00:01Z SUBDEBUG Upgrade: bash-4.3-1.fc20.x86_64
+    2014-03-10T12:00:02Z SUBDEBUG Upgraded: bash-4.2-1.fc20.x86_64
+
+yum only logs the new side in /var/log/yum.log, and only the name of
+erased packages:
+
+    Mar 10 12:00:01 Updated: bash-4.3-1.el7.x86_64
+    Mar 10 12:00:02 Erased: foo
+"""
+import os
+
+from plugins.patching.logtail import LogTail
+
+DNF_RPM_LOG = '/var/log/dnf.rpm.log'
+YUM_LOG = '/var/log/yum.log'
+
+_dnf_added = ('Install', 'Installed', 'Upgrade', 'Downgrade')
+_dnf_removed = ('Erase', 'Erased', 'Upgraded', 'Downgraded', 'Obsoleted')
+
+_yum_added = ('Installed', 'Updated')
+_yum_removed = ('Erased',)
+_yum_name_only = ('Erased',)
+
+
+def parse_nevra(nevra):
+    """Ex: '1:bash-4.3-1.el7.x86_64' -> ('bash', '4.3-1.el7')
+
+    dnf puts the epoch before the version instead:
+    'bash-1:4.3-1.fc20.x86_64'. Either way it is dropped, as in the
+    VERSION-RELEASE of rpmdb packages.
+    """
+
+    if ':' in nevra.split('-')[0]:
+        nevra = nevra.split(':', 1)[1]
+
+    name_version = nevra.rsplit('.', 1)[0]
+    name, version, release = name_version.rsplit('-', 2)
+    version = version.split(':', 1)[-1]
+
+    return name, '{0}-{1}'.format(version, release)
+
+
+def _split_action(line):
+    """Ex: '... SUBDEBUG Upgrade: bash-4.3-1.fc20.x86_64'
+        -> ('Upgrade', 'bash-4.3-1.fc20.x86_64')
+    """
+
+    words = line.split()
+
+    for i, word in enumerate(words[:-1]):
+        if word.endswith(':') and word[:-1].isalpha():
+            return word[:-1], words[i + 1]
+
+    return None, None
+
+
+def parse_changes(lines, added_actions, removed_actions, name_only=()):
+    """Nets out the actions in lines.
+
+    Args:
+        name_only: Actions logged with the package name alone.
+
+    Returns:
+        (tuple) ([(name, version) added], [(name, version) removed]).
+        Removed versions are None when the log only has the name.
+    """
+
+    added = set()
+    removed = set()
+
+    for line in lines:
+        action, package = _split_action(line)
+
+        if action not in added_actions and action not in removed_actions:
+            continue
+
+        if action in name_only:
+            change = (package, None)
+        else:
+            try:
+                change = parse_nevra(package)
+            except ValueError:
+                continue
+
+        if action in added_actions:
+            if change in removed:
+                removed.discard(change)
+            else:
+                added.add(change)
+
+        else:
+            if change in added:
+                added.discard(change)
+            else:
+                removed.add(change)
+
+    return sorted(added), sorted(removed)
+
+
+class RpmTransactionLog(LogTail):
+
+    def __init__(self, log_file=None):
+        if log_file is None:
+            log_file = DNF_RPM_LOG
+
+            if not os.path.exists(log_file):
+                log_file = YUM_LOG
+
+        LogTail.__init__(self, log_file)
+
+    def logs_removed_versions(self):
+        """Whether removed packages are logged with their version."""
+
+        return self.log_file != YUM_LOG
+
+    def changes_since(self, mark):
+        """Packages added and removed since mark.
+
+        Returns:
+            (tuple) See parse_changes(). None if the log couldn't be read.
+        """
+
+        lines = self.lines_since(mark)
+
+        if lines is None:
+            return None
+
+        if self.log_file == YUM_LOG:
+            return parse_changes(
+                lines, _yum_added, _yum_removed, _yum_name_only
+            )
+
+        return parse_changes(lines, _dnf_added, _dnf_removed)
@@ -0,0 +1,68 @@
+"""Packages a yum or dnf transaction installed, from its output.
+
+Kept apart from the yum package, which needs yum itself to import.
+"""
+import re
+
+# Sections of yum/dnf's transaction summary listing what was installed.
+SUMMARY_SECTIONS = (
+    'Installed:', 'Updated:', 'Upgraded:', 'Downgraded:', 'Reinstalled:',
+    'Dependency Installed:', 'Dependency Updated:', 'Dependency Upgraded:'
+)
+
+# yum's epoch:version-release, Ex: '0:4.2.46-34.el7'. dnf has the epoch
+# inside the name-epoch:version-release.arch word instead.
+_EVR_REGEX = re.compile(r'^\d+:')
+
+
+def parse(output):
+    """Gets the names of the packages a yum transaction installed.
+
+    yum lists them as name.arch followed by epoch:version-release:
+
+        Updated:
+          bash.x86_64 0:4.2.46-34.el7
+
+    dnf as name-version-release.arch:
+
+        Upgraded:
+          bash-5.1.8-6.el9.x86_64
+
+    Names are returned without the architecture, as the packages of an
+    operation are requested.
+
+    Returns:
+
+        - A set of package names.
+
+    """
+
+    names = set()
+    in_section = False
+
+    for line in output.splitlines():
+
+        if line.strip() in SUMMARY_SECTIONS:
+            in_section = True
+            continue
+
+        if not in_section:
+            continue
+
+        if not line.startswith(' ') or not line.strip():
+            in_section = False
+            continue
+
+        words = line.split()
+
+        if _EVR_REGEX.match(words[-1]):
+            # yum: pairs of name.arch and epoch:version-release.
+            for name_arch in words[::2]:
+                names.add(name_arch.rsplit('.', 1)[0])
+
+        else:
+            for nevra in words:
+                name_version = nevra.rsplit('.', 1)[0]
+                names.add(name_version.rsplit('-', 2)[0])
+
+    return names
@@ -0,0 +1,207 @@
+"""Decides whether the package manager's metadata needs to be downloaded
+again before looking for updates.
+
+The indexes count as fresh when the agent refreshed them, or something
+else did (unattended-upgrades, yum-cron, an admin), less than
+settings.IndexRefreshWindow seconds ago. Stamp files the package manager
+touches on every successful refresh are used to notice refreshes done
+outside of the agent, failed refreshes must leave them alone or they would
+never be retried. The index files' own mtimes can't be used: apt sets them
+to the repository's Last-Modified date.
+"""
+import os
+import glob
+import json
+import time
+import threading
+
+from src.utils import settings, logger
+
+
+class StateKey():
+    LastRefresh = 'last_refresh'
+    Refreshes = 'refreshes'
+    AverageSeconds = 'average_seconds'
+    AverageBytes = 'average_bytes'
+    Skipped = 'skipped'
+    SecondsSaved = 'seconds_saved'
+    BytesSaved = 'bytes_saved'
+
+
+class IndexFreshness():
+
+    _lock = threading.Lock()
+
+    def __init__(self, name, index_dir, stamp_paths=(), window=None,
+                 state_file=None):
+        """
+        Args:
+            name (str): Key of this index in the state file. Ex: 'apt'.
+            index_dir (str): Where the package manager keeps its indexes.
+            stamp_paths (list): Paths, or glob patterns, modified on each
+                successful refresh.
+            window (int): Seconds the indexes stay fresh. Defaults to
+                settings.IndexRefreshWindow.
+            state_file (str): Defaults to settings.index_freshness_file.
+        """
+
+        self.name = name
+        self.index_dir = index_dir
+        self.stamp_paths = stamp_paths
+        self.window = window
+        self.state_file = state_file or settings.index_freshness_file
+
+    def _get_window(self):
+        if self.window is not None:
+            return self.window
+
+        return settings.IndexRefreshWindow
+
+    def _read_states(self):
+        try:
+            if os.path.exists(self.state_file):
+                with open(self.state_file, 'r') as _file:
+                    return json.load(_file)
+
+        except Exception as e:
+            logger.error("Failed to read index freshness state.")
+            logger.exception(e)
+
+        return {}
+
+    def _write_state(self, state):
+        with IndexFreshness._lock:
+            states = self._read_states()
+            states[self.name] = state
+
+            try:
+                with open(self.state_file, 'w') as _file:
+                    json.dump(states, _file)
+
+            except Exception as e:
+                logger.error("Failed to save index freshness state.")
+                logger.exception(e)
+
+    def get_state(self):
+        state = {
+            StateKey.LastRefresh: 0,
+            StateKey.Refreshes: 0,
+            StateKey.AverageSeconds: 0,
+            StateKey.AverageBytes: 0,
+            StateKey.Skipped: 0,
+            StateKey.SecondsSaved: 0,
+            StateKey.BytesSaved: 0
+        }
+
+        state.update(self._read_states().get(self.name, {}))
+
+        return state
+
+    def _index_files(self):
+        """Returns {path: (mtime, size)} of every index file."""
+
+        files = {}
+
+        for root, _, names in os.walk(self.index_dir):
+            for name in names:
+                path = os.path.join(root, name)
+
+                try:
+                    stat = os.stat(path)
+                    files[path] = (stat.st_mtime, stat.st_size)
+                except OSError:
+                    continue
+
+        return files
+
+    def last_refresh(self):
+        """Epoch of the newest refresh, by the agent or anything else."""
+
+        mtimes = [self.get_state()[StateKey.LastRefresh]]
+
+        for pattern in self.stamp_paths:
+            for path in glob.glob(pattern):
+                try:
+                    mtimes.append(os.path.getmtime(path))
+                except OSError:
+                    continue
+
+        return max(mtimes)
+
+    def is_fresh(self):
+        age = time.time() - self.last_refresh()
+
+        return 0 <= age < self._get_window()
+
+    def refresh(self, refresh_callback, force=False):
+        """Calls refresh_callback unless the indexes are still fresh.
+
+        Args:
+            refresh_callback: Downloads the metadata. Returns True on
+                success.
+            force (bool): Refresh regardless of freshness.
+
+        Returns:
+            (bool) True if refresh_callback was called.
+        """
+
+        state = self.get_state()
+
+        if not force and self.is_fresh():
+            state[StateKey.Skipped] += 1
+            state[StateKey.SecondsSaved] += state[StateKey.AverageSeconds]
+            state[StateKey.BytesSaved] += state[StateKey.AverageBytes]
+
+            logger.info(
+                "{0} indexes are fresh, skipping refresh. Saved about "
+                "{1:.1f}s and {2} bytes ({3:.1f}s and {4} bytes over {5} "
+                "skipped refreshes).".format(
+                    self.name, state[StateKey.AverageSeconds],
+                    int(state[StateKey.AverageBytes]),
+                    state[StateKey.SecondsSaved],
+                    int(state[StateKey.BytesSaved]),
+                    state[StateKey.Skipped]
+                )
+            )
+
+            self._write_state(state)
+
+            return False
+
+        before = self._index_files()
+        start = time.time()
+
+        success = refresh_callback()
+
+        seconds = time.time() - start
+        after = self._index_files()
+
+        # Index files rewritten by the refresh are what got downloaded.
+        downloaded = sum(
+            size for path, (mtime, size) in after.iteritems()
+            if before.get(path) != (mtime, size)
+        )
+
+        logger.debug(
+            "Refreshed {0} indexes in {1:.1f}s, {2} bytes changed."
+            .format(self.name, seconds, downloaded)
+        )
+
+        if success:
+            # Running averages estimate what a skipped refresh saves.
+            count = state[StateKey.Refreshes]
+
+            state[StateKey.AverageSeconds] = (
+                (state[StateKey.AverageSeconds] * count + seconds) /
+                (count + 1)
+            )
+            state[StateKey.AverageBytes] = (
+                (state[StateKey.AverageBytes] * count + downloaded) /
+                float(count + 1)
+            )
+            state[StateKey.Refreshes] = count + 1
+            state[StateKey.LastRefresh] = time.time()
+
+            self._write_state(state)
+
+        return True
@@ -0,0 +1,100 @@
+"""Reads what a package manager appended to its log since a given point.
+
+Used to work out what an install changed from the package manager's own
+record of it, instead of rescanning every installed package.
+
+The log can be rotated out of reach, or truncated, during the install.
+Handlers then compare snapshots of the installed versions instead, see
+diff_versions().
+"""
+import os
+
+from src.utils import logger
+
+
+class LogTail():
+
+    def __init__(self, log_file):
+        self.log_file = log_file
+
+    def _rotated_file(self):
+        # logrotate's default naming. Ex: dpkg.log -> dpkg.log.1
+        return self.log_file + '.1'
+
+    def mark(self):
+        """Current end of the log.
+
+        Returns:
+            (tuple) (inode, offset) to pass to lines_since(). None if the
+            log can't be read, in which case nothing can be tailed.
+        """
+
+        try:
+            stat = os.stat(self.log_file)
+
+            return (stat.st_ino, stat.st_size)
+
+        except OSError:
+            return None
+
+    def _read_from(self, path, offset):
+        with open(path, 'r') as _file:
+            _file.seek(offset)
+
+            return _file.read().splitlines()
+
+    def lines_since(self, mark):
+        """Lines appended to the log after mark was taken.
+
+        If the log was rotated in between, the rest of the rotated file is
+        read before the new log.
+
+        Returns:
+            (list) Lines, None if they can't be read.
+        """
+
+        if mark is None:
+            return None
+
+        inode, offset = mark
+
+        try:
+            stat = os.stat(self.log_file)
+
+            if stat.st_ino == inode and stat.st_size >= offset:
+                return self._read_from(self.log_file, offset)
+
+            rotated = self._rotated_file()
+            if os.path.exists(rotated) and os.stat(rotated).st_ino == inode:
+                return (self._read_from(rotated, offset) +
+                        self._read_from(self.log_file, 0))
+
+            # Truncated, or rotated out of reach; can't tell what was lost.
+            return None
+
+        except (IOError, OSError) as e:
+            logger.error("Failed to read {0}.".format(self.log_file))
+            logger.exception(e)
+
+            return None
+
+
+def diff_versions(old_versions, new_versions):
+    """Changes between two {name: set(versions)} inventory snapshots.
+
+    Returns:
+        (tuple) ([(name, version) added], [(name, version) removed]), the
+        same form the log parsers return.
+    """
+
+    added = set()
+    removed = set()
+
+    for name in set(old_versions) | set(new_versions):
+        old = old_versions.get(name, set())
+        new = new_versions.get(name, set())
+
+        added.update((name, version) for version in new - old)
+        removed.update((name, version) for version in old - new)
+
+    return sorted(added), sorted(removed)
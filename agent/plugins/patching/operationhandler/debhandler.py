@@ -1,16 +1,16 @@
 import os
 import re
-import urllib
-import shutil
 import hashlib
 
-from datetime import datetime
-
-from src.utils import settings, logger, utilcmds, updater
+from src.utils import settings, logger, utilcmds, updater, staging
+from plugins.patching import logtail
 from plugins.patching.data.application import AppUtils
 from plugins.patching.agent_update_retriever import AgentUpdateRetriever
+from plugins.patching.indexfreshness import IndexFreshness
+from plugins.patching.distro.deb import deb822, aptlists, depgraph, \
+    debversion, dpkglog, installdates, releasedates, apttransaction
 from plugins.patching.patchingsofoperation import PatchingError, \
-    InstallResult, UninstallResult, CpuPriority
+    InstallResult, UninstallResult, CpuPriority, attribute_changes
 
 
 class FileDataKeys():
@@ -30,6 +30,7 @@ class PkgDictValues():
     uri = 'Filename'
     vendor_severity = 'Priority'
     dependencies = 'Depends'
+    pre_dependencies = 'Pre-Depends'
     installed = 'Status'
     sha256 = 'SHA256'
     sha1 = 'SHA1'
@@ -43,15 +44,33 @@ class DebianHandler():
 
     APT_GET_EXE = '/usr/bin/apt-get'
     APT_CACHE_EXE = '/usr/bin/apt-cache'
+    DPKG_EXE = '/usr/bin/dpkg'
 
     INSTALLED_STATUS = 'install ok installed'
 
-    PARSE_DATE_FORMAT = '%a, %d %b %Y %H:%M:%S %Z'
+    # Touched by the apt daily job when its update succeeds. Nothing a
+    # failed 'apt-get update' also touches, like lists/partial, will do.
+    APT_UPDATE_STAMPS = ['/var/lib/apt/periodic/update-success-stamp']
+
+    # Packages passed to a single apt-cache call, keeps clear of ARG_MAX.
+    APT_ARGS_PER_CALL = 500
 
     def __init__(self):
         self.update_notifier_installed = False
 
         self.utilcmds = utilcmds.UtilCmds()
+        self._status_cache = deb822.StatusFileCache(self.PKG_STATUS_FILE)
+        self._apt_lists = aptlists.AptListsIndex()
+        self._release_dates = releasedates.ReleaseDateFetcher()
+        self._dpkg_log = dpkglog.DpkgLog()
+        self._install_dates = installdates.InstallDateIndex(
+            self.PKG_INSTALL_DATE_DIR
+        )
+        self._index_freshness = IndexFreshness(
+            'apt', aptlists.LISTS_DIR, self.APT_UPDATE_STAMPS
+        )
+        self._stager = staging.Stager()
+        self._native_architecture = None
         self._check_for_dependencies()
 
     def _check_for_dependencies(self):
@@ -77,71 +96,61 @@ class DebianHandler():
         return False
 
     def _apt_update_index(self):
-        """Update index files."""
+        """Update index files.
+
+        Returns:
+            (bool) False if apt reported an error.
+        """
 
         logger.debug('Updating index.')
 
         cmd = [self.APT_GET_EXE, 'update']
-        # TODO: if failure return an indication
         _, err = self.utilcmds.run_command(cmd)
         if err:
             logger.error(err)
 
         logger.debug('Done updating index.')
 
-    # TODO: find something better
-    def _get_install_date(self, package_name):
-        """Get the install date of a package.
-
-        Checks the modification time of the "{package_name}.list"
-        file for each package.
+        # Warnings (W:) are also written to stderr.
+        return not any(
+            line.startswith('E:') for line in (err or '').splitlines()
+        )
 
+    def _get_native_architecture(self):
+        """The architecture dpkg installs packages for, unless told
+        otherwise. None if dpkg couldn't say.
         """
 
-        #TODO: other possible architectures that should be added?
-        default_extension = '.list'
-        amd64_extension = ':amd64.list'
-        i386_extension = ':i386.list'
-
-        #Try to obtain pkg installed-date
-        package_path = self.PKG_INSTALL_DATE_DIR + package_name
-
-        # TODO: test to see if this order of checking is corrrect.
-        if os.path.exists(package_path + default_extension):
-            package_path = package_path + default_extension
-        elif os.path.exists(package_path + amd64_extension):
-            package_path = package_path + amd64_extension
-        elif os.path.exists(package_path + i386_extension):
-            package_path = package_path + i386_extension
-        else:
-            return ''  # Could not find package
+        if self._native_architecture is None:
+            try:
+                result, _ = self.utilcmds.run_command(
+                    [self.DPKG_EXE, '--print-architecture']
+                )
+                self._native_architecture = result.strip() or None
 
-        return os.path.getmtime(package_path)
+            except Exception as e:
+                logger.error('Failed to get the native architecture.')
+                logger.exception(e)
 
-    def _get_release_date(self, uri):
+        return self._native_architecture
 
-        # TODO: figure out how to make it so that the whole
-        # agent doesn't freeze up when user has a bad internet
-        # connection
+    def _get_install_date(self, package_name):
+        """Get the install date of a package.
 
-        if not uri:
-            return ''
+        The mtime of its "{package_name}[:{arch}].list" file, see
+        installdates.InstallDateIndex.
 
-        try:
-            unformatted_date = \
-                urllib.urlopen(uri).info().getheaders('last-modified')[0]
+        """
 
-            date_obj = datetime.strptime(
-                unformatted_date, self.PARSE_DATE_FORMAT
-            )
-            release_date = date_obj.strftime(settings.DATE_FORMAT)
+        return self._install_dates.get(package_name)
 
-        except Exception as e:
-            logger.error('Could not get release date.')
-            logger.exception(e)
-            return ''
+    def _get_release_date(self, uri, sha256=''):
+        """Get the release date of a package file.
 
-        return release_date
+        Fetched once per file, see releasedates.ReleaseDateFetcher.
+        """
+
+        return self._release_dates.get(uri, sha256)
 
     def _translate_severity(self, vendor_severity):
         """
@@ -195,7 +204,8 @@ class DebianHandler():
                 try:
                     release_date = \
                         self._get_release_date(
-                            file_data[0].get(FileDataKeys.uri, '')
+                            file_data[0].get(FileDataKeys.uri, ''),
+                            file_data[0].get(FileDataKeys.hash, '')
                         )
 
                 except Exception as e:
@@ -349,48 +359,90 @@ class DebianHandler():
 
         return self._parse_packages_to_install(result)
 
+    def get_upgradable(self):
+        """Compute the upgradable packages in-process.
+
+        Compares the installed versions from the dpkg status file with the
+        newest version of each package in the apt lists, without running
+        apt-get. Both are cached until dpkg or apt change them, which makes
+        this cheap enough to run often. Pinning and held packages aren't
+        taken into account; check_available_updates stays the reference.
+
+        Returns:
+            (list) Sorted [(name, version)] of the newest candidates.
+        """
+
+        self._apt_lists.refresh()
+
+        upgradable = []
+
+        for name, pkg in self._get_installed_packages().iteritems():
+            installed_version = pkg.get(PkgDictValues.version, '')
+            architecture = pkg.get('Architecture', '')
+
+            candidates = [
+                entry.version
+                for entry in self._apt_lists.get_versions(name)
+                if entry.architecture in (architecture, 'all')
+            ]
+
+            candidate = debversion.newest(candidates)
+
+            if (candidate and
+                    debversion.compare(candidate, installed_version) > 0):
+                upgradable.append((name, candidate))
+
+        return sorted(upgradable)
+
     def _get_installed_packages(self):
         """Return all of the installed packages in a dictionary.
 
+        The status file is only parsed again once dpkg has changed it.
+
         Ex: {'pkg': {...data...}}
         """
 
-        all_pkgs_dict = self._parse_file(self.PKG_STATUS_FILE)
+        return self._status_cache.get_installed(self.INSTALLED_STATUS)
 
-        installed_pkgs_dict = {}
-        for pkg in all_pkgs_dict:
+    def _chunks(self, items):
+        for i in range(0, len(items), self.APT_ARGS_PER_CALL):
+            yield items[i:i + self.APT_ARGS_PER_CALL]
 
-            status = all_pkgs_dict[pkg].get(PkgDictValues.installed, '')
-            if status == self.INSTALLED_STATUS:
-                installed_pkgs_dict[pkg] = all_pkgs_dict[pkg]
+    def _parse_repos_from_cache(self, pkg_names):
+        """Get the repo line of every version of pkg_names.
 
-        return installed_pkgs_dict
+        Runs one 'apt-cache madison' per APT_ARGS_PER_CALL packages.
 
-    def _parse_repo_from_cache(self, pkg_name, version):
-        try:
-            results, err = self.utilcmds.run_command(
-                [self.APT_CACHE_EXE, 'madison', pkg_name]
-            )
+        Returns:
+            (dict) {(pkg_name, version): repo}
+            Ex: repo = 'http://archive.ubuntu.com/ubuntu/ focal/main amd64
+                        Packages'
+        """
 
-            if err:
-                raise Exception(err)
+        repos = {}
 
-            repo_options = [x for x in results.split('\n') if x != '']
+        for chunk in self._chunks(pkg_names):
+            try:
+                results, err = self.utilcmds.run_command(
+                    [self.APT_CACHE_EXE, 'madison'] + chunk
+                )
 
-            for option in repo_options:
-                option = option.split('|')
-                option = [x.strip() for x in option]
+                if err:
+                    logger.error(err)
 
-                if option[1] == version:
-                    return option[2]
+                for line in results.split('\n'):
+                    option = [x.strip() for x in line.split('|')]
 
-        except Exception as e:
-            logger.error(
-                'error with: ' + pkg_name + ' when running apt-cache madison'
-            )
-            logger.exception(e)
+                    if len(option) < 3:
+                        continue
 
-            return ''
+                    repos.setdefault((option[0], option[1]), option[2])
+
+            except Exception as e:
+                logger.error('error when running apt-cache madison')
+                logger.exception(e)
+
+        return repos
 
     def _get_file_data(self, data_dictionary, repo):
         """ Create a dictionary that contains name, uri, hash, size, and
@@ -453,63 +505,202 @@ class DebianHandler():
 
         return file_data
 
-    def get_available_updates_data(self, package_list):
-        update_pkg_data = {}
+    def _show_packages(self, package_list):
+        """Get the apt-cache data of the exact versions in package_list.
 
-        for package in package_list:
-            pkg_name = package[0]
-            pkg_version = package[1]
+        Runs one 'apt-cache show name=version ...' per APT_ARGS_PER_CALL
+        packages.
+
+        Returns:
+            (dict) {(pkg_name, version): {...data...}}
+        """
+
+        show_data = {}
+        args = ['{0}={1}'.format(name, version)
+                for name, version in package_list]
 
+        for chunk in self._chunks(args):
             available_info, err = self.utilcmds.run_command(
-                [self.APT_CACHE_EXE, 'show', pkg_name]
+                [self.APT_CACHE_EXE, 'show'] + chunk
             )
 
-            package_repo = self._parse_repo_from_cache(pkg_name, pkg_version)
+            if err:
+                logger.error(err)
+
+            for option in deb822.iter_paragraphs(
+                available_info.splitlines()
+            ):
+                key = (option.get(PkgDictValues.name, ''),
+                       option.get(PkgDictValues.version, ''))
+
+                # Same version from several repos, first one wins.
+                show_data.setdefault(key, option)
+
+        return show_data
+
+    def _get_data_from_lists(self, package_list):
+        """Look up package_list in the apt lists index.
+
+        Returns:
+            (tuple) ({pkg_name: {...data...}}, [(name, version) not found])
+        """
+
+        found = {}
+        missing = []
 
-            # Includes new packages and old packages
-            package_options = self._parse_info_into_list(available_info)
+        # (pkg_name, name, entry) of each package found.
+        entries = []
 
-            for option in package_options:
-                option_version = option.get(PkgDictValues.version, '')
+        try:
+            self._apt_lists.refresh()
+        except Exception as e:
+            logger.error('Failed to refresh the apt lists index.')
+            logger.exception(e)
 
-                if option_version == pkg_version:
-                    update_pkg_data[pkg_name] = option
+            return found, list(package_list)
 
-                    # add the repo
-                    update_pkg_data[pkg_name]['repo'] = \
-                        self._parse_repo_name(package_repo)
+        for pkg_name, pkg_version in package_list:
+            # apt names packages of a foreign architecture 'name:arch'.
+            name, _, architecture = pkg_name.partition(':')
 
-                    # add file_data
-                    update_pkg_data[pkg_name]['file_data'] = \
-                        self._get_file_data(option, package_repo)
+            entry = self._apt_lists.get_version(
+                name, pkg_version,
+                architecture or self._get_native_architecture()
+            )
+
+            if entry is None:
+                missing.append((pkg_name, pkg_version))
+                continue
+
+            option = {
+                PkgDictValues.name: pkg_name,
+                PkgDictValues.version: entry.version,
+                PkgDictValues.uri: entry.filename,
+                PkgDictValues.sha256: entry.sha256,
+                PkgDictValues.vendor_severity: entry.priority,
+                PkgDictValues.support_url: entry.homepage,
+                PkgDictValues.file_size: entry.installed_size,
+                PkgDictValues.dependencies: entry.depends,
+                PkgDictValues.pre_dependencies: entry.pre_depends,
+                'Size': entry.size
+            }
+
+            option['repo'] = self._parse_repo_name(entry.origin.repo)
+            option['file_data'] = \
+                self._get_file_data(option, entry.origin.repo)
+
+            found[pkg_name] = option
+            entries.append((pkg_name, name, entry))
+
+        # Read from the lists for the reported packages only.
+        descriptions = self._apt_lists.get_descriptions(
+            [(name, entry) for _, name, entry in entries]
+        )
+
+        for (pkg_name, _, _), description in zip(entries, descriptions):
+            found[pkg_name][PkgDictValues.description] = description
+
+        return found, missing
+
+    def get_available_updates_data(self, package_list):
+        """Get the data of every (name, version) in package_list.
+
+        Packages are looked up in the apt lists index first. The ones it
+        doesn't know of fall back to a constant amount of apt-cache calls.
+        """
+
+        update_pkg_data, package_list = \
+            self._get_data_from_lists(package_list)
+
+        if not package_list:
+            return update_pkg_data
+
+        logger.debug(
+            '{0} packages not in the apt lists index, using apt-cache.'
+            .format(len(package_list))
+        )
+
+        show_data = self._show_packages(package_list)
+        repos = self._parse_repos_from_cache(
+            [name for name, _ in package_list]
+        )
+
+        for pkg_name, pkg_version in package_list:
+            option = show_data.get((pkg_name, pkg_version))
+
+            if option is None:
+                logger.error(
+                    'No apt-cache data for {0} {1}.'
+                    .format(pkg_name, pkg_version)
+                )
+                continue
+
+            option = dict(option)
+            package_repo = repos.get((pkg_name, pkg_version), '')
+
+            # add the repo
+            try:
+                option['repo'] = self._parse_repo_name(package_repo)
+            except IndexError:
+                option['repo'] = ''
+
+            # add file_data
+            option['file_data'] = self._get_file_data(option, package_repo)
+
+            update_pkg_data[pkg_name] = option
 
         return update_pkg_data
 
-    def _get_app_dependencies(self, name):
-        cmd = [self.APT_GET_EXE, '-s', 'install', name]
+    def _get_update_graph(self, update_pkgs_data):
+        """Get the dependency graph between the pending updates.
 
-        result, err = self.utilcmds.run_command(cmd)
+        Built from the Depends and Pre-Depends fields of the update data,
+        restricted to packages that have a pending update themselves, in
+        place of running 'apt-get -s install' for every update.
+        """
+
+        relations = {}
+        for name, data in update_pkgs_data.iteritems():
+            relations[name] = ', '.join([
+                data.get(PkgDictValues.dependencies, ''),
+                data.get(PkgDictValues.pre_dependencies, '')
+            ])
+
+        return depgraph.DependencyGraph(relations)
+
+    def _get_update_dependencies(self, update_pkgs_data, graph):
+        """Get the pending updates each update pulls in.
+
+        Returns:
+            (dict) {pkg_name: [{'name': .. , 'version' : .. ,
+                                'app_id' : ..}]}
+        """
 
-        dep_list = []
-        dependencies = self._parse_packages_to_install(result)
+        all_deps = {}
+        for name, deps in graph.closures().iteritems():
+            dep_list = []
 
-        if dependencies:
-            dependencies = [dep for dep in dependencies if dep[0] != name]
+            for dep in sorted(deps):
+                version = update_pkgs_data[dep].get(PkgDictValues.version, '')
 
-            for dep in dependencies:
-                dep_dict = {
-                    'name': dep[0],
-                    'version': dep[1],
-                    'app_id': AppUtils.generate_app_id(dep[0], dep[1])
-                }
+                dep_list.append({
+                    'name': dep,
+                    'version': version,
+                    'app_id': AppUtils.generate_app_id(dep, version)
+                })
 
-                dep_list.append(dep_dict)
+            all_deps[name] = dep_list
 
-        return dep_list
+        return all_deps
 
-    def _append_file_data(self, app, update_apps):
-        # Allows for faster and easier searching
-        updates = {updapp.name: updapp for updapp in update_apps}
+    def _append_file_data(self, app, updates):
+        """Append the file_data of app's dependencies to its own.
+
+        Arguments:
+
+        updates - {name: app} of every update, built once by the caller.
+
+        """
 
         for dep in app.dependencies:
             if dep['name'] in updates:
@@ -527,12 +718,23 @@ class DebianHandler():
         """
         logger.info('Getting available updates.')
 
-        self._apt_update_index()
+        self._index_freshness.refresh(self._apt_update_index)
 
         #installed_packages = self._get_installed_packages()
         update_packages = self.check_available_updates()
 
         update_pkgs_data = self.get_available_updates_data(update_packages)
+        update_deps = self._get_update_dependencies(
+            update_pkgs_data, self._get_update_graph(update_pkgs_data)
+        )
+
+        # Fetch every release date at once, instead of one per app.
+        self._release_dates.prefetch(
+            (data['file_data'][0].get(FileDataKeys.uri, ''),
+             data['file_data'][0].get(FileDataKeys.hash, ''))
+            for data in update_pkgs_data.itervalues()
+            if data.get('file_data')
+        )
 
         apps = []
 
@@ -548,10 +750,9 @@ class DebianHandler():
                     update_pkgs_data[pkg_name], True
                 )
 
-                # Slow, but as accurate as apt-get.
-                # Returns a list of dictionaries which includes all deps
+                # A list of dictionaries which includes all deps
                 # [{'name': .. , 'version' : .. , 'app_id' : ..}]
-                app.dependencies = self._get_app_dependencies(app.name)
+                app.dependencies = update_deps.get(app.name, [])
 
                 apps.append(app)
 
@@ -568,8 +769,9 @@ class DebianHandler():
 
         # Append all dependencies' file_data to app's file_data.
         # Must be done after getting all apps.
+        updates = dict((app.name, app) for app in apps)
         for app in apps:
-            self._append_file_data(app, apps)
+            self._append_file_data(app, updates)
 
         return apps
 
@@ -677,14 +879,16 @@ class DebianHandler():
         logger.debug(log_message)
 
         try:
-
-            for pkg in os.listdir(packages_dir):
-                destination = os.path.join(self.APT_INSTALL_DIR, pkg)
-
-                # TODO: copy vs move
-                shutil.copy(os.path.join(packages_dir, pkg), destination)
-
-            logger.debug('Done moving packages.')
+            # The packages aren't needed once in the apt dir; staging
+            # renames/links them there when on the same filesystem.
+            # Stats are reset so they count this move alone.
+            self._stager.reset_stats()
+            self._stager.stage_dir(packages_dir, self.APT_INSTALL_DIR)
+
+            logger.debug(
+                'Done moving packages: {0}, {1} bytes copied.'
+                .format(self._stager.stats, self._stager.bytes_copied())
+            )
 
             return ''
 
@@ -694,63 +898,73 @@ class DebianHandler():
 
         return 'Failed {0}'.format(log_message)
 
-    def _get_list_difference(self, list_a, list_b):
-        """
-        Returns the difference of of list_a and list_b.
-        (aka) What's in list_a that isn't in list_b
+    def _installed_versions(self, installed_packages):
+        """{name: set(versions)} of _get_installed_packages() output."""
+
+        return dict(
+            (name, set([pkg_dict.get(PkgDictValues.version, '')]))
+            for name, pkg_dict in installed_packages.iteritems()
+        )
+
+    def _get_inventory_mark(self):
+        """Remember the inventory before an install.
+
+        Returns:
+            (tuple) (dpkg log mark, installed packages). The packages are
+            compared to if the log can't be tailed, ex: it was rotated out
+            of reach or truncated during the install.
         """
-        set_a = set(list_a)
-        set_b = set(list_b)
 
-        return set_a.difference(set_b)
+        return self._dpkg_log.mark(), self._get_installed_packages()
 
-    def _get_apps_to_delete(self, old_install_list, new_install_list):
+    def _get_apps_to_add_and_delete(self, inventory_mark):
+        """What changed since _get_inventory_mark() was called.
 
-        difference = self._get_list_difference(
-            old_install_list, new_install_list
-        )
+        Uses the dpkg log when possible, otherwise compares installed
+        versions.
+        """
 
-        apps_to_delete = []
-        for app in difference:
-            app_delete_dict = {
-                'name': app.name,
-                'version': app.version,
-                'app_id': AppUtils.generate_app_id(app.name, app.version)
-            }
+        mark, old_packages = inventory_mark
 
-            apps_to_delete.append(app_delete_dict)
+        installed_packages = self._get_installed_packages()
 
-        return apps_to_delete
+        changes = None
+        if mark is not None:
+            changes = self._dpkg_log.changes_since(mark)
 
-    def _get_apps_to_add(self, old_install_list, new_install_list):
+        if changes is None:
+            logger.info('dpkg log unreadable, comparing installed versions.')
 
-        difference = self._get_list_difference(
-            new_install_list, old_install_list
-        )
+            changes = logtail.diff_versions(
+                self._installed_versions(old_packages),
+                self._installed_versions(installed_packages)
+            )
 
-        apps_to_add = []
-        for app in difference:
-            apps_to_add.append(app.to_dict())
+        added, removed = changes
 
-        return apps_to_add
+        apps_to_delete = [
+            {'name': name,
+             'version': version,
+             'app_id': AppUtils.generate_app_id(name, version)}
+            for name, version in removed
+        ]
 
-    def _get_apps_to_add_and_delete(self, old_install_list):
-        new_install_list = self.get_installed_applications()
+        apps_to_add = []
+        for name, version in added:
+            pkg_dict = installed_packages.get(name)
 
-        apps_to_delete = self._get_apps_to_delete(
-            old_install_list, new_install_list
-        )
+            if (pkg_dict is None or
+                    pkg_dict.get(PkgDictValues.version) != version):
+                continue
 
-        apps_to_add = self._get_apps_to_add(
-            old_install_list, new_install_list
-        )
+            apps_to_add.append(self._create_app_from_dict(pkg_dict).to_dict())
 
         return apps_to_add, apps_to_delete
 
     def install_update(self, install_data, update_dir=None):
         logger.debug('Received install_update call.')
 
-        old_install_list = self.get_installed_applications()
+        inventory_mark = self._get_inventory_mark()
 
         success = 'false'
         error = PatchingError.UpdatesNotFound
@@ -778,7 +992,7 @@ class DebianHandler():
                 app_encoding = app.to_dict()
 
                 apps_to_add, apps_to_delete = \
-                    self._get_apps_to_add_and_delete(old_install_list)
+                    self._get_apps_to_add_and_delete(inventory_mark)
 
         else:
             error = moving_error
@@ -792,8 +1006,136 @@ class DebianHandler():
             apps_to_add
         )
 
+    def install_updates(self, install_data_list, update_dir=None):
+        """Install every package of an operation in one apt transaction.
+
+        Dependency resolution and the dpkg lock are paid once, and the
+        inventory delta is taken once, instead of per package. Each
+        package's outcome is attributed from the apt-get output. If apt
+        can't even start the transaction (ex: a package it can't locate),
+        the packages are installed one at a time with install_update.
+
+        Returns:
+            (list) InstallResult of each install_data, in order.
+        """
+
+        logger.debug(
+            'Installing {0} packages in one transaction.'
+            .format(len(install_data_list))
+        )
+
+        if not update_dir:
+            update_dir = settings.UpdatesDirectory
+
+        inventory_mark = self._get_inventory_mark()
+
+        results = {}
+        to_install = []
+
+        for install_data in install_data_list:
+            moving_error = self._move_pkgs_to_apt_dir(
+                os.path.join(update_dir, install_data.id)
+            )
+
+            if moving_error:
+                results[install_data.id] = InstallResult(
+                    'false', moving_error, 'false',
+                    AppUtils.null_application().to_dict(), [], []
+                )
+            else:
+                to_install.append(install_data)
+
+        if not to_install:
+            return [results[data.id] for data in install_data_list]
+
+        install_command = [
+            'nice',
+            '-n',
+            CpuPriority.niceness_to_string(to_install[0].proc_niceness),
+            self.APT_GET_EXE,
+            'install',
+            '-y'
+        ]
+        install_command.extend(data.name for data in to_install)
+
+        try:
+            output, err = self.utilcmds.run_command(install_command)
+        except Exception as e:
+            logger.error('Failed to run the apt transaction.')
+            logger.exception(e)
+            output, err = '', str(e)
+
+        native_architecture = self._get_native_architecture()
+
+        done, failed = apttransaction.parse(
+            '{0}\n{1}'.format(output, err), native_architecture
+        )
+
+        if not done and not failed:
+            logger.info(
+                'apt transaction did nothing, installing one at a time.'
+            )
+
+            for install_data in to_install:
+                results[install_data.id] = \
+                    self.install_update(install_data, update_dir)
+
+            return [results[data.id] for data in install_data_list]
+
+        restart = 'true' if self._check_for_reboot_required() else 'false'
+
+        apps_to_add, apps_to_delete = \
+            self._get_apps_to_add_and_delete(inventory_mark)
+
+        # name: canonical name, as apttransaction reports them.
+        canonical = dict(
+            (data.name,
+             apttransaction.canonical_name(data.name, native_architecture))
+            for data in to_install
+        )
+
+        # Inventory apps are named without the architecture.
+        def bare(name):
+            return canonical[name].partition(':')[0]
+
+        # Changes of the requested packages go to their own result, the
+        # ones of their dependencies to the first successful result.
+        requested = set(bare(data.name) for data in to_install)
+        first_success = next(
+            (bare(data.name) for data in to_install
+             if canonical[data.name] in done),
+            None
+        )
+
+        for install_data in to_install:
+            name = bare(install_data.name)
+
+            if canonical[install_data.name] in done:
+                success, error = 'true', ''
+                app_encoding = self._get_installed_app(name).to_dict()
+            else:
+                success = 'false'
+                error = failed.get(
+                    canonical[install_data.name],
+                    'Not installed by the apt transaction.'
+                )
+                app_encoding = AppUtils.null_application().to_dict()
+
+            results[install_data.id] = InstallResult(
+                success,
+                error,
+                restart,
+                app_encoding,
+                attribute_changes(
+                    apps_to_delete, name, requested, first_success
+                ),
+                attribute_changes(apps_to_add, name, requested, first_success)
+            )
+
+        return [results[data.id] for data in install_data_list]
+
     def install_supported_apps(self, install_data, update_dir=None):
-        old_install_list = self.get_installed_applications()
+        inventory_mark = self._get_inventory_mark()
 
         success = 'false'
         error = 'Failed to install application.'
@@ -825,7 +1167,7 @@ class DebianHandler():
 
             if success == 'true':
                 apps_to_add, apps_to_delete = \
-                    self._get_apps_to_add_and_delete(old_install_list)
+                    self._get_apps_to_add_and_delete(inventory_mark)
 
         except Exception as e:
             error = ("Failed to install updates from: {0}"
@@ -10,7 +10,7 @@ import time
 
 from src.utils import logger, settings, utilcmds
 
-from plugins.patching.distro.redhat import yum
+from plugins.patching.distro.redhat import yum, rpmlog, rpmdb
 from plugins.patching.operationhandler.rpmhandler import RpmOpHandler
 
 from plugins.patching.data.application import AppUtils
@@ -247,6 +247,8 @@ class RhelOpHandler(RpmOpHandler):
 
     def __init__(self):
         self.utilcmds = utilcmds.UtilCmds()
+        self._transaction_log = rpmlog.RpmTransactionLog()
+        self._rpmdb = rpmdb.RpmDb()
 
         self._install_security_plugin()
         self.yum_parse = YumParse()
@@ -265,7 +267,7 @@ class RhelOpHandler(RpmOpHandler):
 
         try:
             logger.debug("Renewing repo cache.")
-            yum.renew_repo_cache()
+            self._renew_repo_cache()
             logger.debug("Done renewing repo cache.")
 
             logger.debug("Getting list of available updates.")
@@ -352,6 +354,24 @@ class RhelOpHandler(RpmOpHandler):
 
             return []
 
+    def install_updates(self, install_data_list, update_dir=None):
+        """Updates every package of an operation through a single
+        'yum update'.
+
+        Returns:
+
+            - A list with the InstallResult of each install_data, in order.
+
+        """
+
+        results = self._yum_transaction(
+            install_data_list,
+            ['update', '-y'] + [data.name for data in install_data_list],
+            lambda data: self.install_update(data, update_dir)
+        )
+
+        return [results[data.id] for data in install_data_list]
+
     def install_update(self, install_data, update_dir=None):
         logger.debug('Received install_update call.')
 
@@ -362,7 +382,7 @@ class RhelOpHandler(RpmOpHandler):
         apps_to_delete = []
         apps_to_add = []
 
-        old_install_list = self.get_installed_applications()
+        inventory_mark = self._get_inventory_mark()
 
         success, error, restart = self._yum_update(
             install_data.name, install_data.proc_niceness
@@ -370,13 +390,11 @@ class RhelOpHandler(RpmOpHandler):
 
         if success == 'true':
 
-            new_install_list = self.get_installed_applications()
-
-            app = self._get_installed_app(install_data.name, new_install_list)
-            app_encoding = app.to_dict()
+            apps_to_add, apps_to_delete = \
+                self._get_apps_to_add_and_delete(inventory_mark)
 
-            apps_to_add, apps_to_delete = self._get_apps_to_add_and_delete(
-                old_install_list, new_install_list
+            app_encoding = self._get_installed_app_dict(
+                install_data.name, apps_to_add
             )
 
         return InstallResult(
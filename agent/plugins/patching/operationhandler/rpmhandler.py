@@ -6,79 +6,127 @@ from src.serveroperation.sofoperation import *
 from src.utils import logger, settings, updater, utilcmds
 
 from plugins.patching.data.application import AppUtils
+from plugins.patching import logtail
+from plugins.patching.indexfreshness import IndexFreshness
 from plugins.patching.patchingsofoperation import InstallResult, UninstallResult, \
-    PatchingOperationKey, CpuPriority
-from plugins.patching.distro.redhat import yum
+    PatchingOperationKey, CpuPriority, attribute_changes
+from plugins.patching.distro.redhat import yum, rpmlog, rpmdb, yumtransaction
 from plugins.patching.distro.redhat.yum.repos import RepoData, get_primary_file
 
 
 class RpmOpHandler():
 
+    # Touched by 'makecache' of yum and dnf respectively.
+    YUM_CACHE_STAMP = 'cachecookie'
+    DNF_CACHE_STAMP = '/var/cache/dnf/last_makecache'
+
     def __init__(self):
         self.utilcmds = utilcmds.UtilCmds()
+        self._transaction_log = rpmlog.RpmTransactionLog()
+        self._rpmdb = rpmdb.RpmDb()
 
-    def _get_list_difference(self, list_a, list_b):
-        """
-        Returns the difference of list_a and list_b.
-        (aka) What's in list_a that isn't in list_b
+    def _renew_repo_cache(self):
+        """Renews the repo cache, unless it was renewed recently."""
+
+        cache_dir = yum.get_cache_dir() or '/var/cache/yum'
+
+        freshness = IndexFreshness(
+            'yum',
+            cache_dir,
+            [os.path.join(cache_dir, '*', self.YUM_CACHE_STAMP),
+             self.DNF_CACHE_STAMP]
+        )
+
+        return freshness.refresh(lambda: yum.renew_repo_cache() == 0)
+
+    def _get_installed_versions(self, names=None):
+        """Get {name: set(versions)} of names, or of every package.
+
+        Versions are formatted as VERSION-RELEASE.
         """
-        set_a = set(list_a)
-        set_b = set(list_b)
 
-        return set_a.difference(set_b)
+        if names is not None:
+            names = set(names)
 
-    def _get_apps_to_delete(self, old_install_list, new_install_list):
+        versions = {}
+        for package in self._rpmdb.packages():
+            if names is None or package.name in names:
+                versions.setdefault(package.name, set()).add(package.version)
 
-        difference = self._get_list_difference(
-            old_install_list, new_install_list
-        )
+        return versions
 
-        apps_to_delete = []
-        for app in difference:
-            app_delete_dict = {
-                'name': app.name,
-                'version': app.version,
-                'app_id': AppUtils.generate_app_id(app.name, app.version)
-            }
+    def _get_inventory_mark(self):
+        """Remember the inventory before an install.
 
-            apps_to_delete.append(app_delete_dict)
+        Returns:
+            (tuple) (transaction log mark, versions). The versions are
+            compared to if the log can't be tailed, ex: it was rotated
+            out of reach or truncated during the install.
+        """
 
-        return apps_to_delete
+        return self._transaction_log.mark(), self._get_installed_versions()
 
-    def _get_apps_to_add(self, old_install_list, new_install_list):
+    def _get_apps_to_add_and_delete(self, inventory_mark):
+        """What changed since _get_inventory_mark() was called.
 
-        difference = self._get_list_difference(
-            new_install_list, old_install_list
-        )
+        Uses the yum/dnf transaction log when possible, which only queries
+        the packages that changed, otherwise compares installed versions.
+        """
 
-        apps_to_add = []
-        for app in difference:
-            apps_to_add.append(app.to_dict())
+        mark, old_versions = inventory_mark
 
-        return apps_to_add
+        changes = None
+        if mark is not None:
+            changes = self._transaction_log.changes_since(mark)
 
-    def _get_apps_to_add_and_delete(self, old_install_list,
-                                    new_install_list=None):
+        if changes is None:
+            logger.info(
+                'Transaction log unreadable, comparing installed versions.'
+            )
 
-        if not new_install_list:
-            new_install_list = self.get_installed_applications()
+            added, removed = logtail.diff_versions(
+                old_versions, self._get_installed_versions()
+            )
 
-        apps_to_delete = self._get_apps_to_delete(
-            old_install_list, new_install_list
-        )
+        else:
+            added, removed = changes
+
+            if not self._transaction_log.logs_removed_versions():
+                # yum.log doesn't say which versions went away: whatever
+                # was installed before and isn't anymore.
+                names = set(name for name, _ in added + removed)
+                new_versions = self._get_installed_versions(sorted(names))
+
+                removed = [
+                    (name, version) for name in sorted(names)
+                    for version in sorted(old_versions.get(name, set()) -
+                                          new_versions.get(name, set()))
+                ]
+
+        apps_to_delete = [
+            {'name': name,
+             'version': version,
+             'app_id': AppUtils.generate_app_id(name, version)}
+            for name, version in removed
+        ]
 
-        apps_to_add = self._get_apps_to_add(
-            old_install_list, new_install_list
-        )
+        apps_to_add = []
+        for name, version in added:
+            package = self._rpmdb.get(name, version)
+
+            if package:
+                apps_to_add.append(
+                    self._create_installed_app(package).to_dict()
+                )
 
         return apps_to_add, apps_to_delete
 
-    def _get_installed_app(self, name, install_list):
-        for app in install_list:
-            if app.name == name:
-                return app
+    def _get_installed_app_dict(self, name, app_dicts):
+        for app_dict in app_dicts:
+            if app_dict['name'] == name:
+                return app_dict
 
-        return AppUtils.null_application()
+        return AppUtils.null_application().to_dict()
 
     def _yum_local_update(self, package_name, packages_dir, proc_niceness):
         logger.debug('Installing {0}'.format(package_name))
@@ -117,7 +165,7 @@ class RpmOpHandler():
     def install_update(self, install_data, update_dir=None):
         logger.debug('Received install_update call.')
 
-        old_install_list = self.get_installed_applications()
+        inventory_mark = self._get_inventory_mark()
 
         success = 'false'
         error = ''
@@ -138,15 +186,11 @@ class RpmOpHandler():
 
             if success == 'true':
 
-                new_install_list = self.get_installed_applications()
-
-                app = self._get_installed_app(
-                    install_data.name, new_install_list
-                )
-                app_encoding = app.to_dict()
+                apps_to_add, apps_to_delete = \
+                    self._get_apps_to_add_and_delete(inventory_mark)
 
-                apps_to_add, apps_to_delete = self._get_apps_to_add_and_delete(
-                    old_install_list, new_install_list
+                app_encoding = self._get_installed_app_dict(
+                    install_data.name, apps_to_add
                 )
 
         else:
@@ -163,6 +207,126 @@ class RpmOpHandler():
             apps_to_add
         )
 
+    def _yum_transaction(self, install_data_list, cmd_args, serial_install):
+        """Runs one yum transaction for every package in install_data_list.
+
+        Args:
+
+            - install_data_list: The InstallData to install.
+            - cmd_args: Arguments following 'yum', Ex: ['update', '-y', ..]
+            - serial_install: Called as serial_install(install_data) for each
+                package if yum can't run the transaction as a whole.
+
+        Returns:
+
+            - {install_data.id: InstallResult}
+
+        """
+
+        inventory_mark = self._get_inventory_mark()
+
+        cmd = [
+            'nice',
+            '-n',
+            CpuPriority.niceness_to_string(install_data_list[0].proc_niceness),
+            yum.yum_cmd
+        ]
+        cmd.extend(cmd_args)
+
+        try:
+            output, err = self.utilcmds.run_command(cmd)
+        except Exception as e:
+            logger.error('Failed to run the yum transaction.')
+            logger.exception(e)
+            output, err = '', str(e)
+
+        done = yumtransaction.parse(output)
+        requested = set(data.name for data in install_data_list)
+
+        results = {}
+
+        if not done & requested:
+            logger.info(
+                'yum transaction installed nothing requested, installing one '
+                'at a time.'
+            )
+
+            for install_data in install_data_list:
+                results[install_data.id] = serial_install(install_data)
+
+            return results
+
+        apps_to_add, apps_to_delete = \
+            self._get_apps_to_add_and_delete(inventory_mark)
+
+        first_success = next(
+            (data.name for data in install_data_list if data.name in done),
+            None
+        )
+
+        for install_data in install_data_list:
+            name = install_data.name
+
+            if name in done:
+                success, error = 'true', ''
+                app_encoding = self._get_installed_app_dict(name, apps_to_add)
+            else:
+                success = 'false'
+                error = err or 'Not updated by the yum transaction.'
+                app_encoding = AppUtils.null_application().to_dict()
+
+            results[install_data.id] = InstallResult(
+                success,
+                error,
+                'false',  # TODO: figure out if restart needed
+                app_encoding,
+                attribute_changes(
+                    apps_to_delete, name, requested, first_success
+                ),
+                attribute_changes(apps_to_add, name, requested, first_success)
+            )
+
+        return results
+
+    def install_updates(self, install_data_list, update_dir=None):
+        """Installs every downloaded package of an operation through a single
+        'yum localupdate'.
+
+        Returns:
+
+            - A list with the InstallResult of each install_data, in order.
+
+        """
+
+        if not update_dir:
+            update_dir = settings.UpdatesDirectory
+
+        results = {}
+        to_install = []
+        rpms = []
+
+        for install_data in install_data_list:
+            if not install_data.downloaded:
+                results[install_data.id] = InstallResult(
+                    'false', 'Failed to download packages.', 'false',
+                    AppUtils.null_application().to_dict(), [], []
+                )
+                continue
+
+            to_install.append(install_data)
+            rpms.extend(glob.glob(
+                os.path.join(update_dir, install_data.id, '*.rpm')
+            ))
+
+        if to_install:
+            results.update(self._yum_transaction(
+                to_install,
+                ['--nogpgcheck', 'localupdate', '-y'] + rpms,
+                lambda data: self.install_update(data, update_dir)
+            ))
+
+        return [results[data.id] for data in install_data_list]
+
     def _yum_update(self, package_name, proc_niceness):
         logger.debug('Updating: {0}'.format(package_name))
 
@@ -198,7 +362,7 @@ class RpmOpHandler():
         return 'true', '', restart
 
     def install_supported_apps(self, install_data, update_dir=None):
-        old_install_list = self.get_installed_applications()
+        inventory_mark = self._get_inventory_mark()
 
         success = 'false'
         error = 'Failed to install application.'
@@ -230,7 +394,7 @@ class RpmOpHandler():
 
             if success == 'true':
                 apps_to_add, apps_to_delete = \
-                    self._get_apps_to_add_and_delete(old_install_list)
+                    self._get_apps_to_add_and_delete(inventory_mark)
 
         except Exception as e:
             error = ("Failed to install updates from: {0}"
@@ -434,7 +598,7 @@ class RpmOpHandler():
 
         try:
 
-            yum.renew_repo_cache()
+            self._renew_repo_cache()
             updates_available = yum.list_updates()
             rd = RepoData()
             primary_files = {}
@@ -558,6 +722,28 @@ class RpmOpHandler():
 
         return []
 
+    def _create_installed_app(self, package):
+        """Creates an Application out of an rpmdb.RpmPackage."""
+
+        return AppUtils.create_app(
+            package.name,  # app name
+            package.version,  # app version
+            package.description,  # app description
+            [],  # file_data
+            [],  # dependencies
+            package.url,  # support url
+            '',  # vendor_severity
+            package.size,  # app size
+            '',  # vendor_id
+            package.vendor,  # app's vendor
+            package.install_time,  # install_date
+            package.build_time,  # release_date
+            True,  # installed
+            '',  # repo
+            'no',  # reboot_required
+            'yes'  # TODO: check if app is uninstallable
+        )
+
     def get_installed_applications(self):
         """Gets installed RPM-based applications.
 
@@ -570,71 +756,10 @@ class RpmOpHandler():
 
         installed_apps = []
 
-        # Get the data in a nice, easy, parsable format.
-        query_separator = '**!VFENSE!**'
-        query_format = (
-            '"%{{NAME}}{0}%{{VERSION}}-%{{RELEASE}}{0}%{{INSTALLTIME}}'
-            '{0}%{{BUILDTIME}}{0}%{{SIZE}}{0}%{{VENDOR}}{0}'
-            '%{{URL}}{0}%{{DESCRIPTION}}"'.format(query_separator)
-        )
-
         try:
 
-            output, _ = self.utilcmds.run_command(['rpm', '-qa'])
-
-            installed_list = output.splitlines()
-
-            for app in installed_list:
-
-                try:
-
-                    rpm_query = \
-                        ['rpm', '-q', app, '--queryformat', query_format]
-
-                    output, _ = self.utilcmds.run_command(rpm_query)
-
-                    app_info = output.split(query_separator)
-
-                    # Little bit of cleanup
-                    name = app_info[RpmQueryInfo.Name]
-                    if name.startswith('"'):
-                        name = name[1:]
-
-                    description = app_info[RpmQueryInfo.Description]
-                    description = description.replace('\n', ' ')
-                    if description.endswith('"'):
-                        description = description[0:-1]
-                    #######################
-
-                    application = AppUtils.create_app(
-                        name,  # app name
-                        app_info[RpmQueryInfo.Version],  # app version
-                        description,  # app description
-                        [],  # file_data
-                        [],  # dependencies
-                        app_info[RpmQueryInfo.Url],  # support url
-                        '',  # vendor_severity
-                        app_info[RpmQueryInfo.Size],  # app size
-                        '',  # vendor_id
-                        app_info[RpmQueryInfo.Vendor],  # app's vendor
-                        app_info[RpmQueryInfo.InstallDate],  # install_date
-                        app_info[RpmQueryInfo.ReleaseDate],  # release_date
-                        True,  # installed
-                        '',  # repo
-                        'no',  # reboot_required
-                        'yes'  # TODO: check if app is uninstallable
-                    )
-
-                except Exception as e:
-                    logger.error(
-                        "Error while checking installed application. Skipping"
-                    )
-                    logger.exception(e)
-                    application = None
-
-                if application:
-
-                    installed_apps.append(application)
+            for package in self._rpmdb.packages():
+                installed_apps.append(self._create_installed_app(package))
 
         except Exception as e:
             logger.error("Error while checking installed applications.")
@@ -748,14 +873,3 @@ class RpmOpHandler():
 
         return file_data
 
-
-class RpmQueryInfo():
-
-    Name = 0
-    Version = 1
-    InstallDate = 2
-    ReleaseDate = 3
-    Size = 4
-    Vendor = 5
-    Url = 6
-    Description = 7
@@ -1,18 +1,20 @@
 import shutil
 import os
 import platform
-import glob
 import json
 import urllib2
 
 from agentplugin import AgentPlugin
 from src.utils import RepeatTimer, settings, logger, systeminfo, uninstaller, \
-    throd
+    downloader, extractor
 from src.serveroperation.sofoperation import SofOperation, OperationKey, \
     OperationValue
 
 from patching.data.application import AppUtils
 from patching.agent_update_retriever import AgentUpdateRetriever
+from patching.agent_log_uploader import AgentLogUploader
+from patching.pipeline import InstallPipeline
+from patching.prefetcher import Prefetcher
 from patching.patchingsofoperation import PatchingSofOperation, \
     PatchingError, PatchingOperationValue, PatchingOperationKey, \
     PatchingSofResult
@@ -31,7 +33,9 @@ class PatchingPlugin(AgentPlugin):
         self._update_directory = settings.UpdatesDirectory
         self._operation_handler = self._get_op_handler()
         self.uninstaller = uninstaller.Uninstaller()
-        self.throd = throd.ThrottleDownload()
+        self.downloader = downloader.Downloader()
+        self.extractor = extractor.Extractor()
+        self._prefetcher = Prefetcher()
 
     def _get_op_handler(self):
 
@@ -79,6 +83,21 @@ class PatchingPlugin(AgentPlugin):
         self._timer = RepeatTimer(43200, self.run_refresh_apps_operation)
         self._timer.start()
 
+        # Handlers able to compute the upgradable set offline are checked
+        # far more often, refreshing as soon as the set changes.
+        if hasattr(self._operation_handler, 'get_upgradable'):
+            self._upgradable = None
+            self._upgradable_timer = RepeatTimer(
+                settings.UpgradableCheckInterval, self._check_upgradable
+            )
+            self._upgradable_timer.start()
+
+        if settings.PrefetchInterval:
+            self._prefetch_timer = RepeatTimer(
+                settings.PrefetchInterval, self._prefetcher.run
+            )
+            self._prefetch_timer.start()
+
     def stop(self):
         """ Runs once the agent core is shutting down.
         @return: Nothing
@@ -170,11 +189,23 @@ class PatchingPlugin(AgentPlugin):
 
         # TODO: if operation specifies update directory, change to that
         update_dir = settings.UpdatesDirectory
+
+        # Leaves the bandwidth to the install.
+        self._prefetcher.pause()
+
+        try:
+            self._install(operation, update_dir)
+        finally:
+            self._prefetcher.resume()
+
+    def _install(self, operation, update_dir):
         failed_to_download = False
 
         try:
 
-            self._download_packages(operation)
+            # Pipelined apps are downloaded while installing.
+            if not self._pipelined(operation):
+                self._download_packages(operation)
 
         except Exception as e:
             logger.error("Error occured while downloading updates.")
@@ -211,14 +242,67 @@ class PatchingPlugin(AgentPlugin):
             else:
                 self._regular_update(operation, update_dir)
 
-    def _regular_update(self, operation, update_dir):
+    def _batched(self, operation):
+        """Whether the operation's updates install in a single package
+        manager transaction.
+        """
+
+        return (
+            operation.type == PatchingOperationValue.InstallUpdate and
+            len(operation.install_data_list) > 1 and
+            hasattr(self._operation_handler, 'install_updates')
+        )
+
+    def _pipelined(self, operation):
+        """Whether the operation's apps are installed one by one, each as
+        soon as it is downloaded.
+        """
+
+        return (
+            operation.type != PatchingOperationValue.InstallAgentUpdate and
+            not self._batched(operation)
+        )
+
+    def _install_results(self, operation, update_dir):
+        """Yields (install_data, install_result) for the whole operation.
+
+        Updates go through a single package manager transaction when the
+        handler supports it. Otherwise there's one install call per app,
+        while the following apps download; if one raises, the downloads
+        are cancelled.
+        """
+
+        install_data_list = operation.install_data_list
+
+        if self._batched(operation):
+            install_results = self._operation_handler.install_updates(
+                install_data_list, update_dir
+            )
+
+            for result in zip(install_data_list, install_results):
+                yield result
+
+            return
+
         install_method = self._get_install_method(operation.type)
 
-        restart_needed = False
+        self.downloader.set_rate(operation.net_throttle)
+        install_pipeline = InstallPipeline(
+            install_data_list, self._download_app
+        )
 
-        for install_data in operation.install_data_list:
+        try:
+            for install_data in install_pipeline:
+                yield install_data, install_method(install_data, update_dir)
+
+        finally:
+            install_pipeline.cancel()
+
+    def _regular_update(self, operation, update_dir):
+        restart_needed = False
 
-            install_result = install_method(install_data, update_dir)
+        for install_data, install_result in \
+                self._install_results(operation, update_dir):
 
             if install_result.restart == 'true':
                 restart_needed = True
@@ -292,40 +376,6 @@ class PatchingPlugin(AgentPlugin):
 
         return pkg_sizes
 
-    def _check_if_downloaded(self, file_path, expected_size):
-        file_name = os.path.basename(file_path)
-        downloaded_size = os.path.getsize(file_path)
-
-        if isinstance(expected_size, basestring):
-            logger.debug("expected_size is instance of basestring.")
-
-            try:
-                expected_size = int(expected_size)
-            except:
-                logger.error("Failed to convert expected_size to int.")
-
-        if downloaded_size == expected_size:
-            logger.debug(
-                "{0} IS the right size: {1} == {2}"
-                .format(file_name, downloaded_size, expected_size)
-            )
-
-            return True
-
-        else:
-            logger.critical(
-                "{0} is NOT the right size: {1} != {2}"
-                .format(file_name, downloaded_size, expected_size)
-            )
-
-            logger.debug(
-                "types: {0} and {1}".format(
-                    type(downloaded_size), type(expected_size)
-                )
-            )
-
-        return False
-
     def _uninstall_agent_operation(self, operation):
         logger.debug("Attempting to uninstall agent.")
         self.uninstaller.uninstall()
@@ -485,155 +535,142 @@ class PatchingPlugin(AgentPlugin):
         self._operation_handler.get_installed_updates()
         self._operation_handler.get_installed_applications()
 
-    def _download_file(self, uri, download_dir, dl_rate=None):
-        """
-        Loops through all the file_uris provided and terminates when
-        downloaded successfully or exhausts the file_uris list.
+    def _app_download_jobs(self, install_data):
+        """ Creates an empty directory for the app's files.
 
         Returns:
-            (bool) - Successful download.
-        """
-        file_uris = uri[PatchingOperationKey.FileUris]
-        file_size = uri[PatchingOperationKey.FileSize]
-
-        # Loop through each possible uri for the package
-        for file_uri in file_uris:
-            logger.debug("Downloading from: {0}".format(file_uri))
-
-            file_name = os.path.basename(file_uri)
-            download_path = os.path.join(download_dir, file_name)
-
-            try:
-                self.throd.set_rate(dl_rate)
-                self.throd.download(file_uri, download_path)
-
-                if self._check_if_downloaded(download_path, file_size):
-                    logger.debug("Downloaded successfully.")
-                    return True
-                else:
-                    logger.error(
-                        "Failed  to download from: {0}".format(file_uri)
-                    )
+            (list) A downloader.DownloadJob per file, [] and
+            install_data.downloaded set to False on failure.
 
-            except Exception as dlerr:
-                logger.error("Failed  to download from: {0}".format(file_uri))
-                logger.exception(dlerr)
+        """
 
-                continue
+        app_dir = os.path.join(self._update_directory, install_data.id)
 
-        logger.debug("Failed to download.")
+        if os.path.isdir(app_dir):
+            shutil.rmtree(app_dir)
 
-        return False
+        jobs = []
 
-    def _download_packages(self, operation):
-        """ Download packages from the urls provided in the 'operation'
-         parameter.
+        try:
+            if not os.path.isdir(self._update_directory):
+                os.mkdir(self._update_directory)
 
-        Args:
-            - operation: Operation to be worked with.
+            os.mkdir(app_dir)
 
-        Returns:
-            Nothing
+            install_data.downloaded = True
 
-        """
+            # The individual packages that make up the app
+            for uri in install_data.uris:
+                logger.debug(
+                    "File uris: {0}".format(uri[PatchingOperationKey.FileUris])
+                )
 
-        if not os.path.isdir(self._update_directory):
-            os.mkdir(self._update_directory)
+                jobs.append(downloader.DownloadJob(
+                    uri[PatchingOperationKey.FileUris],
+                    app_dir,
+                    uri[PatchingOperationKey.FileSize],
+                    uri.get(PatchingOperationKey.FileHash, '')
+                ))
 
-        # Loop through every app
-        for install_data in operation.install_data_list:
-            app_dir = os.path.join(self._update_directory, install_data.id)
+        except Exception as e:
+            logger.error(
+                "Failed while downloading update {0}."
+                .format(install_data.name)
+            )
+            logger.exception(e)
 
-            if os.path.isdir(app_dir):
-                shutil.rmtree(app_dir)
+            logger.debug(
+                "Setting downloaded to false for: " + install_data.name
+            )
+            install_data.downloaded = False
 
-            try:
-                os.mkdir(app_dir)
+            return []
 
-                install_data.downloaded = True
+        return jobs
 
-                # Loop through the individual packages that make up the app
-                for uri in install_data.uris:
-                    logger.debug(
-                        "File uris: {0}".format(
-                            uri[PatchingOperationKey.FileUris]
-                        )
-                    )
+    def _finish_app_download(self, install_data, jobs, paths):
+        """ Checks that every file of the app was downloaded and extracts
+        them.
 
-                    dl_success = self._download_file(
-                        uri, app_dir, operation.net_throttle
-                    )
-                    if not dl_success:
-                        # On failure to download a single file, quit.
-                        install_data.downloaded = False
-                        break
+        Args:
+            - jobs: The app's downloader.DownloadJob list.
+            - paths: Downloader.fetch_all's result for jobs.
 
-                if install_data.downloaded:
-                    # Known file extensions to work on.
-                    self._untar_files(app_dir)
-                    self._unzip_files(app_dir)
+        """
 
-            except Exception as e:
+        for job, path in zip(jobs, paths):
+            if path is None:
+                # On failure to download a single file, the app fails.
                 logger.error(
-                    "Failed while downloading update {0}."
-                    .format(install_data.name)
-                )
-                logger.exception(e)
-
-                logger.debug(
-                    "Setting downloaded to false for: " + install_data.name
+                    "Failed to download {0} for {1}."
+                    .format(job.uris, install_data.name)
                 )
                 install_data.downloaded = False
 
-    def _untar_files(self, directory):
-        """ Scans a directory for any tar files and 'untars' them. Scans
-        recursively just in case there's tars within tars. Deletes tar files
-        when done.
+        if not install_data.downloaded:
+            return
 
-        @param directory: Directory to be scanned.
-        @return: Nothing
-        """
+        app_dir = os.path.join(self._update_directory, install_data.id)
 
-        tars = glob.glob(os.path.join(directory, '*.tar*'))
+        try:
+            # Known file extensions to work on.
+            self.extractor.extract_all(app_dir)
 
-        if not tars:
-            return
+        except Exception as e:
+            logger.error(
+                "Failed while extracting update {0}."
+                .format(install_data.name)
+            )
+            logger.exception(e)
 
-        import tarfile
+            install_data.downloaded = False
 
-        try:
-            for tar_file in tars:
-                tar = tarfile.open(tar_file)
-                tar.extractall(path=directory)
-                tar.close()
-                os.remove(tar_file)
+    def _download_packages(self, operation):
+        """ Download packages from the urls provided in the 'operation'
+         parameter.
 
-            self._untar_files(directory)
+        Every file of every app is downloaded concurrently, see
+        downloader.Downloader, within the operation's net_throttle.
 
-        except OSError as e:
-            logger.info("Could not extract tarball.")
-            logger.exception(e)
+        Args:
+            - operation: Operation to be worked with.
 
-    def _unzip_files(self, directory):
-        zips = glob.glob(os.path.join(directory, '*.zip'))
+        Returns:
+            Nothing
 
-        if not zips:
-            return
+        """
 
-        import zipfile
+        # install_data: its DownloadJob list
+        app_jobs = [
+            (install_data, self._app_download_jobs(install_data))
+            for install_data in operation.install_data_list
+        ]
 
-        try:
-            for zip_file in zips:
-                zip = zipfile.ZipFile(zip_file)
-                zip.extractall(directory)
-                zip.close()
-                os.remove(zip_file)
+        self.downloader.set_rate(operation.net_throttle)
+        paths = self.downloader.fetch_all(
+            [job for _, jobs in app_jobs for job in jobs]
+        )
 
-            self._unzip_files(directory)
+        for install_data, jobs in app_jobs:
+            self._finish_app_download(
+                install_data, jobs, paths[:len(jobs)]
+            )
+            paths = paths[len(jobs):]
 
-        except OSError as e:
-            logger.info("Could not extract zipfile.")
-            logger.exception(e)
+    def _download_app(self, install_data, cancel=None):
+        """ Downloads a single app's files, stopping when cancel is set.
+        The rate must already be set on self.downloader.
+
+        """
+
+        jobs = self._app_download_jobs(install_data)
+        paths = self.downloader.fetch_all(jobs, cancel)
+
+        if cancel and cancel.is_set():
+            install_data.downloaded = False
+            return
+
+        self._finish_app_download(install_data, jobs, paths)
 
     def available_updates_operation(self, operation):
         operation.applications = self.get_available_updates()
@@ -646,7 +683,10 @@ class PatchingPlugin(AgentPlugin):
          updates.
         """
 
-        return self._operation_handler.get_available_updates()
+        updates = self._operation_handler.get_available_updates()
+        self._prefetcher.set_updates(updates)
+
+        return updates
 
     def installed_applications_operation(self, operation):
         operation.applications = self.get_applications_installed()
@@ -735,6 +775,29 @@ class PatchingPlugin(AgentPlugin):
 
         self._register_operation(operation)
 
+    def _check_upgradable(self):
+        """Runs a refresh apps operation if the upgradable set changed since
+        the last check.
+        """
+
+        try:
+            upgradable = self._operation_handler.get_upgradable()
+
+        except Exception as e:
+            logger.error("Failed to check for upgradable packages.")
+            logger.exception(e)
+
+            return
+
+        if self._upgradable is not None and upgradable != self._upgradable:
+            logger.info(
+                "Upgradable packages changed ({0} now), refreshing apps."
+                .format(len(upgradable))
+            )
+            self.run_refresh_apps_operation()
+
+        self._upgradable = upgradable
+
     def check_for_agent_update(self):
         agent_version = settings.AgentVersion.split('-')
         version_string = agent_version[0]
@@ -778,33 +841,35 @@ class PatchingPlugin(AgentPlugin):
 
         apps.extend(self._operation_handler.get_installed_updates())
         apps.extend(self._operation_handler.get_installed_applications())
-        apps.extend(self._operation_handler.get_available_updates())
+        apps.extend(self.get_available_updates())
 
         return apps
 
     def retrieve_agent_log(self, operation):
         """
-        Adds the content from the log file, specified by date in operation,
-        to the operation's raw_result. Date must be of format 'yyyy-mm-dd'.
+        Streams the log files, specified by date in operation, to the server
+        in compressed chunks. Date must be of format 'yyyy-mm-dd'.
+
+        The log content is never placed in the operation's raw_result, so it
+        is not held in, or pickled along with, the result queue.
         """
 
         # TODO: get date or date intervals
         date = None
 
-        log_content = []
         try:
             logs = logger.retrieve_log_path(date)
 
-            for log_path in logs:
-                with open(log_path, 'r') as log_file:
-                    log_content.append(log_file.read())
+            uploader = AgentLogUploader(self._send_message)
+            if uploader.upload(operation, logs):
+                logger.info("Done sending agent logs.")
+            else:
+                logger.error("Failed to send agent logs.")
 
         except Exception as e:
             logger.error("Failed to retrieve log file.")
             logger.exception(e)
 
-        operation.raw_result = ''.join(log_content)
-
         return operation
 
     def execute_command(self, operation):
@@ -280,6 +280,28 @@ UninstallResult = namedtuple(
 )
 
 
+def attribute_changes(apps, name, requested_names, first_success):
+    """Picks the inventory changes of a batched install that belong to name.
+
+    A requested package gets its own changes. Changes to packages nobody
+    requested (dependencies) go to the first successful package, so the
+    server still hears about every one of them exactly once.
+
+    Args:
+        apps (list): apps_to_add or apps_to_delete of the whole batch.
+        name (str): Requested package the result is for.
+        requested_names (set): Every requested package.
+        first_success (str): Name of the first requested package that
+            was installed.
+    """
+
+    return [
+        app for app in apps
+        if app['name'] == name or
+        (name == first_success and app['name'] not in requested_names)
+    ]
+
+
 class PatchingSofResult():
     """ Data structure for install/uninstall operation results. """
 
@@ -0,0 +1,86 @@
+"""Overlaps downloading apps with installing them.
+
+A background thread downloads the apps of an install operation in order,
+while the caller installs each one as soon as it is ready. At most
+look_ahead apps are downloaded beyond the one being installed, so a long
+install doesn't fill the disk with the rest of the operation.
+
+Cancelling, which the caller must do once it stops iterating (normally or
+because an install failed), stops the thread and any download it has in
+progress; see downloader.Downloader.fetch_all().
+"""
+import Queue
+import threading
+
+from src.utils import settings, logger
+
+_DONE = object()
+
+
+class InstallPipeline(object):
+
+    def __init__(self, items, download, look_ahead=None):
+        """
+        Args:
+            items (list): In install order.
+            download: Called as download(item, cancel_event) in the
+                background thread.
+            look_ahead (int): Defaults to settings.InstallLookAhead.
+        """
+
+        if look_ahead is None:
+            look_ahead = settings.InstallLookAhead
+
+        self._items = list(items)
+        self._download = download
+
+        # One slot for the item being installed, one per item ahead.
+        self._slots = threading.Semaphore(look_ahead + 1)
+        self._ready = Queue.Queue()
+        self._cancel = threading.Event()
+
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        for item in self._items:
+            self._slots.acquire()
+
+            if self._cancel.is_set():
+                break
+
+            try:
+                self._download(item, self._cancel)
+
+            except Exception as e:
+                logger.error("Failed to download {0}.".format(item))
+                logger.exception(e)
+
+            self._ready.put(item)
+
+        self._ready.put(_DONE)
+
+    def __iter__(self):
+        """Yields the items as they finish downloading."""
+
+        while not self._cancel.is_set():
+            item = self._ready.get()
+
+            if item is _DONE:
+                return
+
+            yield item
+
+            # Installed, its slot can go to the next download.
+            self._slots.release()
+
+    def cancel(self):
+        """Stops downloading and waits for the background thread."""
+
+        self._cancel.set()
+
+        # Wakes the thread if it is waiting for a slot.
+        self._slots.release()
+
+        self._thread.join()
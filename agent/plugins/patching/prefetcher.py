@@ -0,0 +1,168 @@
+"""Downloads the files of available updates before they are installed.
+
+Each time the available updates are gathered their file_data is handed to
+the Prefetcher. On its timer, and only within a settings.PrefetchSchedule
+window, it downloads the files that aren't in the package cache yet, up to
+settings.PrefetchQuota MB per run, at the window's rate. The files end up
+in the cache alone, so an install operation finds them there instead of
+downloading them.
+
+Only files with a hash are prefetched, the cache doesn't take any other.
+Install operations pause the Prefetcher, stopping a run in progress; its
+partial downloads are resumed by the first run after it's resumed.
+"""
+import os
+import shutil
+import threading
+
+from src.utils import settings, logger, throd, downloader
+from plugins.patching.patchingsofoperation import PatchingOperationKey
+
+# Seconds pause() waits for a run to stop. A cancelled download stops at
+# its next chunk, or once its request times out.
+_PAUSE_TIMEOUT = 120
+
+
+class Prefetcher():
+
+    def __init__(self, file_downloader=None):
+        self.downloader = file_downloader or downloader.Downloader(
+            workers=settings.PrefetchWorkers
+        )
+
+        self._lock = threading.Lock()
+        self._running = threading.Lock()
+        self._cancel = threading.Event()
+        self._paused = threading.Event()
+
+        # Set while no run is in progress.
+        self._idle = threading.Event()
+        self._idle.set()
+
+        self._jobs = []
+
+    def set_updates(self, applications):
+        """Replaces the files to prefetch with those of applications."""
+
+        jobs = []
+        total = 0
+        quota = settings.PrefetchQuota * 1000 * 1000
+
+        for app in applications:
+            for file_data in app.file_data:
+                uri = file_data.get(PatchingOperationKey.FileUri)
+                file_hash = file_data.get(PatchingOperationKey.FileHash, '')
+
+                try:
+                    size = int(file_data.get(PatchingOperationKey.FileSize))
+                except (TypeError, ValueError):
+                    continue
+
+                if not uri or size <= 0:
+                    continue
+
+                if downloader.hash_algorithm(file_hash) is None:
+                    continue
+
+                # Already in the cache, nothing to download.
+                if not self.downloader.cache.has(file_hash, size):
+                    if total + size > quota:
+                        continue
+
+                    total += size
+
+                jobs.append(downloader.DownloadJob(
+                    [uri], settings.PrefetchDirectory, size, file_hash
+                ))
+
+        with self._lock:
+            self._jobs = jobs
+
+    def _pending_jobs(self):
+        with self._lock:
+            return [
+                job for job in self._jobs
+                if not self.downloader.cache.has(job.file_hash, job.size)
+            ]
+
+    def run(self):
+        """Prefetches the pending files if within a schedule window."""
+
+        if self._paused.is_set() or not self.downloader.cache.enabled():
+            return
+
+        window = throd.schedule_entry(
+            throd.parse_schedule(settings.PrefetchSchedule)
+        )
+
+        if window is None:
+            return
+
+        # A run can outlast the timer's interval.
+        if not self._running.acquire(False):
+            return
+
+        self._idle.clear()
+
+        try:
+            jobs = self._pending_jobs()
+
+            if not jobs:
+                return
+
+            self._cancel.clear()
+
+            # Paused since the check above.
+            if self._paused.is_set():
+                return
+
+            logger.info("Prefetching {0} update files.".format(len(jobs)))
+
+            self.downloader.set_rate(window[2])
+
+            if not os.path.isdir(settings.PrefetchDirectory):
+                os.makedirs(settings.PrefetchDirectory)
+
+            paths = self.downloader.fetch_all(jobs, self._cancel)
+
+            logger.info(
+                "Prefetched {0} of {1} update files."
+                .format(len([path for path in paths if path]), len(jobs))
+            )
+
+        except Exception as e:
+            logger.error("Failed to prefetch updates.")
+            logger.exception(e)
+
+        finally:
+            # Everything downloaded is in the cache by now.
+            shutil.rmtree(settings.PrefetchDirectory, ignore_errors=True)
+
+            self._idle.set()
+            self._running.release()
+
+    def pause(self, timeout=_PAUSE_TIMEOUT):
+        """Stops a run in progress and holds off new ones until resume(),
+        to leave the bandwidth to an install.
+
+        Waits up to timeout seconds for the run to stop, so that its
+        downloads are over before the install starts its own.
+
+        Returns:
+            (bool) False if the run was still going at the timeout.
+        """
+
+        self._paused.set()
+        self._cancel.set()
+
+        if self._idle.wait(timeout):
+            return True
+
+        logger.error(
+            "Prefetching still running after {0}s.".format(timeout)
+        )
+
+        return False
+
+    def resume(self):
+        self._paused.clear()
@@ -63,4 +63,11 @@ class AgentPlugin:
         core.
         @requires: Nothing
         """
-        abstract_method(self)
\ No newline at end of file
+        abstract_method(self)
+
+    def send_message_callback(self, callback):
+        """ Sets the callback used to send a message straight to the server,
+        bypassing the result queue. Plugins that stream data override this.
+        @requires: Nothing
+        """
+        self._send_message = callback
@@ -0,0 +1,163 @@
+import sqlite3
+import datetime
+
+from src.utils import settings
+from src.data.sqlitemanager import OperationColumn
+
+
+class OperationStatus():
+    """ Result states an operation can be queried by. """
+
+    Sent = 'sent'
+    Unsent = 'unsent'
+
+    AllStatuses = [Sent, Unsent]
+
+
+class OperationHistory():
+    """ Read-only queries over the operations table of the agent db.
+
+    Example, installs that took longer than 10 minutes in the last week:
+
+        history.query(
+            operation_type='install_os_apps',
+            since=datetime.datetime.now() - datetime.timedelta(7),
+            min_latency=600
+        )
+    """
+
+    _table = 'operations'
+
+    # Seconds between receiving an operation and sending its last result.
+    _latency_sql = "((julianday(%s) - julianday(%s)) * 86400.0)" % (
+        OperationColumn.DateTimeSent, OperationColumn.DateTimeReceived
+    )
+
+    def __init__(self, db_path=None):
+        """
+        Args:
+            db_path (str): Defaults to settings.AgentDb.
+        """
+
+        self._connection = sqlite3.connect(db_path or settings.AgentDb)
+        self._connection.row_factory = sqlite3.Row
+
+    def _where(self, operation_type, since, until, status, min_latency):
+        clauses = []
+        values = []
+
+        if operation_type:
+            clauses.append("%s = ?" % OperationColumn.OperationType)
+            values.append(operation_type)
+
+        if since:
+            clauses.append("%s >= ?" % OperationColumn.DateTimeReceived)
+            values.append(str(since))
+
+        if until:
+            clauses.append("%s <= ?" % OperationColumn.DateTimeReceived)
+            values.append(str(until))
+
+        if status == OperationStatus.Sent:
+            clauses.append("%s = 1" % OperationColumn.ResultsSent)
+
+        elif status == OperationStatus.Unsent:
+            clauses.append("%s = 0" % OperationColumn.ResultsSent)
+
+        elif status:
+            raise ValueError("Unknown status: %s" % status)
+
+        if min_latency is not None:
+            clauses.append("%s != ''" % OperationColumn.DateTimeSent)
+            clauses.append("%s >= ?" % self._latency_sql)
+            values.append(float(min_latency))
+
+        if not clauses:
+            return '', values
+
+        return 'WHERE ' + ' AND '.join(clauses), values
+
+    def _row_to_dict(self, row):
+        latency = row['latency']
+        if latency is not None:
+            latency = round(latency, 3)
+
+        return {
+            'operation_id': row[OperationColumn.OperationId],
+            'operation_type': row[OperationColumn.OperationType],
+            'received': row[OperationColumn.DateTimeReceived],
+            'sent': row[OperationColumn.DateTimeSent],
+            'status': (OperationStatus.Sent
+                       if row[OperationColumn.ResultsSent]
+                       else OperationStatus.Unsent),
+            'latency': latency
+        }
+
+    def query(self, operation_type=None, since=None, until=None,
+              status=None, min_latency=None, limit=None):
+        """ Returns the operations matching every given filter, newest
+        first.
+
+        Args:
+            operation_type (str): Ex: 'install_os_apps'.
+            since / until (datetime or str): Bounds on the received time.
+            status (str): One of OperationStatus.AllStatuses.
+            min_latency (float): Minimum seconds between receiving the
+                operation and sending its results.
+            limit (int): Maximum amount of operations returned.
+
+        Returns:
+            (list) Dictionaries with operation_id, operation_type, received,
+            sent, status and latency (seconds, None if not sent).
+        """
+
+        where, values = self._where(
+            operation_type, since, until, status, min_latency
+        )
+
+        sql = (
+            "SELECT %s, %s, %s, %s, %s, "
+            "CASE WHEN %s != '' THEN %s END AS latency FROM %s %s "
+            "ORDER BY %s DESC" % (
+                OperationColumn.OperationId, OperationColumn.OperationType,
+                OperationColumn.DateTimeReceived, OperationColumn.DateTimeSent,
+                OperationColumn.ResultsSent, OperationColumn.DateTimeSent,
+                self._latency_sql, self._table, where,
+                OperationColumn.DateTimeReceived)
+        )
+
+        if limit:
+            sql += " LIMIT ?"
+            values.append(int(limit))
+
+        cursor = self._connection.cursor()
+        cursor.execute(sql, values)
+
+        return [self._row_to_dict(row) for row in cursor.fetchall()]
+
+    def count(self, operation_type=None, since=None, until=None,
+              status=None, min_latency=None):
+        """ Same filters as query(), returns the amount of operations. """
+
+        where, values = self._where(
+            operation_type, since, until, status, min_latency
+        )
+
+        cursor = self._connection.cursor()
+        cursor.execute(
+            "SELECT COUNT(*) FROM %s %s" % (self._table, where), values
+        )
+
+        return cursor.fetchone()[0]
+
+    def count_unsent(self):
+        """ Amount of operations whose results have not reached the server.
+        """
+
+        return self.count(status=OperationStatus.Unsent)
+
+    @staticmethod
+    def days_ago(days):
+        """ Convenience for since/until arguments. """
+
+        return datetime.datetime.now() - datetime.timedelta(days)
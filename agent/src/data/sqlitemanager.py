@@ -1,4 +1,7 @@
+import time
 import sqlite3
+import datetime
+import threading
 
 from src.utils import settings
 from src.utils import logger
@@ -19,7 +22,30 @@ class SqliteManager():
         # this way all fetch*() will return dict instead of tuple.
         self._connection.row_factory = sqlite3.Row
 
+        # The connection is shared by the operation and result threads.
+        self._lock = threading.RLock()
+
+        # Rows waiting to be written in a single transaction.
+        self._pending_rows = []
+        self._pending_since = None
+
+        self._tune_connection()
         self._create_operation_table()
+        self._create_operation_indexes()
+
+    def _tune_connection(self):
+        """ Switches the database to write-ahead logging. Readers no longer
+        block the writer and a commit only needs to append to the WAL.
+        """
+
+        try:
+            cursor = self._connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+
+        except Exception as e:
+            logger.error("Could not switch agent db to WAL mode.")
+            logger.exception(e)
 
     def _create_operation_table(self):
         with self._connection:
@@ -46,6 +72,29 @@ class SqliteManager():
                            "%s TEXT NULL,"
                            "%s BOOL NULL)" % all_cols)
 
+    def _create_operation_indexes(self):
+        with self._connection:
+
+            cursor = self._connection.cursor()
+
+            # Single and composite indexes, the latter serve history
+            # queries filtering by type or send status within a time range.
+            indexes = (
+                (OperationColumn.OperationId,),
+                (OperationColumn.DateTimeReceived,),
+                (OperationColumn.OperationType,
+                 OperationColumn.DateTimeReceived),
+                (OperationColumn.ResultsSent,
+                 OperationColumn.DateTimeReceived)
+            )
+
+            for columns in indexes:
+                cursor.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_%s_%s ON %s (%s)" %
+                    (self._operations_table, '_'.join(columns),
+                     self._operations_table, ', '.join(columns))
+                )
+
     def _create_settings_table(self):
         with self._connection:
 
@@ -61,27 +110,66 @@ class SqliteManager():
                            "%s TEXT NULL,"
                            "%s TEXT NULL)" % all_cols)
 
-    def add_operation(self, operation, received_time):
+    def _queue_row(self, values):
+        """ Queues a row for the operations table. Rows are written together
+        once settings.DbBatchSize rows are pending, or the oldest pending row
+        is older than settings.DbBatchMaxAge seconds.
+        """
 
-        try:
+        with self._lock:
+            if not self._pending_rows:
+                self._pending_since = time.time()
+
+            self._pending_rows.append(values)
+
+            batch_full = len(self._pending_rows) >= settings.DbBatchSize
+            batch_old = (
+                time.time() - self._pending_since >= settings.DbBatchMaxAge
+            )
+
+            if batch_full or batch_old:
+                self.flush()
+
+    def flush(self):
+        """ Writes all pending rows in one transaction. """
+
+        with self._lock:
+            if not self._pending_rows:
+                return
+
+            rows = self._pending_rows
+            self._pending_rows = []
+            self._pending_since = None
 
-            with self._connection:
+            try:
 
-                cursor = self._connection.cursor()
+                with self._connection:
+
+                    cursor = self._connection.cursor()
+                    cursor.executemany("INSERT INTO %s (%s) "
+                                       "VALUES (?, ?, ?, ?, ?, ?, ?)" %
+                                       (self._operations_table,
+                                        OperationColumn.AllColumns), rows)
+
+            except Exception as e:
+
+                logger.error("Could not write %s operations." % len(rows))
+                logger.exception(e)
+
+    def add_operation(self, operation, received_time):
+
+        try:
 
-                values = (operation.type,
-                          operation.id,
-                          operation.raw_operation.replace(r"'", r"''"), # Escape single quote
-                          settings.EmptyValue,  # raw message value
-                          received_time,
-                          settings.EmptyValue,  # date time sent
-                          False)
+            values = (operation.type,
+                      operation.id,
+                      operation.raw_operation,
+                      settings.EmptyValue,  # raw message value
+                      received_time,
+                      settings.EmptyValue,  # date time sent
+                      False)
 
-                logger.debug("Adding operation %s." % operation.id)
-                cursor.execute("INSERT INTO %s (%s) "
-                               "VALUES (?, ?, ?, ?, ?, ?, ?)" %
-                               (self._operations_table,
-                                OperationColumn.AllColumns), values)
+            logger.debug("Adding operation %s." % operation.id)
+            self._queue_row(values)
 
         except Exception as e:
 
@@ -94,27 +182,37 @@ class SqliteManager():
             sent_time = settings.EmptyValue
 
         try:
-            with self._connection:
-
-                cursor = self._connection.cursor()
-
-                # Escape any single-quotes. Sqlite use two single quotes.
-                values = ",".join([
-                    "%s = '%s'" % (OperationColumn.OperationType,
-                                   operation.type),
-                    "%s = '%s'" % (OperationColumn.OperationId, operation.id),
-                    "%s = '%s'" % (OperationColumn.RawOperation,
-                                   operation.raw_operation.replace(r"'", r"''")),
-                    "%s = '%s'" % (OperationColumn.RawResult,
-                                   operation.raw_result.replace(r"'", r"''")),
-                    "%s = '%s'" % (OperationColumn.DateTimeSent, sent_time),
-                    "%s =  %s" % (OperationColumn.ResultsSent, int(result_sent))
-                ])
-
-                logger.debug("Editing operation %s." % operation.id)
-                cursor.execute("UPDATE %s SET %s WHERE %s = '%s'" % (
-                    self._operations_table, values, OperationColumn.OperationId,
-                    operation.id))
+            with self._lock:
+
+                # The row might still be waiting in the batch.
+                self.flush()
+
+                with self._connection:
+
+                    cursor = self._connection.cursor()
+
+                    values = (operation.type,
+                              operation.id,
+                              operation.raw_operation,
+                              operation.raw_result,
+                              sent_time,
+                              int(result_sent),
+                              operation.id)
+
+                    logger.debug("Editing operation %s." % operation.id)
+                    cursor.execute(
+                        "UPDATE %s SET %s = ?, %s = ?, %s = ?, %s = ?, "
+                        "%s = ?, %s = ? WHERE %s = ?" % (
+                            self._operations_table,
+                            OperationColumn.OperationType,
+                            OperationColumn.OperationId,
+                            OperationColumn.RawOperation,
+                            OperationColumn.RawResult,
+                            OperationColumn.DateTimeSent,
+                            OperationColumn.ResultsSent,
+                            OperationColumn.OperationId),
+                        values
+                    )
 
         except Exception as e:
 
@@ -128,29 +226,125 @@ class SqliteManager():
 
         try:
 
-            with self._connection:
+            values = (result_op.type,
+                      result_op.id,
+                      settings.EmptyValue,
+                      result_op.raw_result,  # raw message value
+                      settings.EmptyValue,
+                      sent_time,  # date time sent
+                      result_sent)
 
-                cursor = self._connection.cursor()
+            logger.debug("Adding result_op %s." % result_op.id)
+            self._queue_row(values)
 
-                values = (result_op.type,
-                          result_op.id,
-                          settings.EmptyValue, # Escape single quote
-                          result_op.raw_result,  # raw message value
-                          settings.EmptyValue,
-                          sent_time,  # date time sent
-                          result_sent)
+        except Exception as e:
+
+            logger.error("Could not add result_op %s." % result_op.id)
+            logger.exception(e)
+
+    def mark_result_sent(self, operation_id, sent_time):
+        """ Records that the results of an operation reached the server. """
+
+        if not operation_id:
+            return
+
+        try:
+            with self._lock:
+
+                self.flush()
 
-                logger.debug("Adding result_op %s." % result_op.id)
-                cursor.execute("INSERT INTO %s (%s) "
-                               "VALUES (?, ?, ?, ?, ?, ?, ?)" %
-                               (self._operations_table,
-                                OperationColumn.AllColumns), values)
+                with self._connection:
+
+                    cursor = self._connection.cursor()
+                    cursor.execute(
+                        "UPDATE %s SET %s = ?, %s = ? WHERE %s = ?" % (
+                            self._operations_table,
+                            OperationColumn.DateTimeSent,
+                            OperationColumn.ResultsSent,
+                            OperationColumn.OperationId),
+                        (str(sent_time), 1, operation_id)
+                    )
 
         except Exception as e:
 
-            logger.error("Could not add result_op %s." % result_op.id)
+            logger.error("Could not mark operation %s as sent." %
+                         operation_id)
+            logger.exception(e)
+
+    def apply_retention(self, max_age_days=None, max_rows=None):
+        """ Deletes operations older than max_age_days and all but the
+        newest max_rows operations. Operations whose results have not
+        reached the server are always kept. The file is compacted once
+        enough rows have been deleted.
+
+        Returns:
+
+            - The number of deleted rows.
+        """
+
+        if max_age_days is None:
+            max_age_days = settings.OperationRetentionDays
+
+        if max_rows is None:
+            max_rows = settings.OperationRetentionRows
+
+        cutoff = datetime.datetime.now() - datetime.timedelta(max_age_days)
+        deleted = 0
+
+        try:
+            with self._lock:
+
+                self.flush()
+
+                with self._connection:
+
+                    cursor = self._connection.cursor()
+
+                    # Rows without a received time are left to the row cap.
+                    cursor.execute(
+                        "DELETE FROM %s WHERE %s = 1 AND %s != ? "
+                        "AND %s < ?" % (
+                            self._operations_table,
+                            OperationColumn.ResultsSent,
+                            OperationColumn.DateTimeReceived,
+                            OperationColumn.DateTimeReceived),
+                        (settings.EmptyValue, str(cutoff))
+                    )
+                    deleted += cursor.rowcount
+
+                    cursor.execute(
+                        "DELETE FROM %s WHERE %s = 1 AND %s <= (SELECT %s "
+                        "FROM %s ORDER BY %s DESC LIMIT 1 OFFSET ?)" % (
+                            self._operations_table,
+                            OperationColumn.ResultsSent, OperationColumn.Id,
+                            OperationColumn.Id, self._operations_table,
+                            OperationColumn.Id),
+                        (max_rows,)
+                    )
+                    deleted += cursor.rowcount
+
+                if deleted >= settings.DbCompactThreshold:
+                    self._compact()
+
+        except Exception as e:
+
+            logger.error("Could not apply operation retention.")
             logger.exception(e)
 
+        if deleted:
+            logger.info("Removed %s operations from history." % deleted)
+
+        return deleted
+
+    def _compact(self):
+        """ Gives the space of deleted rows back to the file system. """
+
+        logger.debug("Compacting agent db.")
+
+        cursor = self._connection.cursor()
+        cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        cursor.execute("VACUUM")
+
 
 class OperationColumn():
     """ Keeps all columns belonging to the operations table in one place.
@@ -7,7 +7,7 @@ import json
 from net import netmanager
 from threading import Thread
 from data.sqlitemanager import SqliteManager
-from src.utils import systeminfo, settings, logger, queuesave
+from src.utils import systeminfo, settings, logger, queuesave, RepeatTimer
 from serveroperation.sofoperation import SofOperation, OperationKey, \
     OperationValue, ResultOperation, ResponseUris
 
@@ -17,6 +17,13 @@ class OperationManager():
     def __init__(self, plugins):
         # Must be called first! Especially before any sqlite stuff.
         self._sqlite = SqliteManager()
+        self._sqlite.apply_retention()
+
+        # 86400 seconds == 24 hours
+        self._retention_timer = RepeatTimer(
+            86400, self._sqlite.apply_retention
+        )
+        self._retention_timer.start()
 
         self._plugins = plugins
         self._load_plugin_handlers()
@@ -40,6 +47,7 @@ class OperationManager():
         for plugin in self._plugins.values():
             plugin.send_results_callback(self.add_to_result_queue)
             plugin.register_operation_callback(self.register_plugin_operation)
+            plugin.send_message_callback(self.send_message)
 
     def _save_and_send_results(self, operation_type, operation_result):
 
@@ -75,6 +83,20 @@ class OperationManager():
 
         return result
 
+    def send_message(self, data, uri, req_method):
+        """ Sends a message straight to the server, without going through
+        the result queue. Used by plugins that stream large payloads.
+
+        Returns:
+
+            - True if the message was sent successfully. False otherwise.
+        """
+
+        if not self._send_results:
+            return False
+
+        return self._send_results(data, uri, req_method)
+
     def register_plugin_operation(self, message):
         """ Provides a way for plugins to store their custom made
         operations with the agent core.
@@ -472,6 +494,9 @@ class OperationManager():
                     self._operation_queue.done()
 
                 else:
+                    # Good time to write any batched operations.
+                    self._sqlite.flush()
+
                     # Only sleep if there is nothing in the queue.
                     # Keep banging (pause) them out!
                     time.sleep(4)
@@ -529,6 +554,13 @@ class OperationManager():
                     result_op.operation_type, result_op.operation_result
                 )
 
+                if send_result:
+                    # Results queued before operation_id existed lack it.
+                    self._sqlite.mark_result_sent(
+                        getattr(result_op, 'operation_id', ''),
+                        datetime.datetime.now()
+                    )
+
                 if (not send_result and result_op.retry):
                     # Time this out for a few
                     result_op.timeout()
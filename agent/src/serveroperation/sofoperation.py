@@ -199,6 +199,7 @@ class ResultOperation():
         self.retry = retry
 
         #self.operation = operation
+        self.operation_id = getattr(operation, 'id', settings.EmptyValue)
         self.operation_type = operation.type
         self.operation_result = operation.raw_result
 
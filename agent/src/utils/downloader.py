@@ -0,0 +1,764 @@
+"""Concurrent HTTP downloads over pooled keep-alive connections.
+
+A fixed pool of worker threads shares one requests.Session, so files from
+the same host reuse connections. Each host allows at most
+settings.DownloadConnectionsPerHost downloads at a time, and every worker
+draws from a single throd.TokenBucket, so the aggregate throughput stays
+within the operation's net_throttle and settings.BandwidthSchedule.
+
+Files are first written to a .part file under
+settings.PartialDownloadsDirectory, next to a .json sidecar holding the uri
+and its ETag/Last-Modified validators. An interrupted download, even one
+interrupted by an agent restart, carries on from the end of the .part file
+with a Range request (and If-Range when resuming from the same uri).
+
+When the job has a hash, it is computed over the bytes as they are
+written, so checking it costs no extra pass over the file. Only the bytes
+of a .part file left from an earlier run are read back. Verified files are
+kept in a packagecache.PackageCache, which is checked before downloading.
+
+A job's uris are tried in the order mirrors.MirrorStats ranks them, fed
+with the throughput and failures seen here. Large files with a hash can be
+split in byte ranges fetched from all healthy mirrors at once.
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import urlparse
+import threading
+
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+
+import requests
+
+from src.utils import settings, logger, throd, packagecache, mirrors
+
+# uris: Mirrors of the same file, tried in order.
+# download_dir: Where the file is saved, under its uri's base name.
+# size: Expected size in bytes, None to skip the check.
+# file_hash: Expected hex digest, '' to skip the check.
+DownloadJob = namedtuple(
+    'DownloadJob', ['uris', 'download_dir', 'size', 'file_hash']
+)
+
+_CHUNK_SIZE = 64 * 1024
+
+# Hex digest length: algorithm
+_hash_algorithms = {
+    32: 'md5',
+    40: 'sha1',
+    64: 'sha256',
+    128: 'sha512'
+}
+
+_PART_EXTENSION = '.part'
+_SIDECAR_EXTENSION = '.json'
+
+# Shared by every Downloader, the prefetcher's included, so only one thread
+# at a time writes a partial download. Striped by path, so their number
+# stays fixed; two files sharing a lock only take turns.
+_partial_locks = [threading.Lock() for _ in range(64)]
+
+
+def _partial_lock(part_path):
+    return _partial_locks[hash(part_path) % len(_partial_locks)]
+
+
+def hash_algorithm(file_hash):
+    """Algorithm of a hex digest, from its length. None if not known.
+
+    The server sends sha256 for Debian packages and whatever the yum
+    repodata uses (sha1 or sha256) for rpms.
+    """
+
+    if not file_hash:
+        return None
+
+    return _hash_algorithms.get(len(file_hash))
+
+
+class StreamHash():
+    """Digest of a file that is being written, kept in step with the
+    file's size.
+    """
+
+    def __init__(self, algorithm):
+        self.algorithm = algorithm
+        self.reset()
+
+    def reset(self):
+        self._hash = hashlib.new(self.algorithm)
+        self.offset = 0
+
+    def update(self, data):
+        self._hash.update(data)
+        self.offset += len(data)
+
+    def catch_up(self, path, offset):
+        """Hashes path up to offset, if not hashed already."""
+
+        if self.offset == offset:
+            return
+
+        self.reset()
+
+        with open(path, 'rb') as _file:
+            while self.offset < offset:
+                data = _file.read(min(_CHUNK_SIZE, offset - self.offset))
+
+                if not data:
+                    break
+
+                self.update(data)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+class DownloadCancelled(Exception):
+    pass
+
+
+class PartialDownload():
+    """A .part file and its sidecar.
+
+    Mirrors of the same file share one partial download, as it is keyed by
+    file name and expected size.
+    """
+
+    def __init__(self, file_name, size, partial_dir=None):
+        partial_dir = partial_dir or settings.PartialDownloadsDirectory
+
+        key = hashlib.sha1('{0}|{1}'.format(file_name, size)).hexdigest()
+
+        self.part_path = os.path.join(partial_dir, key + _PART_EXTENSION)
+        self.sidecar_path = os.path.join(partial_dir, key + _SIDECAR_EXTENSION)
+
+    def offset(self):
+        try:
+            return os.path.getsize(self.part_path)
+        except OSError:
+            return 0
+
+    def read_sidecar(self):
+        try:
+            with open(self.sidecar_path, 'r') as _file:
+                return json.load(_file)
+
+        except (IOError, ValueError):
+            return {}
+
+    def write_sidecar(self, uri, response):
+        sidecar = {
+            'uri': uri,
+            'etag': response.headers.get('etag', ''),
+            'last_modified': response.headers.get('last-modified', '')
+        }
+
+        with open(self.sidecar_path, 'w') as _file:
+            json.dump(sidecar, _file)
+
+    def validator(self, uri):
+        """If-Range value for resuming from uri, '' if there is none."""
+
+        sidecar = self.read_sidecar()
+
+        if sidecar.get('uri') != uri:
+            return ''
+
+        return sidecar.get('etag') or sidecar.get('last_modified') or ''
+
+    def remove(self):
+        for path in (self.part_path, self.sidecar_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def clean_partials(max_age_days=None, partial_dir=None):
+    """Deletes partial downloads untouched for max_age_days."""
+
+    max_age_days = max_age_days or settings.PartialDownloadMaxAge
+    partial_dir = partial_dir or settings.PartialDownloadsDirectory
+
+    oldest = time.time() - max_age_days * 86400
+
+    try:
+        for file_name in os.listdir(partial_dir):
+            path = os.path.join(partial_dir, file_name)
+
+            if os.path.getmtime(path) < oldest:
+                os.remove(path)
+
+    except OSError as e:
+        logger.error("Failed to clean partial downloads.")
+        logger.exception(e)
+
+
+class Downloader():
+
+    def __init__(self, workers=None, per_host=None, timeout=None,
+                 retries=None, partial_dir=None, cache=None):
+        self.workers = workers or settings.DownloadWorkers
+        self.per_host = per_host or settings.DownloadConnectionsPerHost
+        self.timeout = timeout or settings.DownloadTimeout
+        self.retries = retries or settings.DownloadRetries
+        self.partial_dir = partial_dir or settings.PartialDownloadsDirectory
+
+        if not os.path.isdir(self.partial_dir):
+            os.makedirs(self.partial_dir)
+
+        clean_partials(partial_dir=self.partial_dir)
+
+        self.cache = cache or packagecache.PackageCache()
+
+        self.rate_limiter = throd.TokenBucket(
+            burst=settings.DownloadBurst * 1000,
+            schedule=settings.BandwidthSchedule
+        )
+
+        self._session = requests.Session()
+
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.workers,
+            pool_maxsize=self.per_host
+        )
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+        self._hosts_lock = threading.Lock()
+        self._hosts = {}
+
+        self.mirrors = mirrors.MirrorStats(session=self._session)
+
+    def set_rate(self, rate):
+        """Aggregate rate in KB/s for every download. None for unlimited."""
+
+        self.rate_limiter.set_rate(rate)
+
+    def _host_slot(self, uri):
+        host = urlparse.urlparse(uri).netloc
+
+        with self._hosts_lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.BoundedSemaphore(self.per_host)
+
+            return self._hosts[host]
+
+    def _resume(self, uri, partial, stream_hash=None, cancel=None):
+        """Downloads the rest of uri into the partial download.
+
+        Args:
+            stream_hash: StreamHash to feed with the file's bytes.
+            cancel: threading.Event that stops the download when set.
+
+        Returns:
+            (int) Bytes received.
+
+        Raises:
+            requests.RequestException, IOError, DownloadCancelled
+        """
+
+        offset = partial.offset()
+        received = 0
+        headers = {}
+
+        if offset:
+            headers['Range'] = 'bytes={0}-'.format(offset)
+
+            validator = partial.validator(uri)
+            if validator:
+                headers['If-Range'] = validator
+
+        with self._host_slot(uri):
+            response = self._session.get(
+                uri, stream=True, timeout=self.timeout, headers=headers
+            )
+
+            try:
+                if response.status_code == 416:
+                    # Nothing left to send, or the partial doesn't fit this
+                    # file. The size check tells which.
+                    return received
+
+                response.raise_for_status()
+
+                if response.status_code == 206:
+                    logger.debug(
+                        "Resuming {0} at byte {1}.".format(uri, offset)
+                    )
+                    mode = 'ab'
+                else:
+                    # Range ignored, or the file changed (If-Range).
+                    mode = 'wb'
+
+                if stream_hash:
+                    if mode == 'ab':
+                        stream_hash.catch_up(partial.part_path, offset)
+                    else:
+                        stream_hash.reset()
+
+                partial.write_sidecar(uri, response)
+
+                with open(partial.part_path, mode) as _file:
+                    for chunk in response.iter_content(_CHUNK_SIZE):
+                        if cancel and cancel.is_set():
+                            raise DownloadCancelled(uri)
+
+                        _file.write(chunk)
+
+                        if stream_hash:
+                            stream_hash.update(chunk)
+
+                        received += len(chunk)
+                        self.rate_limiter.consume(len(chunk))
+
+            finally:
+                response.close()
+
+        return received
+
+    def _hash_matches(self, uri, partial, stream_hash, file_hash):
+        if not stream_hash:
+            return True
+
+        stream_hash.catch_up(partial.part_path, partial.offset())
+        digest = stream_hash.hexdigest()
+
+        if digest == file_hash.lower():
+            return True
+
+        logger.error(
+            "{0} hash mismatch: expected {1} {2}, got {3}."
+            .format(uri, stream_hash.algorithm, file_hash, digest)
+        )
+
+        return False
+
+    def download(self, uri, download_path, size=None, file_hash='',
+                 cancel=None):
+        """Downloads uri to download_path, resuming any partial download of
+        the same file.
+
+        Args:
+            size: Expected size in bytes, the download is complete once
+                reached. None if unknown.
+
+            file_hash: Expected hex digest. '' to skip the check.
+
+            cancel: threading.Event that stops the download when set. What
+                was downloaded so far is kept for resuming.
+
+        Returns:
+            (bool) True if download_path has the expected size and hash.
+        """
+
+        partial = PartialDownload(
+            os.path.basename(download_path), size, self.partial_dir
+        )
+
+        algorithm = hash_algorithm(file_hash)
+
+        if file_hash and not algorithm:
+            logger.debug(
+                "Unknown hash for {0}: {1}, not checking it."
+                .format(uri, file_hash)
+            )
+
+        stream_hash = StreamHash(algorithm) if algorithm else None
+
+        with _partial_lock(partial.part_path):
+            return self._download(
+                uri, download_path, partial, size, file_hash, stream_hash,
+                cancel
+            )
+
+    def _download(self, uri, download_path, partial, size, file_hash,
+                  stream_hash, cancel):
+        host = mirrors.host_of(uri)
+
+        for attempt in range(self.retries):
+            if cancel and cancel.is_set():
+                break
+
+            resumed = partial.offset() > 0
+            start = time.time()
+
+            try:
+                received = self._resume(uri, partial, stream_hash, cancel)
+                self.mirrors.record_transfer(
+                    host, received, time.time() - start
+                )
+
+            except DownloadCancelled:
+                logger.debug(
+                    "Download of {0} cancelled at byte {1}."
+                    .format(uri, partial.offset())
+                )
+
+                break
+
+            except Exception as e:
+                logger.error(
+                    "Download of {0} interrupted at byte {1} ({2}/{3})."
+                    .format(uri, partial.offset(), attempt + 1, self.retries)
+                )
+                logger.exception(e)
+
+                self.mirrors.record_failure(host)
+
+                continue
+
+            offset = partial.offset()
+
+            if size is None or offset == int(size):
+                if not self._hash_matches(uri, partial, stream_hash,
+                                          file_hash):
+                    partial.remove()
+
+                    if resumed:
+                        # The bad bytes may predate this uri, try it again
+                        # from scratch.
+                        continue
+
+                    # A corrupt mirror, leave it for the next one.
+                    self.mirrors.record_failure(host)
+
+                    return False
+
+                shutil.move(partial.part_path, download_path)
+                partial.remove()
+
+                return True
+
+            if offset > int(size):
+                logger.error(
+                    "{0} is bigger than expected: {1} > {2}, restarting."
+                    .format(uri, offset, size)
+                )
+                partial.remove()
+
+        return False
+
+    def _fetch_range(self, uri, path, start, end, cancel=None):
+        """Downloads bytes start to end (inclusive) of uri into the same
+        bytes of path.
+
+        Raises:
+            requests.RequestException, IOError, DownloadCancelled
+        """
+
+        headers = {'Range': 'bytes={0}-{1}'.format(start, end)}
+        received = 0
+        began = time.time()
+
+        with self._host_slot(uri):
+            response = self._session.get(
+                uri, stream=True, timeout=self.timeout, headers=headers
+            )
+
+            try:
+                response.raise_for_status()
+
+                if response.status_code != 206:
+                    raise IOError(
+                        "{0} doesn't serve byte ranges.".format(uri)
+                    )
+
+                with open(path, 'r+b') as _file:
+                    _file.seek(start)
+
+                    for chunk in response.iter_content(_CHUNK_SIZE):
+                        if cancel and cancel.is_set():
+                            raise DownloadCancelled(uri)
+
+                        chunk = chunk[:end - start + 1 - received]
+                        _file.write(chunk)
+
+                        received += len(chunk)
+                        self.rate_limiter.consume(len(chunk))
+
+            finally:
+                response.close()
+
+        if received != end - start + 1:
+            raise IOError(
+                "Got {0} of {1} bytes from {2}."
+                .format(received, end - start + 1, uri)
+            )
+
+        self.mirrors.record_transfer(
+            mirrors.host_of(uri), received, time.time() - began
+        )
+
+    def _fetch_ranges(self, uris, download_path, size, file_hash,
+                      cancel=None):
+        """Downloads a segment of the file from each of uris at once. A
+        failed segment is retried from the next uri.
+
+        Returns:
+            (bool) True if download_path has the expected hash.
+        """
+
+        size = int(size)
+        segment_size = -(-size // len(uris))
+        segments = [
+            (i, start, min(start + segment_size, size) - 1)
+            for i, start in enumerate(range(0, size, segment_size))
+        ]
+
+        tmp_path = download_path + _PART_EXTENSION
+
+        with open(tmp_path, 'wb') as _file:
+            _file.truncate(size)
+
+        def fetch_segment(segment):
+            i, start, end = segment
+
+            # Segment i starts at uri i, then goes through the others.
+            for uri in uris[i:] + uris[:i]:
+                if cancel and cancel.is_set():
+                    return False
+
+                try:
+                    self._fetch_range(uri, tmp_path, start, end, cancel)
+                    return True
+
+                except DownloadCancelled:
+                    return False
+
+                except Exception as e:
+                    logger.error(
+                        "Failed to get bytes {0}-{1} from {2}."
+                        .format(start, end, uri)
+                    )
+                    logger.exception(e)
+
+                    self.mirrors.record_failure(mirrors.host_of(uri))
+
+            return False
+
+        pool = ThreadPool(len(segments))
+
+        try:
+            fetched = all(pool.map(fetch_segment, segments))
+        finally:
+            pool.close()
+            pool.join()
+
+        if fetched:
+            # Segments arrive out of order, the file has to be read back.
+            stream_hash = StreamHash(hash_algorithm(file_hash))
+            stream_hash.catch_up(tmp_path, size)
+
+            if stream_hash.hexdigest() == file_hash.lower():
+                shutil.move(tmp_path, download_path)
+
+                return True
+
+            logger.error(
+                "{0} hash mismatch from ranges of {1}."
+                .format(download_path, uris)
+            )
+
+        os.remove(tmp_path)
+
+        return False
+
+    def _ranged(self, job, uris):
+        """Healthy uris to fetch the job's file from in ranges, [] if it
+        shouldn't be.
+        """
+
+        min_size = settings.ParallelRangeMinSize * 1000 * 1000
+
+        if not min_size or not job.size or int(job.size) < min_size:
+            return []
+
+        # The hash is the only way to tell the mirrors have the same file.
+        if hash_algorithm(job.file_hash) is None:
+            return []
+
+        uris = [
+            uri for uri in uris if self.mirrors.healthy(mirrors.host_of(uri))
+        ][:self.workers]
+
+        if len(uris) < 2:
+            return []
+
+        # A mirror only helps if its segment comes in before the best one
+        # could send the whole file. uris are ranked, the first is the best.
+        whole = self.mirrors.expected_seconds(
+            mirrors.host_of(uris[0]), job.size
+        )
+        segment_size = int(job.size) / len(uris)
+
+        def helps(uri):
+            seconds = self.mirrors.expected_seconds(
+                mirrors.host_of(uri), segment_size
+            )
+
+            return whole is None or seconds is None or seconds <= whole
+
+        uris = [uri for uri in uris if helps(uri)]
+
+        if len(uris) < 2:
+            return []
+
+        return uris
+
+    def _fetch(self, job, cancel=None):
+        """Tries each of the job's uris until one downloads with the right
+        size and hash.
+
+        Returns:
+            (str) Path of the downloaded file, None on failure.
+        """
+
+        # Only files with a checked hash go in the cache.
+        cacheable = hash_algorithm(job.file_hash) is not None
+
+        if cacheable and job.uris:
+            download_path = os.path.join(
+                job.download_dir, os.path.basename(job.uris[0])
+            )
+
+            if self.cache.get(job.file_hash, job.size, download_path):
+                return download_path
+
+        uris = self.mirrors.rank(job.uris, job.size)
+        ranged_uris = self._ranged(job, uris)
+
+        if ranged_uris:
+            download_path = os.path.join(
+                job.download_dir, os.path.basename(uris[0])
+            )
+
+            try:
+                if self._fetch_ranges(ranged_uris, download_path, job.size,
+                                      job.file_hash, cancel):
+                    self.cache.put(download_path, job.file_hash, job.size)
+
+                    return download_path
+
+            except Exception as e:
+                logger.error(
+                    "Failed to download {0} in ranges.".format(download_path)
+                )
+                logger.exception(e)
+
+            # Falls back to one mirror at a time.
+
+        for uri in uris:
+            if cancel and cancel.is_set():
+                break
+
+            logger.debug("Downloading from: {0}".format(uri))
+
+            download_path = os.path.join(
+                job.download_dir, os.path.basename(uri)
+            )
+
+            try:
+                if self.download(uri, download_path, job.size,
+                                 job.file_hash, cancel):
+                    if cacheable:
+                        self.cache.put(download_path, job.file_hash, job.size)
+
+                    return download_path
+
+                logger.error("Failed to download from: {0}".format(uri))
+
+            except Exception as e:
+                logger.error("Failed to download from: {0}".format(uri))
+                logger.exception(e)
+
+        return None
+
+    def _place(self, path, download_dir):
+        """Puts the file at path in download_dir too.
+
+        Returns:
+            (str) Its path in download_dir, None on failure.
+        """
+
+        destination = os.path.join(download_dir, os.path.basename(path))
+
+        if os.path.exists(destination):
+            return destination
+
+        try:
+            try:
+                os.link(path, destination)
+            except OSError:
+                shutil.copy2(path, destination)
+
+            return destination
+
+        except Exception as e:
+            logger.error(
+                "Failed to copy {0} to {1}.".format(path, download_dir)
+            )
+            logger.exception(e)
+
+        return None
+
+    def fetch_all(self, jobs, cancel=None):
+        """Downloads jobs concurrently.
+
+        Jobs for the same file, like a dependency shared by two apps, are
+        downloaded once. They would otherwise write the same partial
+        download at the same time.
+
+        Args:
+            cancel: threading.Event that stops every download when set.
+
+        Returns:
+            (list) Path of each job's file, in order, None where it failed.
+        """
+
+        if not jobs:
+            return []
+
+        # Key, as PartialDownload's: index in unique_jobs.
+        unique = {}
+        unique_jobs = []
+        job_indexes = []
+
+        for job in jobs:
+            if job.uris:
+                key = (os.path.basename(job.uris[0]), job.size)
+            else:
+                key = id(job)
+
+            if key not in unique:
+                unique[key] = len(unique_jobs)
+                unique_jobs.append(job)
+
+            job_indexes.append(unique[key])
+
+        pool = ThreadPool(min(self.workers, len(unique_jobs)))
+
+        try:
+            paths = pool.map(
+                lambda job: self._fetch(job, cancel), unique_jobs
+            )
+        finally:
+            pool.close()
+            pool.join()
+
+            self.mirrors.save()
+
+        results = []
+
+        for job, index in zip(jobs, job_indexes):
+            path = paths[index]
+
+            if path and job.download_dir != unique_jobs[index].download_dir:
+                path = self._place(path, job.download_dir)
+
+            results.append(path)
+
+        return results
@@ -0,0 +1,301 @@
+"""Extraction of downloaded tar and zip archives.
+
+Tars are read as a stream, in a single pass. Archives found inside an
+archive are queued as they are written and extracted in turn, so nothing
+is scanned twice.
+
+Every member goes through the same limits, whatever the archive:
+
+    - Its path must stay inside the destination: absolute paths, '..'
+      and links pointing outside are refused.
+    - Devices and fifos are refused, setuid/setgid bits are dropped.
+    - An extract call writes at most settings.ExtractMaxSize MB and
+      settings.ExtractMaxFiles files, counted as the bytes are written,
+      so a zip can't lie its way past them.
+
+Breaking a limit raises ExtractionError and stops the extraction.
+"""
+import os
+import stat
+import time
+import tarfile
+import zipfile
+
+from src.utils import settings, logger
+
+_CHUNK_SIZE = 1024 * 1024
+
+_TAR_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tbz')
+_ZIP_EXTENSIONS = ('.zip',)
+
+
+class ExtractionError(Exception):
+    pass
+
+
+def is_tar(path):
+    return path.lower().endswith(_TAR_EXTENSIONS)
+
+
+def is_zip(path):
+    return path.lower().endswith(_ZIP_EXTENSIONS)
+
+
+def is_archive(path):
+    return is_tar(path) or is_zip(path)
+
+
+class Extractor():
+
+    def __init__(self, max_size=None, max_files=None):
+        """
+        Args:
+            max_size: MB written per extract call.
+            max_files: Files written per extract call.
+        """
+
+        if max_size is None:
+            max_size = settings.ExtractMaxSize
+
+        self.max_bytes = max_size * 1000 * 1000
+        self.max_files = max_files or settings.ExtractMaxFiles
+
+        # Totals across calls.
+        self.archives = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def throughput(self):
+        """Bytes written per second, so far."""
+
+        if not self.seconds:
+            return 0
+
+        return self.bytes / self.seconds
+
+    def _target(self, directory, name):
+        """Path of member name under directory.
+
+        Raises:
+            ExtractionError if it's outside of directory.
+        """
+
+        if os.path.isabs(name):
+            raise ExtractionError("Absolute path: {0}".format(name))
+
+        root = os.path.realpath(directory)
+        target = os.path.realpath(os.path.join(root, name))
+
+        if target != root and not target.startswith(root + os.sep):
+            raise ExtractionError("Path outside of {0}: {1}".format(
+                directory, name
+            ))
+
+        return target
+
+    def _count_file(self):
+        self._files += 1
+
+        if self._files > self.max_files:
+            raise ExtractionError(
+                "More than {0} files.".format(self.max_files)
+            )
+
+    def _write(self, source, target, mode):
+        """Copies file object source to target.
+
+        Returns:
+            (int) Bytes written.
+        """
+
+        self._count_file()
+
+        parent = os.path.dirname(target)
+        if not os.path.isdir(parent):
+            os.makedirs(parent)
+
+        written = 0
+
+        with open(target, 'wb') as _file:
+            while True:
+                data = source.read(_CHUNK_SIZE)
+
+                if not data:
+                    break
+
+                written += len(data)
+                self._written += len(data)
+
+                if self._written > self.max_bytes:
+                    raise ExtractionError(
+                        "More than {0} bytes.".format(self.max_bytes)
+                    )
+
+                _file.write(data)
+
+        if mode:
+            os.chmod(
+                target, stat.S_IMODE(mode) & ~(stat.S_ISUID | stat.S_ISGID)
+            )
+
+        return written
+
+    def _extract_tar(self, path, directory, nested):
+        # 'r|*': a stream of any compression, read once front to back.
+        tar = tarfile.open(path, 'r|*')
+
+        try:
+            for member in tar:
+                target = self._target(directory, member.name)
+
+                if member.isdir():
+                    if not os.path.isdir(target):
+                        os.makedirs(target)
+
+                elif member.isfile():
+                    source = tar.extractfile(member)
+
+                    try:
+                        self._write(source, target, member.mode)
+                    finally:
+                        source.close()
+
+                    if is_archive(target):
+                        nested.append(target)
+
+                elif member.issym() or member.islnk():
+                    self._extract_link(member, target, directory)
+
+                else:
+                    raise ExtractionError(
+                        "Special file: {0}".format(member.name)
+                    )
+
+        finally:
+            tar.close()
+
+    def _extract_link(self, member, target, directory):
+        if member.issym():
+            link_to = os.path.join(os.path.dirname(member.name),
+                                   member.linkname)
+        else:
+            link_to = member.linkname
+
+        # Raises if it points outside of directory.
+        link_target = self._target(directory, link_to)
+
+        self._count_file()
+
+        if os.path.lexists(target):
+            os.remove(target)
+
+        parent = os.path.dirname(target)
+        if not os.path.isdir(parent):
+            os.makedirs(parent)
+
+        if member.issym():
+            os.symlink(member.linkname, target)
+        else:
+            os.link(link_target, target)
+
+    def _extract_zip(self, path, directory, nested):
+        zip_file = zipfile.ZipFile(path)
+
+        try:
+            for info in zip_file.infolist():
+                target = self._target(directory, info.filename)
+
+                if info.filename.endswith('/'):
+                    if not os.path.isdir(target):
+                        os.makedirs(target)
+
+                    continue
+
+                # Unix permissions, when made on unix.
+                mode = info.external_attr >> 16
+                if not stat.S_ISREG(mode):
+                    mode = None
+
+                source = zip_file.open(info)
+
+                try:
+                    self._write(source, target, mode)
+                finally:
+                    source.close()
+
+                if is_archive(target):
+                    nested.append(target)
+
+        finally:
+            zip_file.close()
+
+    def extract(self, path, directory=None, remove=False, nested=True):
+        """Extracts archive path, and any archive inside it, into
+        directory.
+
+        Args:
+            directory: Defaults to the archive's directory. Nested archives
+                are extracted where they were written.
+            remove: Delete the archives once extracted.
+            nested: Extract the archives inside the archive too.
+
+        Raises:
+            ExtractionError, tarfile.TarError, zipfile.BadZipfile, IOError,
+            OSError
+        """
+
+        self._files = 0
+        self._written = 0
+
+        start = time.time()
+
+        pending = [(path, directory or os.path.dirname(path))]
+
+        try:
+            while pending:
+                archive, target_dir = pending.pop(0)
+                found = []
+
+                if is_tar(archive):
+                    self._extract_tar(archive, target_dir, found)
+                else:
+                    self._extract_zip(archive, target_dir, found)
+
+                self.archives += 1
+
+                if remove:
+                    os.remove(archive)
+
+                if nested:
+                    pending.extend(
+                        (found_path, os.path.dirname(found_path))
+                        for found_path in found
+                    )
+
+        finally:
+            self.bytes += self._written
+            self.seconds += time.time() - start
+
+    def extract_all(self, directory):
+        """Extracts, and deletes, every archive in directory.
+
+        Returns:
+            (int) Bytes written.
+        """
+
+        written = 0
+
+        for file_name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, file_name)
+
+            if os.path.isfile(path) and is_archive(path):
+                self.extract(path, directory, remove=True)
+                written += self._written
+
+        if written:
+            logger.debug(
+                "Extracted {0} bytes in {1}, {2:.1f} MB/s overall."
+                .format(written, directory, self.throughput() / 1000000)
+            )
+
+        return written
@@ -178,7 +178,7 @@ def retrieve_log_paths(log_date, log_dir):
     log_path = []
 
     for log in os.listdir(log_dir):
-        full_path = os.path.abspath(log)
+        full_path = os.path.join(os.path.abspath(log_dir), log)
 
         match = re.search(RollingDateParseRegex, full_path)
         if match:
@@ -187,6 +187,23 @@ def retrieve_log_paths(log_date, log_dir):
 
     return log_path
 
+def retrieve_log_path(log_date=None):
+    """
+    Retrieves the log paths for the given log_date, or the current log
+    when no date is given.
+
+    @param log_date: Must be of format 'yyyy-mm-dd' or None.
+    @return: List of full log paths.
+    """
+
+    if not LogFilePath:
+        return []
+
+    if log_date is None:
+        return [LogFilePath]
+
+    return retrieve_log_paths(log_date, os.path.dirname(LogFilePath))
+
 def add_log_handler(filename, roll_interval='midnight', backupCount=7):
     """ 
     Adds handler to _logger with the formatting specified in LoggingFormatter.
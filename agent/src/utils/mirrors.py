@@ -0,0 +1,238 @@
+"""Picks the mirror to download a file from.
+
+Per host latency and throughput are kept as moving averages, along with
+consecutive failures, in settings.mirror_stats_file so they carry over
+across operations. Hosts without a recent latency figure are probed with
+a HEAD request, all at once, before ranking a file's uris.
+
+A host that failed settings.MirrorMaxFailures times in a row is unhealthy
+for settings.MirrorFailureCooldown seconds; unhealthy hosts go last. The
+rest are ordered by the time they are expected to take for the file.
+"""
+import json
+import time
+import urlparse
+import threading
+
+from multiprocessing.pool import ThreadPool
+
+from src.utils import settings, logger
+
+# Weight of the newest sample in the moving averages.
+_ALPHA = 0.3
+
+
+class StatKey():
+    Latency = 'latency'
+    LatencyTime = 'latency_time'
+    Throughput = 'throughput'
+    Failures = 'failures'
+    LastFailure = 'last_failure'
+
+
+def host_of(uri):
+    return urlparse.urlparse(uri).netloc
+
+
+def _average(old, new):
+    if old is None:
+        return new
+
+    return (1 - _ALPHA) * old + _ALPHA * new
+
+
+class MirrorStats():
+
+    def __init__(self, stats_file=None, session=None):
+        """
+        Args:
+            session: requests.Session to probe with.
+        """
+
+        self.stats_file = stats_file or settings.mirror_stats_file
+        self.session = session
+
+        self._lock = threading.Lock()
+        self._hosts = self._read()
+
+    def _read(self):
+        try:
+            with open(self.stats_file, 'r') as _file:
+                return json.load(_file)
+
+        except IOError:
+            pass
+
+        except Exception as e:
+            logger.error("Failed to read mirror stats.")
+            logger.exception(e)
+
+        return {}
+
+    def save(self):
+        with self._lock:
+            try:
+                with open(self.stats_file, 'w') as _file:
+                    json.dump(self._hosts, _file)
+
+            except Exception as e:
+                logger.error("Failed to save mirror stats.")
+                logger.exception(e)
+
+    def get(self, host):
+        with self._lock:
+            return dict(self._hosts.get(host, {}))
+
+    def _update(self, host, values):
+        with self._lock:
+            self._hosts.setdefault(host, {}).update(values)
+
+    def record_latency(self, host, seconds):
+        stats = self.get(host)
+
+        self._update(host, {
+            StatKey.Latency: _average(stats.get(StatKey.Latency), seconds),
+            StatKey.LatencyTime: time.time()
+        })
+
+    def record_transfer(self, host, nbytes, seconds):
+        """Records a successful transfer, which also clears failures."""
+
+        if nbytes <= 0 or seconds <= 0:
+            self._update(host, {StatKey.Failures: 0})
+            return
+
+        stats = self.get(host)
+        throughput = nbytes / float(seconds)
+
+        self._update(host, {
+            StatKey.Throughput: _average(
+                stats.get(StatKey.Throughput), throughput
+            ),
+            StatKey.Failures: 0
+        })
+
+    def record_failure(self, host):
+        stats = self.get(host)
+
+        self._update(host, {
+            StatKey.Failures: stats.get(StatKey.Failures, 0) + 1,
+            StatKey.LastFailure: time.time()
+        })
+
+    def healthy(self, host):
+        stats = self.get(host)
+
+        if stats.get(StatKey.Failures, 0) < settings.MirrorMaxFailures:
+            return True
+
+        age = time.time() - stats.get(StatKey.LastFailure, 0)
+
+        return age > settings.MirrorFailureCooldown
+
+    def mean_throughput(self):
+        """Of every known host, None if there's none."""
+
+        with self._lock:
+            throughputs = [
+                stats[StatKey.Throughput] for stats in self._hosts.values()
+                if stats.get(StatKey.Throughput)
+            ]
+
+        if not throughputs:
+            return None
+
+        return sum(throughputs) / len(throughputs)
+
+    def expected_seconds(self, host, size=None):
+        """Time host should take for size bytes, None if it's unknown.
+
+        Hosts that didn't send anything yet are assumed as fast as the
+        mean.
+        """
+
+        stats = self.get(host)
+        latency = stats.get(StatKey.Latency)
+        throughput = stats.get(StatKey.Throughput)
+
+        if latency is not None and throughput is None:
+            throughput = self.mean_throughput()
+
+        if latency is None and throughput is None:
+            return None
+
+        seconds = latency or 0
+
+        if size and throughput:
+            seconds += int(size) / throughput
+
+        return seconds
+
+    def _probe(self, uri):
+        host = host_of(uri)
+        start = time.time()
+
+        try:
+            response = self.session.head(
+                uri, timeout=settings.MirrorProbeTimeout,
+                allow_redirects=True
+            )
+            response.close()
+            response.raise_for_status()
+
+            self.record_latency(host, time.time() - start)
+
+        except Exception as e:
+            logger.debug("Probe of {0} failed: {1}".format(uri, e))
+            self.record_failure(host)
+
+    def probe(self, uris):
+        """HEADs, concurrently, the uris of healthy hosts with no recent
+        latency.
+        """
+
+        oldest = time.time() - settings.MirrorProbeInterval
+
+        # One uri per host.
+        stale = dict(
+            (host_of(uri), uri) for uri in reversed(uris)
+            if self.get(host_of(uri)).get(StatKey.LatencyTime, 0) < oldest
+            and self.healthy(host_of(uri))
+        )
+
+        if not stale or self.session is None:
+            return
+
+        pool = ThreadPool(len(stale))
+
+        try:
+            pool.map(self._probe, stale.values())
+        finally:
+            pool.close()
+            pool.join()
+
+    def rank(self, uris, size=None):
+        """Orders uris best first: healthy hosts by expected time, hosts
+        with no figures yet, then unhealthy ones. Ties keep the server's
+        order.
+        """
+
+        if len(uris) < 2:
+            return list(uris)
+
+        self.probe(uris)
+
+        def key(indexed_uri):
+            index, uri = indexed_uri
+            host = host_of(uri)
+
+            seconds = self.expected_seconds(host, size)
+
+            return (
+                not self.healthy(host),
+                seconds is None,
+                seconds,
+                index
+            )
+
+        return [uri for _, uri in sorted(enumerate(uris), key=key)]
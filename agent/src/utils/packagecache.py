@@ -0,0 +1,168 @@
+"""Content-addressed cache of downloaded update files.
+
+Files are stored under settings.PackageCacheDirectory by their hash and
+size, so the same package isn't downloaded again for a retried operation,
+a reinstall, or a dependency shared between apps. Only files whose hash
+was verified on download are stored.
+
+A cached file is hard-linked into the operation's update directory
+(copied when the two are on different filesystems), so wiping that
+directory leaves the cache intact. Cached files are made read-only, as
+they share their inode with every link handed out.
+
+The mtime of a cached file is its last use; the least recently used
+files are deleted once the cache grows past settings.PackageCacheQuota.
+"""
+import os
+import stat
+import shutil
+import threading
+
+from src.utils import settings, logger
+
+_TMP_EXTENSION = '.tmp'
+
+
+def _link(source, destination):
+    """Hard-links source to destination, copies it if that fails."""
+
+    if os.path.exists(destination):
+        os.remove(destination)
+
+    try:
+        os.link(source, destination)
+
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+class PackageCache():
+
+    def __init__(self, cache_dir=None, quota=None):
+        """
+        Args:
+            quota: Size limit in MB, 0 disables the cache.
+        """
+
+        self.cache_dir = cache_dir or settings.PackageCacheDirectory
+
+        if quota is None:
+            quota = settings.PackageCacheQuota
+
+        self.quota = quota * 1000 * 1000
+
+        self._lock = threading.Lock()
+
+    def enabled(self):
+        return self.quota > 0
+
+    def _path(self, file_hash, size):
+        key = '{0}-{1}'.format(file_hash.lower(), size)
+
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def has(self, file_hash, size):
+        if not self.enabled() or not file_hash:
+            return False
+
+        return os.path.exists(self._path(file_hash, size))
+
+    def get(self, file_hash, size, destination):
+        """Links the cached file with file_hash and size to destination.
+
+        Returns:
+            (bool) True if it was cached.
+        """
+
+        if not self.enabled() or not file_hash:
+            return False
+
+        path = self._path(file_hash, size)
+
+        with self._lock:
+            if not os.path.exists(path):
+                return False
+
+            try:
+                _link(path, destination)
+                os.utime(path, None)
+
+            except (IOError, OSError) as e:
+                logger.error(
+                    "Failed to use cached {0}.".format(path)
+                )
+                logger.exception(e)
+
+                return False
+
+        logger.debug("Using cached {0}.".format(path))
+
+        return True
+
+    def put(self, source, file_hash, size):
+        """Adds source, whose hash was verified, to the cache."""
+
+        if not self.enabled() or not file_hash:
+            return
+
+        path = self._path(file_hash, size)
+        tmp_path = path + _TMP_EXTENSION
+
+        with self._lock:
+            try:
+                if os.path.exists(path):
+                    os.utime(path, None)
+                    return
+
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+
+                _link(source, tmp_path)
+                os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                os.rename(tmp_path, path)
+
+            except (IOError, OSError) as e:
+                logger.error("Failed to cache {0}.".format(source))
+                logger.exception(e)
+
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+                return
+
+            self._evict()
+
+    def _evict(self):
+        """Deletes the least recently used files past the quota."""
+
+        # (mtime, size, path)
+        files = []
+        total = 0
+
+        for root, _, file_names in os.walk(self.cache_dir):
+            for file_name in file_names:
+                path = os.path.join(root, file_name)
+
+                try:
+                    file_stat = os.stat(path)
+                except OSError:
+                    continue
+
+                files.append((file_stat.st_mtime, file_stat.st_size, path))
+                total += file_stat.st_size
+
+        files.sort()
+
+        for _, size, path in files:
+            if total <= self.quota:
+                break
+
+            try:
+                os.remove(path)
+                total -= size
+
+                logger.debug("Evicted {0} from the cache.".format(path))
+
+            except OSError as e:
+                logger.error("Failed to evict {0}.".format(path))
+                logger.exception(e)
@@ -45,6 +45,11 @@ TempDirectory = os.path.join(AgentDirectory, 'tmp')
 CertsDirectory = os.path.join(EtcDirectory, 'certs')
 PluginDirectory = os.path.join(AgentDirectory, 'plugins')
 UpdatesDirectory = os.path.join(TempDirectory, 'updates')
+# Unlike TempDirectory, kept across restarts.
+CacheDirectory = os.path.join(AgentDirectory, 'cache')
+PartialDownloadsDirectory = os.path.join(CacheDirectory, 'partial')
+PackageCacheDirectory = os.path.join(CacheDirectory, 'packages')
+PrefetchDirectory = os.path.join(CacheDirectory, 'prefetch')
 
 ServerCert = os.path.join(CertsDirectory, _server_crt_file)
 
@@ -54,6 +59,98 @@ reboot_file = os.path.join(EtcDirectory, '.reboot')
 shutdown_file = os.path.join(EtcDirectory, '.shutdown')
 uptime_file = os.path.join(EtcDirectory, '.last_uptime')
 update_file = os.path.join(EtcDirectory, '.agent_update')
+log_upload_file = os.path.join(EtcDirectory, '.log_upload')
+apt_lists_cache_file = os.path.join(DbDirectory, 'aptlists.cache')
+release_dates_cache_file = os.path.join(DbDirectory, 'releasedates.json')
+index_freshness_file = os.path.join(EtcDirectory, '.index_freshness')
+mirror_stats_file = os.path.join(EtcDirectory, '.mirror_stats')
+
+# Agent log retrieval is streamed to the server in chunks of this many
+# (uncompressed) bytes, capped at LogUploadMaxBytes per retrieval.
+LogUploadChunkSize = 256 * 1024
+LogUploadMaxBytes = 50 * 1024 * 1024
+
+# Operations are written to the agent db in batches of DbBatchSize rows, or
+# once the oldest pending row is DbBatchMaxAge seconds old.
+DbBatchSize = 20
+DbBatchMaxAge = 5
+
+# Operation history is kept for OperationRetentionDays, and never more than
+# OperationRetentionRows rows. The db is compacted after DbCompactThreshold
+# rows have been deleted in one go.
+OperationRetentionDays = 90
+OperationRetentionRows = 100000
+DbCompactThreshold = 1000
+
+# Release dates of update packages are looked up ReleaseDateWorkers at a
+# time, giving up on a repository after ReleaseDateTimeout seconds.
+ReleaseDateWorkers = 8
+ReleaseDateTimeout = 10
+
+# Seconds between offline checks of the upgradable packages. A refresh apps
+# operation runs whenever the set changes.
+UpgradableCheckInterval = 900
+
+# Package manager metadata refreshed less than this many seconds ago, by the
+# agent or anything else, isn't downloaded again. Overridden by the
+# optional 'indexrefreshwindow' option of agent.config.
+IndexRefreshWindow = 3600
+
+# Update files are downloaded DownloadWorkers at a time, with at most
+# DownloadConnectionsPerHost of them from the same host.
+DownloadWorkers = 4
+DownloadConnectionsPerHost = 2
+DownloadTimeout = 60
+
+# A failed download is resumed from where it stopped up to DownloadRetries
+# times per uri. Partial downloads unused for PartialDownloadMaxAge days are
+# deleted.
+DownloadRetries = 3
+PartialDownloadMaxAge = 7
+
+# Verified update files are kept in PackageCacheDirectory, least recently
+# used ones are deleted past PackageCacheQuota MB. Overridden by the
+# optional 'packagecachequota' option of agent.config, 0 disables the cache.
+PackageCacheQuota = 1024
+
+# Downloads share a token bucket of DownloadBurst KB, filled at the
+# operation's net_throttle. BandwidthSchedule further limits it by time of
+# day, ex: '08:00-18:00=256, 18:00-08:00=0' (KB/s, 0 is unlimited).
+# Overridden by the optional 'bandwidthschedule' option of agent.config.
+DownloadBurst = 256
+BandwidthSchedule = ''
+
+# Apps installed one at a time are downloaded at most InstallLookAhead apps
+# ahead of the one installing.
+InstallLookAhead = 2
+
+# A file's uris are tried fastest host first. Hosts without a latency
+# measured in the last MirrorProbeInterval seconds are probed first, for up
+# to MirrorProbeTimeout seconds. MirrorMaxFailures failures in a row put a
+# host last for MirrorFailureCooldown seconds.
+MirrorProbeTimeout = 3
+MirrorProbeInterval = 3600
+MirrorMaxFailures = 3
+MirrorFailureCooldown = 600
+
+# Files of at least ParallelRangeMinSize MB that have a hash and several
+# healthy mirrors are fetched in byte ranges from all of them at once.
+# 0 disables it.
+ParallelRangeMinSize = 64
+
+# Every PrefetchInterval seconds, within the PrefetchSchedule windows (see
+# BandwidthSchedule), the files of available updates are downloaded into
+# the package cache ahead of the install operation, up to PrefetchQuota MB
+# at a time. Overridden by the optional 'prefetchinterval' and
+# 'prefetchschedule' options of agent.config; the interval's 0 disables it.
+PrefetchInterval = 0
+PrefetchSchedule = '01:00-06:00=0'
+PrefetchQuota = 512
+PrefetchWorkers = 2
+
+# Limits of a single downloaded archive, nested archives included.
+ExtractMaxSize = 8192
+ExtractMaxFiles = 200000
 
 ServerAddress = None
 ServerIpAddress = None
@@ -100,6 +197,12 @@ def _create_directories():
     if not os.path.exists(LogDirectory):
         os.makedirs(LogDirectory)
 
+    if not os.path.exists(PartialDownloadsDirectory):
+        os.makedirs(PartialDownloadsDirectory)
+
+    if not os.path.exists(PackageCacheDirectory):
+        os.makedirs(PackageCacheDirectory)
+
     if not os.path.exists(EtcDirectory):
         os.makedirs(EtcDirectory)
 
@@ -116,6 +219,22 @@ def _create_directories():
         os.makedirs(TempDirectory)
 
 
+def _get_optional(section, option, default, cast=str):
+    """Gets an option that agent.config doesn't have to contain."""
+
+    try:
+        if _config.has_option(section, option):
+            return cast(_config.get(section, option))
+
+    except ValueError:
+        logger.error(
+            "Invalid value for {0} in agent.config, using {1}."
+            .format(option, default)
+        )
+
+    return default
+
+
 def initialize(appName=None):
     """ This method must be called to initialize the settings,
      otherwise the properties will be None.
@@ -139,6 +258,11 @@ def initialize(appName=None):
     global Username
     global Password
     global Customer
+    global IndexRefreshWindow
+    global PackageCacheQuota
+    global BandwidthSchedule
+    global PrefetchInterval
+    global PrefetchSchedule
 
     _create_directories()
 
@@ -158,6 +282,22 @@ def initialize(appName=None):
     AgentDescription = _config.get(_agent_info_section, 'description')
     AgentInstallDate = _config.get(_agent_info_section, 'installdate')
 
+    IndexRefreshWindow = _get_optional(
+        _app_settings_section, 'indexrefreshwindow', IndexRefreshWindow, int
+    )
+    PackageCacheQuota = _get_optional(
+        _app_settings_section, 'packagecachequota', PackageCacheQuota, int
+    )
+    BandwidthSchedule = _get_optional(
+        _app_settings_section, 'bandwidthschedule', BandwidthSchedule
+    )
+    PrefetchInterval = _get_optional(
+        _app_settings_section, 'prefetchinterval', PrefetchInterval, int
+    )
+    PrefetchSchedule = _get_optional(
+        _app_settings_section, 'prefetchschedule', PrefetchSchedule
+    )
+
     if not appName:
         appName = 'agent'
 
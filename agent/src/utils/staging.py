@@ -0,0 +1,196 @@
+"""Staging of downloaded files into the directories packages are installed
+from, without copying them where it can be avoided.
+
+Each file is moved with the cheapest method that works:
+
+    rename: Same filesystem, the source is consumed.
+    link: Same filesystem, the source is kept.
+    sendfile: In kernel copy, for different filesystems.
+    copy: Plain read/write copy, if sendfile isn't available.
+
+Copies are written to a temporary name in the destination directory and
+renamed into place, so a destination either has the whole file or
+nothing. Staging a directory is all or nothing too: its files are linked
+or copied, and only removed from the source once all of them are staged;
+on failure the ones already staged are removed instead.
+"""
+import os
+import errno
+import shutil
+import threading
+
+from src.utils import logger
+
+try:
+    from os import sendfile
+except ImportError:
+    try:
+        from sendfile import sendfile
+    except ImportError:
+        sendfile = None
+
+_TMP_PREFIX = '.staging-'
+_CHUNK_SIZE = 1024 * 1024
+
+RENAME = 'rename'
+LINK = 'link'
+SENDFILE = 'sendfile'
+COPY = 'copy'
+
+
+def _copy_sendfile(source, destination):
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        size = os.fstat(src.fileno()).st_size
+        offset = 0
+
+        while offset < size:
+            sent = sendfile(
+                dst.fileno(), src.fileno(), offset,
+                min(_CHUNK_SIZE * 16, size - offset)
+            )
+
+            if sent == 0:
+                break
+
+            offset += sent
+
+
+class Stager():
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            # method: [files, bytes]
+            self.stats = dict(
+                (method, [0, 0]) for method in (RENAME, LINK, SENDFILE, COPY)
+            )
+
+    def _count(self, method, size):
+        with self._lock:
+            self.stats[method][0] += 1
+            self.stats[method][1] += size
+
+    def bytes_copied(self):
+        """Bytes that had to be written to disk again."""
+
+        return self.stats[SENDFILE][1] + self.stats[COPY][1]
+
+    def _copy(self, source, destination):
+        tmp_path = os.path.join(
+            os.path.dirname(destination),
+            _TMP_PREFIX + os.path.basename(destination)
+        )
+
+        try:
+            method = COPY
+
+            if sendfile is not None:
+                try:
+                    _copy_sendfile(source, tmp_path)
+                    method = SENDFILE
+
+                except OSError as e:
+                    if e.errno not in (errno.EINVAL, errno.ENOSYS):
+                        raise
+
+            if method == COPY:
+                with open(source, 'rb') as src:
+                    with open(tmp_path, 'wb') as dst:
+                        shutil.copyfileobj(src, dst, _CHUNK_SIZE)
+
+            shutil.copymode(source, tmp_path)
+            os.rename(tmp_path, destination)
+
+        except:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+            raise
+
+        return method
+
+    def stage(self, source, destination, keep_source=False):
+        """Puts source at destination, replacing it.
+
+        Args:
+            keep_source: Link rather than rename when on the same
+                filesystem.
+
+        Returns:
+            (str) Method used.
+        """
+
+        size = os.path.getsize(source)
+        method = None
+
+        try:
+            if keep_source:
+                if os.path.exists(destination):
+                    os.remove(destination)
+
+                os.link(source, destination)
+                method = LINK
+
+            else:
+                os.rename(source, destination)
+                method = RENAME
+
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+
+        if method is None:
+            method = self._copy(source, destination)
+
+            if not keep_source:
+                os.remove(source)
+
+        self._count(method, size)
+
+        return method
+
+    def stage_dir(self, source_dir, destination_dir, keep_source=False):
+        """Stages every file of source_dir into destination_dir, or none.
+
+        Args:
+            keep_source: Leave the files in source_dir.
+
+        Returns:
+            (list) Staged destination paths.
+        """
+
+        # (source, destination)
+        staged = []
+
+        try:
+            for file_name in sorted(os.listdir(source_dir)):
+                source = os.path.join(source_dir, file_name)
+
+                if not os.path.isfile(source):
+                    continue
+
+                destination = os.path.join(destination_dir, file_name)
+
+                self.stage(source, destination, keep_source=True)
+                staged.append((source, destination))
+
+        except:
+            for _, destination in staged:
+                try:
+                    os.remove(destination)
+                except OSError as e:
+                    logger.error(
+                        "Failed to unstage {0}.".format(destination)
+                    )
+                    logger.exception(e)
+
+            raise
+
+        if not keep_source:
+            for source, _ in staged:
+                os.remove(source)
+
+        return [destination for _, destination in staged]
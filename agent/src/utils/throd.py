@@ -1,43 +1,155 @@
 import time
-import urllib
- 
- 
-class ThrottleDownload(object):
-    def __init__(self, rate=None):
-        """ Specify rate in KB/s. """
+import threading
+
+from src.utils import logger
+
+
+def parse_schedule(schedule):
+    """ Parses a bandwidth schedule.
+
+    Ex: '08:00-18:00=256, 18:00-08:00=0'
+        -> [(480, 1080, 256), (1080, 480, 0)]
+
+    Each entry is a time of day range and the rate in KB/s within it,
+    0 meaning unlimited. Ranges may wrap past midnight. Malformed entries
+    are logged and skipped.
+
+    Returns:
+        (list) (start minute, end minute, KB/s) tuples.
+    """
+
+    entries = []
+
+    for entry in (schedule or '').split(','):
+        entry = entry.strip()
+
+        if not entry:
+            continue
+
+        try:
+            hours, rate = entry.split('=')
+            start, end = hours.split('-')
+
+            minutes = []
+            for hour in (start, end):
+                hour, minute = hour.strip().split(':')
+                minutes.append(int(hour) * 60 + int(minute))
+
+            entries.append((minutes[0], minutes[1], float(rate)))
+
+        except ValueError as e:
+            logger.error("Bad bandwidth schedule entry: {0}".format(entry))
+            logger.exception(e)
+
+    return entries
+
+
+def schedule_entry(entries, now=None):
+    """ First entry covering now (epoch), None if there's none. """
+
+    local = time.localtime(now)
+    minute = local.tm_hour * 60 + local.tm_min
+
+    for entry in entries:
+        start, end, _ = entry
+
+        if start <= end:
+            within = start <= minute < end
+        else:
+            within = minute >= start or minute < end
+
+        if within:
+            return entry
+
+    return None
+
+
+def scheduled_rate(entries, now=None):
+    """ Rate in KB/s the schedule allows at now (epoch), None if no entry
+    covers it or it is unlimited.
+    """
+
+    entry = schedule_entry(entries, now)
+
+    if entry is None or entry[2] <= 0:
+        return None
+
+    return entry[2]
+
+
+class TokenBucket(object):
+    """ Shared download budget for several concurrent downloads.
+
+    The bucket fills at the rate, up to burst bytes. Every download takes
+    the bytes it received with consume(); once the bucket runs dry the
+    caller sleeps until the refill covers what it took, so traffic stays
+    smooth and the aggregate at or under the rate.
+
+    The rate is the lower of set_rate()'s and the time of day schedule's.
+    """
+
+    def __init__(self, rate=None, burst=None, schedule=None):
+        """
+        Args:
+            rate: KB/s, None or 0 means unlimited.
+            burst: Bucket size in bytes. Defaults to a second at the rate.
+            schedule: See parse_schedule().
+        """
+
+        self._lock = threading.Lock()
+        self._burst = burst
+        self._tokens = 0.0
+        self._last_time = time.time()
+        self._schedule = parse_schedule(schedule)
+
         self.set_rate(rate)
- 
+
     def set_rate(self, rate):
-        if isinstance(rate, int) or isinstance(rate, float):
-            if rate <= 0:
-                self._rate = None
-            else:
-                self._rate = rate
+        """ Rate in KB/s. None or 0 means unlimited. """
+
+        if isinstance(rate, (int, float)) and rate > 0:
+            self._rate = rate
         else:
             self._rate = None
- 
-    def _throttle_hook(self, blocknum, bs, size):
-        if blocknum == 0:
-            self.start_time = time.time()
-            return
- 
-        downloaded = (blocknum * bs) / 1000  # In bytes
-        elapsed_time = time.time() - self.start_time  # In seconds
- 
-        current_rate = downloaded / elapsed_time
-        #print str(current_rate) + " KB/sec"
- 
-        if self._rate == None:
-            return
-
-        if current_rate > self._rate and self._rate != 0:
-            sleep_time = (downloaded / self._rate) - elapsed_time
-            if sleep_time < 0:
-                sleep_time = 0
- 
-            #print "Sleep time: " + str(sleep_time)
+
+    def set_schedule(self, schedule):
+        self._schedule = parse_schedule(schedule)
+
+    def rate(self, now=None):
+        """ Current rate in bytes/s, None if unlimited. """
+
+        rates = [
+            rate for rate in (self._rate, scheduled_rate(self._schedule, now))
+            if rate
+        ]
+
+        if not rates:
+            return None
+
+        return min(rates) * 1000.0
+
+    def consume(self, nbytes):
+        with self._lock:
+            now = time.time()
+            rate = self.rate(now)
+
+            if rate is None:
+                self._tokens = 0.0
+                self._last_time = now
+
+                return
+
+            burst = self._burst or rate
+
+            self._tokens = min(
+                burst, self._tokens + (now - self._last_time) * rate
+            )
+            self._last_time = now
+
+            # Goes negative when the bucket runs dry; callers that come
+            # in meanwhile queue up behind the debt.
+            self._tokens -= nbytes
+            sleep_time = -self._tokens / rate
+
+        if sleep_time > 0:
             time.sleep(sleep_time)
- 
-    def download(self, url, download_path):
-        urllib.urlretrieve(
-            url, download_path, reporthook=self._throttle_hook)
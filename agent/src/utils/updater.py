@@ -1,9 +1,7 @@
 import os
-import tarfile
 import shutil
-import zipfile
 
-from src.utils import logger, utilcmds
+from src.utils import logger, utilcmds, extractor
 from src.utils.distro.mac import DmgMounter
 
 
@@ -32,25 +30,14 @@ class Updater():
 
         return self.dmg.mount_dmg(path)
 
-    def _decompress_tar(self, path):
-        tar_name = os.path.basename(path)
+    def _decompress_archive(self, path):
+        archive_name = os.path.basename(path)
         path_dir = os.path.dirname(path)
 
-        tar = tarfile.open(path)
-        tar.extractall(path_dir)
-        tar.close()
+        # Archives in the update are part of it.
+        extractor.Extractor().extract(path, path_dir, nested=False)
 
-        return os.path.join(path_dir, tar_name.split('.')[0])
-
-    def _decompress_zip(self, path):
-        zip_name = os.path.basename(path)
-        path_dir = os.path.dirname(path)
-
-        zip = zipfile.ZipFile(path)
-        zip.extractall(path_dir)
-        zip.close()
-
-        return os.path.join(path_dir, zip_name.split('.')[0])
+        return os.path.join(path_dir, archive_name.split('.')[0])
 
     def _decompress_update_file(self, update_path):
         """
@@ -64,11 +51,8 @@ class Updater():
             if 'dmg' in file_name.split('.'):
                 return self._mount_dmg(update_path)
 
-            elif 'tar' in file_name.split('.'):
-                return self._decompress_tar(update_path)
-
-            elif 'zip' in file_name.split('.'):
-                return self._decompress_zip(update_path)
+            elif extractor.is_archive(file_name):
+                return self._decompress_archive(update_path)
 
         return update_path
 
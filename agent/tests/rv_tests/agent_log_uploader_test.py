@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import zlib
+import base64
+import shutil
+import tempfile
+import unittest
+
+from src.utils import settings
+from src.serveroperation.sofoperation import SofOperation, ResponseUris, \
+    OperationKey, RequestMethod
+from plugins.patching import agent_log_uploader
+from plugins.patching.agent_log_uploader import AgentLogUploader, LogChunkKey
+from plugins.patching.patchingsofoperation import PatchingOperationValue
+
+
+class _Server():
+    """Receives chunks, failing the ones listed in fail_at (by call)."""
+
+    def __init__(self, fail_at=()):
+        self.fail_at = set(fail_at)
+        self.calls = 0
+        self.chunks = []
+
+    def send_message(self, message, uri, method):
+        self.calls += 1
+
+        if self.calls in self.fail_at:
+            return False
+
+        self.chunks.append(json.loads(message)[OperationKey.Data])
+
+        return True
+
+    def content(self):
+        return ''.join(
+            zlib.decompress(base64.b64decode(chunk[LogChunkKey.Content]))
+            for chunk in self.chunks
+        )
+
+
+class _Time():
+
+    def __init__(self):
+        self.sleeps = []
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+
+class TestAgentLogUploader(unittest.TestCase):
+
+    operation_type = PatchingOperationValue.AgentLogRetrieval
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+        self.log_upload_file = settings.log_upload_file
+        settings.log_upload_file = os.path.join(self.work_dir, '.log_upload')
+
+        ResponseUris.ResponseDict[self.operation_type] = {
+            OperationKey.ResponseUri: 'rvl/v1/logs',
+            OperationKey.RequestMethod: RequestMethod.PUT
+        }
+
+        self.time = _Time()
+        agent_log_uploader.time = self.time
+
+        self.operation = SofOperation()
+        self.operation.id = 'log-operation'
+        self.operation.type = self.operation_type
+        self.operation.plugin = 'rv'
+
+        # Lines of varying length, chunks end mid-line.
+        self.log_path = os.path.join(self.work_dir, 'agent.log')
+        self.log_content = ''.join(
+            'line {0}: {1}\n'.format(i, 'x' * (i % 17)) for i in range(300)
+        )
+
+        with open(self.log_path, 'w') as _file:
+            _file.write(self.log_content)
+
+    def tearDown(self):
+        settings.log_upload_file = self.log_upload_file
+        ResponseUris.ResponseDict.pop(self.operation_type, None)
+        agent_log_uploader.time = time
+
+        shutil.rmtree(self.work_dir)
+
+    def test_round_trip(self):
+        server = _Server()
+        uploader = AgentLogUploader(server.send_message, chunk_size=1000)
+
+        self.assertTrue(uploader.upload(self.operation, [self.log_path]))
+
+        self.assertEqual(server.content(), self.log_content)
+        self.assertEqual(
+            [chunk[LogChunkKey.Offset] for chunk in server.chunks],
+            range(0, len(self.log_content), 1000)
+        )
+        self.assertEqual(
+            [chunk[LogChunkKey.LastChunk] for chunk in server.chunks],
+            [False] * (len(server.chunks) - 1) + [True]
+        )
+        self.assertTrue(all(
+            chunk[LogChunkKey.Encoding] == 'zlib+base64' and
+            chunk[LogChunkKey.FileSize] == len(self.log_content) and
+            not chunk[LogChunkKey.Truncated]
+            for chunk in server.chunks
+        ))
+
+        # Done, nothing left to resume.
+        with open(settings.log_upload_file) as _file:
+            self.assertEqual(json.load(_file), {})
+
+    def test_resume(self):
+        # Third chunk fails on every attempt.
+        server = _Server(fail_at=[3, 4])
+        uploader = AgentLogUploader(
+            server.send_message, chunk_size=1000, retries=2
+        )
+
+        self.assertFalse(uploader.upload(self.operation, [self.log_path]))
+
+        with open(settings.log_upload_file) as _file:
+            self.assertEqual(
+                json.load(_file), {'log-operation': {'agent.log': 2000}}
+            )
+
+        server.chunks = []
+        self.assertTrue(uploader.upload(self.operation, [self.log_path]))
+
+        self.assertEqual(server.chunks[0][LogChunkKey.Offset], 2000)
+        self.assertEqual(server.content(), self.log_content[2000:])
+
+    def test_no_sleep_after_last_attempt(self):
+        server = _Server(fail_at=[1, 2, 3])
+        uploader = AgentLogUploader(server.send_message, retries=3)
+
+        self.assertFalse(uploader.upload(self.operation, [self.log_path]))
+
+        self.assertEqual(server.calls, 3)
+        self.assertEqual(self.time.sleeps, [1, 2])
@@ -0,0 +1,147 @@
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+
+from plugins.patching.distro.deb import aptlists
+
+
+class TestAptLists(unittest.TestCase):
+
+    packages = (
+        "Package: foo\n"
+        "Version: 1.1-1\n"
+        "Architecture: amd64\n"
+        "Filename: pool/main/f/foo/foo_1.1-1_amd64.deb\n"
+        "Size: 1024\n"
+        "SHA256: abcd\n"
+        "Description: foo tool\n"
+        " Long description.\n"
+        "\n"
+        "Package: bar\n"
+        "Version: 2.0\n"
+        "Architecture: all\n"
+        "Filename: pool/main/b/bar/bar_2.0_all.deb\n"
+        "Depends: foo (>= 1.1)\n"
+        "Description: bar tool\n"
+        "Description-md5: 0123\n"
+        "\n"
+        "Package: foo\n"
+        "Version: 1.1-1\n"
+        "Architecture: i386\n"
+        "Filename: pool/main/f/foo/foo_1.1-1_i386.deb\n"
+        "SHA256: ef01\n"
+    )
+
+    translations = (
+        "Package: bar\n"
+        "Description-md5: 0123\n"
+        "Description-en: bar tool\n"
+        " Long description of bar.\n"
+    )
+
+    list_name = (
+        'archive.ubuntu.com_ubuntu_dists_focal-updates_main_binary-amd64_'
+        'Packages'
+    )
+
+    translation_name = (
+        'archive.ubuntu.com_ubuntu_dists_focal-updates_main_i18n_'
+        'Translation-en'
+    )
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.lists_dir = os.path.join(self.work_dir, 'lists')
+        os.mkdir(self.lists_dir)
+
+        _file = gzip.open(
+            os.path.join(self.lists_dir, self.list_name + '.gz'), 'wb'
+        )
+        _file.write(self.packages)
+        _file.close()
+
+        with open(os.path.join(self.lists_dir, self.translation_name),
+                  'w') as _file:
+            _file.write(self.translations)
+
+        self.cache_file = os.path.join(self.work_dir, 'aptlists.cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_lookup(self):
+        index = aptlists.AptListsIndex(self.lists_dir, self.cache_file)
+
+        self.assertTrue(index.refresh())
+        self.assertIsNone(index.get_version('foo', '1.0'))
+
+        entry = index.get_version('foo', '1.1-1', 'amd64')
+        self.assertEqual(entry.size, '1024')
+        self.assertEqual(entry.origin.uri, 'http://archive.ubuntu.com/ubuntu/')
+        self.assertEqual(
+            entry.origin.repo,
+            'http://archive.ubuntu.com/ubuntu/ focal-updates/main amd64 '
+            'Packages'
+        )
+        self.assertEqual(index.get_version('bar', '2.0').depends,
+                         'foo (>= 1.1)')
+
+    def test_architecture(self):
+        index = aptlists.AptListsIndex(self.lists_dir, self.cache_file)
+        index.refresh()
+
+        self.assertEqual(index.get_version('foo', '1.1-1', 'i386').sha256,
+                         'ef01')
+        self.assertEqual(index.get_version('foo', '1.1-1', 'amd64').sha256,
+                         'abcd')
+        self.assertEqual(index.get_version('bar', '2.0', 'i386').filename,
+                         'pool/main/b/bar/bar_2.0_all.deb')
+
+    def test_descriptions(self):
+        index = aptlists.AptListsIndex(self.lists_dir, self.cache_file)
+        index.refresh()
+
+        packages = [
+            ('bar', index.get_version('bar', '2.0')),
+            ('foo', index.get_version('foo', '1.1-1', 'amd64')),
+            ('foo', index.get_version('foo', '1.1-1', 'i386')),
+        ]
+
+        self.assertEqual(
+            index.get_descriptions(packages),
+            ['bar tool\n Long description of bar.',
+             'foo tool\n Long description.',
+             '']
+        )
+
+        # Without a translation, the summary in the Packages list.
+        os.remove(os.path.join(self.lists_dir, self.translation_name))
+
+        self.assertEqual(index.get_descriptions(packages[:1]), ['bar tool'])
+
+    def test_descriptions_not_cached(self):
+        aptlists.AptListsIndex(self.lists_dir, self.cache_file).refresh()
+
+        with open(self.cache_file, 'rb') as _file:
+            cache = _file.read()
+
+        self.assertNotIn('tool', cache)
+        self.assertNotIn(self.translation_name, cache)
+
+    def test_cache_is_reused(self):
+        aptlists.AptListsIndex(self.lists_dir, self.cache_file).refresh()
+
+        index = aptlists.AptListsIndex(self.lists_dir, self.cache_file)
+
+        self.assertFalse(index.refresh())
+        self.assertEqual(index.get_version('bar', '2.0').filename,
+                         'pool/main/b/bar/bar_2.0_all.deb')
+
+    def test_origin_uses_configured_uri(self):
+        origin = aptlists.parse_origin(
+            self.list_name, ['https://archive.ubuntu.com/ubuntu']
+        )
+
+        self.assertEqual(origin.uri, 'https://archive.ubuntu.com/ubuntu/')
@@ -0,0 +1,182 @@
+import unittest
+
+from plugins.patching.data.application import AppUtils
+from plugins.patching.distro.deb import apttransaction
+from plugins.patching.operationhandler.debhandler import DebianHandler
+from plugins.patching.patchingsofoperation import InstallData
+
+
+_multiarch = """\
+Reading package lists...
+Building dependency tree...
+Reading state information...
+curl is already the newest version (7.68.0-1ubuntu2.7).
+The following packages will be upgraded:
+  libc6 libc6:i386 libssl1.1
+3 upgraded, 0 newly installed, 0 to remove and 12 not upgraded.
+Need to get 5,312 kB of archives.
+Preparing to unpack .../libc6_2.31-0ubuntu9.9_i386.deb ...
+Unpacking libc6:i386 (2.31-0ubuntu9.9) over (2.31-0ubuntu9.7) ...
+Preparing to unpack .../libc6_2.31-0ubuntu9.9_amd64.deb ...
+Unpacking libc6:amd64 (2.31-0ubuntu9.9) over (2.31-0ubuntu9.7) ...
+Setting up libc6:amd64 (2.31-0ubuntu9.9) ...
+Setting up libssl1.1:amd64 (1.1.1f-1ubuntu2.16) ...
+Processing triggers for libc-bin (2.31-0ubuntu9.9) ...
+"""
+
+_errors = """\
+Setting up foo (1.0-1) ...
+Setting up bar:amd64 (2.0-1) ...
+dpkg: error processing package bar:amd64 (--configure):
+ installed bar package post-installation script subprocess returned error \
+exit status 1
+dpkg: dependency problems prevent configuration of baz:
+ baz depends on bar; however:
+  Package bar is not configured yet.
+
+dpkg: error processing package baz (--configure):
+ dependency problems - leaving unconfigured
+Preparing to unpack .../qux_2.0-1_i386.deb ...
+dpkg: error processing archive /var/cache/apt/archives/qux_2.0-1_i386.deb \
+(--unpack):
+ trying to overwrite '/usr/bin/qux', which is also in package qux 1.0-1
+Errors were encountered while processing:
+ bar:amd64
+ baz
+ /var/cache/apt/archives/qux_2.0-1_i386.deb
+ quux
+E: Sub-process /usr/bin/dpkg returned an error code (1)
+"""
+
+_not_found = """\
+Reading package lists...
+Building dependency tree...
+Reading state information...
+E: Unable to locate package nosuch
+"""
+
+
+class _FakeCmds():
+
+    def __init__(self, output):
+        self.output = output
+        self.commands = []
+
+    def run_command(self, cmd):
+        self.commands.append(cmd)
+        return self.output, ''
+
+
+class _FakeDebianHandler(DebianHandler):
+    """Runs install_updates against a canned apt-get output."""
+
+    def __init__(self, output, apps_to_add):
+        self.utilcmds = _FakeCmds(output)
+        self.update_notifier_installed = False
+        self._native_architecture = 'amd64'
+
+        self.apps_to_add = apps_to_add
+        self.serial = []
+
+    def _get_inventory_mark(self):
+        return None
+
+    def _move_pkgs_to_apt_dir(self, packages_dir):
+        return ''
+
+    def _get_apps_to_add_and_delete(self, inventory_mark):
+        return self.apps_to_add, []
+
+    def _get_installed_app(self, name):
+        return AppUtils.null_application()
+
+    def install_update(self, install_data, update_dir=None):
+        self.serial.append(install_data.name)
+        return 'serial'
+
+
+def _install_data(name):
+    install_data = InstallData()
+    install_data.name = name
+    install_data.id = name + '-id'
+
+    return install_data
+
+
+class TestAptTransaction(unittest.TestCase):
+
+    # (output, done, failed names)
+    transcripts = [
+        (_multiarch, set(['curl', 'libc6', 'libssl1.1']), set()),
+        (_errors, set(['foo']), set(['bar', 'baz', 'qux:i386', 'quux'])),
+        (_not_found, set(), set()),
+    ]
+
+    def test_parse(self):
+        for output, done, failed in self.transcripts:
+            parsed_done, parsed_failed = apttransaction.parse(output, 'amd64')
+
+            self.assertEqual(parsed_done, done)
+            self.assertEqual(set(parsed_failed), failed)
+
+        _, failed = apttransaction.parse(_errors, 'amd64')
+        self.assertEqual(
+            failed['bar'],
+            'dpkg: error processing package bar:amd64 (--configure):'
+        )
+        self.assertEqual(failed['quux'], 'dpkg failed to process package.')
+
+    def test_canonical_name(self):
+        names = [
+            ('libc6', 'libc6'),
+            ('libc6:amd64', 'libc6'),
+            ('tzdata:all', 'tzdata'),
+            ('libc6:i386', 'libc6:i386'),
+            ('/var/cache/apt/archives/foo_1.0-1_amd64.deb', 'foo'),
+            ('/var/cache/apt/archives/foo_1.0-1_armhf.deb', 'foo:armhf'),
+        ]
+
+        for name, canonical in names:
+            self.assertEqual(
+                apttransaction.canonical_name(name, 'amd64'), canonical
+            )
+
+        self.assertEqual(
+            apttransaction.canonical_name('libc6:i386', None), 'libc6'
+        )
+
+    def test_install_updates_by_architecture(self):
+        apps_to_add = [{'name': 'libc6'}, {'name': 'libssl1.1'},
+                       {'name': 'zlib1g'}]
+
+        handler = _FakeDebianHandler(_multiarch, apps_to_add)
+        results = handler.install_updates(
+            [_install_data('libc6:i386'), _install_data('libssl1.1'),
+             _install_data('curl')],
+            '/nonexistent'
+        )
+
+        self.assertEqual(
+            handler.utilcmds.commands[0][-3:],
+            ['libc6:i386', 'libssl1.1', 'curl']
+        )
+
+        # Only libc6:amd64 was set up, not the requested libc6:i386.
+        self.assertEqual([result.successful for result in results],
+                         ['false', 'true', 'true'])
+
+        # zlib1g, a dependency, goes to the first successful package.
+        self.assertEqual(
+            [app['name'] for app in results[1].apps_to_add],
+            ['libssl1.1', 'zlib1g']
+        )
+        self.assertEqual(results[2].apps_to_add, [])
+
+    def test_install_updates_one_at_a_time(self):
+        handler = _FakeDebianHandler(_not_found, [])
+        results = handler.install_updates(
+            [_install_data('nosuch'), _install_data('curl')], '/nonexistent'
+        )
+
+        self.assertEqual(handler.serial, ['nosuch', 'curl'])
+        self.assertEqual(results, ['serial', 'serial'])
@@ -0,0 +1,67 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from plugins.patching.distro.deb import deb822
+
+
+class TestDeb822(unittest.TestCase):
+
+    status = (
+        "Package: libfoo1\n"
+        "Status: install ok installed\n"
+        "Version: 1.2-3\n"
+        "Description: foo library\n"
+        " This library is divided into parts:\n"
+        " .\n"
+        " Second paragraph.\n"
+        "\n"
+        "Package: bar\n"
+        "Status: deinstall ok config-files\n"
+        "Version: 2.0\n"
+    )
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.status_file = os.path.join(self.work_dir, 'status')
+
+        with open(self.status_file, 'w') as _file:
+            _file.write(self.status)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_continuation_lines_stay_in_field(self):
+        packages = deb822.parse_packages(self.status.splitlines(True))
+
+        self.assertEqual(sorted(packages), ['bar', 'libfoo1'])
+        self.assertEqual(
+            packages['libfoo1']['Description'],
+            "foo library\n This library is divided into parts:\n .\n"
+            " Second paragraph."
+        )
+        self.assertNotIn('This library is divided into parts',
+                         packages['libfoo1'])
+
+    def test_cache_filters_installed(self):
+        cache = deb822.StatusFileCache(self.status_file)
+        installed = cache.get_installed('install ok installed')
+
+        self.assertEqual(installed.keys(), ['libfoo1'])
+
+    def test_cache_reparses_only_on_change(self):
+        cache = deb822.StatusFileCache(self.status_file)
+        first = cache.get_packages()
+
+        self.assertIs(cache.get_packages()['bar'], first['bar'])
+
+        # dpkg replaces the status file, giving it a new inode and mtime.
+        time.sleep(0.01)
+        new_file = self.status_file + '-new'
+        with open(new_file, 'w') as _file:
+            _file.write(self.status.replace('Version: 2.0', 'Version: 2.1'))
+        os.rename(new_file, self.status_file)
+
+        self.assertEqual(cache.get_packages()['bar']['Version'], '2.1')
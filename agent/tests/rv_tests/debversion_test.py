@@ -0,0 +1,66 @@
+import unittest
+
+from plugins.patching.distro.deb import debversion
+
+
+class TestDebVersion(unittest.TestCase):
+
+    # (lower, higher) pairs, checked against 'dpkg --compare-versions'.
+    ordered = [
+        ('1.0', '1.1'),
+        ('1.0', '1.0.1'),
+        ('1.0~rc1', '1.0'),
+        ('1.0~~', '1.0~'),
+        ('1.0~', '1.0'),
+        ('1.0', '1.0a'),
+        ('1.0a', '1.0+'),
+        ('1.0a', '1.0b'),
+        ('1.9', '1.10'),
+        ('1.0-1', '1.0-2'),
+        ('1.0-9', '1.0-10'),
+        ('1.0-1ubuntu1', '1.0-1ubuntu2'),
+        ('1.0-1', '1.0-1ubuntu0.1'),
+        ('1.0-1ubuntu0.1', '1.0-1.1'),
+        ('2.0', '1:1.0'),
+        ('1:2.0', '2:0.1'),
+        ('2.30-0ubuntu1~18.04', '2.30-0ubuntu1'),
+        ('0.9', '0.10~beta'),
+        ('1.2.3-4+deb10u1', '1.2.3-4+deb10u2'),
+        ('0~', '0'),
+        ('0~git1-1', '0-1'),
+        ('1:0~a', '1:0'),
+        ('1.0-0~1', '1.0-0'),
+        ('1:1.0', '2:1.0'),
+    ]
+
+    equal = [
+        ('1.0', '1.0'),
+        ('1.0', '0:1.0'),
+        ('1.0', '1.0-0'),
+        ('1.01', '1.1'),
+        ('0', '0-0'),
+        ('1:0', '1:0-0'),
+    ]
+
+    def test_ordering(self):
+        for lower, higher in self.ordered:
+            self.assertEqual(debversion.compare(lower, higher), -1,
+                             '%s < %s' % (lower, higher))
+            self.assertEqual(debversion.compare(higher, lower), 1,
+                             '%s > %s' % (higher, lower))
+
+    def test_equal(self):
+        for version_a, version_b in self.equal:
+            self.assertEqual(debversion.compare(version_a, version_b), 0,
+                             '%s == %s' % (version_a, version_b))
+
+    def test_parse(self):
+        self.assertEqual(debversion.parse('1:2.3-4-5'), (1, '2.3-4', '5'))
+        self.assertEqual(debversion.parse('2.3'), (0, '2.3', ''))
+        self.assertRaises(ValueError, debversion.parse, 'a:1.0')
+
+    def test_newest(self):
+        self.assertEqual(
+            debversion.newest(['1.0', '1:0.1', '1.0~rc1', '2.0']), '1:0.1'
+        )
+        self.assertIsNone(debversion.newest([]))
@@ -0,0 +1,32 @@
+import unittest
+
+from plugins.patching.distro.deb import depgraph
+
+
+class TestDependencyGraph(unittest.TestCase):
+
+    def test_relation_names(self):
+        self.assertEqual(
+            depgraph.relation_names(
+                'libc6 (>= 2.14), python3:any, libfoo | libbar'
+            ),
+            ['libc6', 'python3', 'libfoo', 'libbar']
+        )
+
+    def test_closures(self):
+        graph = depgraph.DependencyGraph({
+            'app': 'liba (>= 1), libc6',
+            'liba': 'libb',
+            'libb': 'liba, libc',
+            'libc': '',
+            'other': 'app'
+        })
+
+        closures = graph.closures()
+
+        self.assertEqual(closures['app'], set(['liba', 'libb', 'libc']))
+        self.assertEqual(closures['liba'], set(['libb', 'libc']))
+        self.assertEqual(closures['libb'], set(['liba', 'libc']))
+        self.assertEqual(closures['libc'], set())
+        self.assertEqual(closures['other'],
+                         set(['app', 'liba', 'libb', 'libc']))
@@ -0,0 +1,250 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import unittest
+import threading
+import BaseHTTPServer
+
+from src.utils import downloader, mirrors, packagecache
+
+_ETAG = '"v1"'
+
+
+class _FileServer():
+    """Serves files from memory on localhost, with byte ranges."""
+
+    def __init__(self, files):
+        """
+        Args:
+            files: {path: data}
+        """
+
+        self.files = files
+
+        # (path, headers) of every request.
+        self.requests = []
+
+        server = self
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                server._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), Handler)
+
+        thread = threading.Thread(target=self._httpd.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def uri(self, path):
+        return 'http://127.0.0.1:{0}{1}'.format(
+            self._httpd.server_port, path
+        )
+
+    def _handle(self, handler):
+        self.requests.append((handler.path, dict(handler.headers)))
+
+        data = self.files.get(handler.path)
+
+        if data is None:
+            handler.send_error(404)
+            return
+
+        start = 0
+        byte_range = handler.headers.get('range')
+
+        if byte_range and handler.headers.get('if-range', _ETAG) == _ETAG:
+            start = int(byte_range.split('=')[1].split('-')[0])
+
+        handler.send_response(206 if start else 200)
+        handler.send_header('ETag', _ETAG)
+        handler.send_header('Content-Length', str(len(data) - start))
+
+        if start:
+            handler.send_header('Content-Range', 'bytes {0}-{1}/{2}'.format(
+                start, len(data) - 1, len(data)
+            ))
+
+        handler.end_headers()
+        handler.wfile.write(data[start:])
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class TestDownloader(unittest.TestCase):
+
+    data = ''.join(chr(i % 251) for i in range(300000))
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.download_dir = os.path.join(self.work_dir, 'downloads')
+        os.mkdir(self.download_dir)
+
+        self.server = _FileServer({
+            '/pool/foo.deb': self.data,
+            '/pool/bar.deb': self.data[::-1]
+        })
+
+        self.downloader = downloader.Downloader(
+            workers=2, retries=1,
+            partial_dir=os.path.join(self.work_dir, 'partial'),
+            cache=packagecache.PackageCache(
+                os.path.join(self.work_dir, 'cache'), quota=0
+            )
+        )
+
+        # No session, so nothing gets probed.
+        self.downloader.mirrors = mirrors.MirrorStats(
+            os.path.join(self.work_dir, 'mirror_stats')
+        )
+
+    def tearDown(self):
+        self.server.close()
+        shutil.rmtree(self.work_dir)
+
+    def _read(self, path):
+        with open(path, 'rb') as _file:
+            return _file.read()
+
+    def test_fetch_all(self):
+        jobs = [
+            downloader.DownloadJob(
+                [self.server.uri('/pool/foo.deb')], self.download_dir,
+                len(self.data), ''
+            ),
+            downloader.DownloadJob(
+                [self.server.uri('/pool/missing.deb')], self.download_dir,
+                None, ''
+            ),
+            downloader.DownloadJob(
+                [self.server.uri('/pool/bar.deb')], self.download_dir,
+                len(self.data), ''
+            )
+        ]
+
+        paths = self.downloader.fetch_all(jobs)
+
+        self.assertEqual(paths, [
+            os.path.join(self.download_dir, 'foo.deb'),
+            None,
+            os.path.join(self.download_dir, 'bar.deb')
+        ])
+        self.assertEqual(self._read(paths[0]), self.data)
+        self.assertEqual(self._read(paths[2]), self.data[::-1])
+
+    def test_resume_partial(self):
+        uri = self.server.uri('/pool/foo.deb')
+        download_path = os.path.join(self.download_dir, 'foo.deb')
+
+        # Left by an interrupted download, of this same file.
+        partial = downloader.PartialDownload(
+            'foo.deb', len(self.data), self.downloader.partial_dir
+        )
+
+        with open(partial.part_path, 'wb') as _file:
+            _file.write(self.data[:100000])
+
+        with open(partial.sidecar_path, 'w') as _file:
+            json.dump({'uri': uri, 'etag': _ETAG}, _file)
+
+        self.assertTrue(
+            self.downloader.download(uri, download_path, len(self.data))
+        )
+
+        _, headers = self.server.requests[-1]
+        self.assertEqual(headers['range'], 'bytes=100000-')
+        self.assertEqual(headers['if-range'], _ETAG)
+
+        self.assertEqual(self._read(download_path), self.data)
+        self.assertFalse(os.path.exists(partial.part_path))
+        self.assertFalse(os.path.exists(partial.sidecar_path))
+
+    def test_hash_mismatch_tries_next_mirror(self):
+        corrupt = self.data[:-1] + 'x'
+        bad_server = _FileServer({'/pool/foo.deb': corrupt})
+
+        try:
+            bad_uri = bad_server.uri('/pool/foo.deb')
+            job = downloader.DownloadJob(
+                [bad_uri, self.server.uri('/pool/foo.deb')],
+                self.download_dir, len(self.data),
+                hashlib.sha256(self.data).hexdigest()
+            )
+
+            path, = self.downloader.fetch_all([job])
+
+        finally:
+            bad_server.close()
+
+        self.assertEqual(len(bad_server.requests), 1)
+        self.assertEqual(self._read(path), self.data)
+        self.assertEqual(os.listdir(self.downloader.partial_dir), [])
+        self.assertEqual(
+            self.downloader.mirrors.get(mirrors.host_of(bad_uri))
+            [mirrors.StatKey.Failures], 1
+        )
+
+    def test_shared_file(self):
+        other_dir = os.path.join(self.work_dir, 'other')
+        os.mkdir(other_dir)
+
+        uri = self.server.uri('/pool/foo.deb')
+        file_hash = hashlib.sha256(self.data).hexdigest()
+
+        # A dependency of two apps, downloaded into each app's directory.
+        jobs = [
+            downloader.DownloadJob([uri], self.download_dir,
+                                   len(self.data), file_hash),
+            downloader.DownloadJob([uri], other_dir,
+                                   len(self.data), file_hash),
+            downloader.DownloadJob([uri], self.download_dir,
+                                   len(self.data), file_hash)
+        ]
+
+        paths = self.downloader.fetch_all(jobs)
+
+        self.assertEqual(paths, [
+            os.path.join(self.download_dir, 'foo.deb'),
+            os.path.join(other_dir, 'foo.deb'),
+            os.path.join(self.download_dir, 'foo.deb')
+        ])
+        for path in paths:
+            self.assertEqual(self._read(path), self.data)
+
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_concurrent_downloads_of_a_file(self):
+        uri = self.server.uri('/pool/foo.deb')
+        file_hash = hashlib.sha256(self.data).hexdigest()
+        results = []
+
+        def download(download_dir):
+            results.append(self.downloader.download(
+                uri, os.path.join(download_dir, 'foo.deb'),
+                len(self.data), file_hash
+            ))
+
+        threads = []
+        for i in range(4):
+            download_dir = os.path.join(self.work_dir, str(i))
+            os.mkdir(download_dir)
+
+            threads.append(
+                threading.Thread(target=download, args=(download_dir,))
+            )
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # retries=1, so none of them could recover from a clash.
+        self.assertEqual(results, [True] * 4)
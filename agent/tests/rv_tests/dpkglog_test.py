@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from plugins.patching.distro.deb import dpkglog
+
+
+class TestDpkgLog(unittest.TestCase):
+
+    old_lines = (
+        "2014-03-10 11:00:00 install old:amd64 <none> 1.0\n"
+    )
+
+    new_lines = (
+        "2014-03-10 12:00:00 startup archives unpack\n"
+        "2014-03-10 12:00:01 upgrade libfoo1:amd64 1.0-1 1.1-1\n"
+        "2014-03-10 12:00:01 status half-installed libfoo1:amd64 1.0-1\n"
+        "2014-03-10 12:00:02 install newdep:all <none> 0.5\n"
+        "2014-03-10 12:00:03 remove bar:amd64 2.0 <none>\n"
+        "2014-03-10 12:00:04 purge bar:amd64 <none> <none>\n"
+        "2014-03-10 12:00:05 status installed libfoo1:amd64 1.1-1\n"
+    )
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.work_dir, 'dpkg.log')
+
+        with open(self.log_file, 'w') as _file:
+            _file.write(self.old_lines)
+
+        self.log = dpkglog.DpkgLog(self.log_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def _append(self, lines):
+        with open(self.log_file, 'a') as _file:
+            _file.write(lines)
+
+    def test_changes_since_mark(self):
+        mark = self.log.mark()
+        self._append(self.new_lines)
+
+        added, removed = self.log.changes_since(mark)
+
+        self.assertEqual(added, [('libfoo1', '1.1-1'), ('newdep', '0.5')])
+        self.assertEqual(removed, [('bar', '2.0'), ('libfoo1', '1.0-1')])
+
+    def test_rotated_log(self):
+        mark = self.log.mark()
+
+        os.rename(self.log_file, self.log_file + '.1')
+        with open(self.log_file, 'w') as _file:
+            _file.write(self.new_lines)
+
+        added, _ = self.log.changes_since(mark)
+
+        self.assertEqual(added, [('libfoo1', '1.1-1'), ('newdep', '0.5')])
+
+    def test_lost_log(self):
+        mark = self.log.mark()
+        os.remove(self.log_file)
+
+        self.assertIsNone(self.log.changes_since(mark))
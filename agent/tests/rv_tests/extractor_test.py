@@ -0,0 +1,78 @@
+import os
+import shutil
+import tarfile
+import zipfile
+import tempfile
+import unittest
+
+from StringIO import StringIO
+
+from src.utils import extractor
+
+
+class TestExtractor(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.extractor = extractor.Extractor(max_size=1, max_files=100)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def _tar(self, name, members, mode='w:gz'):
+        """members: [(name, data)], data None for a symlink to 'target'."""
+
+        path = os.path.join(self.work_dir, name)
+        tar = tarfile.open(path, mode)
+
+        for member_name, data in members:
+            info = tarfile.TarInfo(member_name)
+
+            if data is None:
+                info.type = tarfile.SYMTYPE
+                info.linkname = '../../target'
+                tar.addfile(info)
+            else:
+                info.size = len(data)
+                tar.addfile(info, StringIO(data))
+
+        tar.close()
+
+        return path
+
+    def test_nested_archives(self):
+        inner = self._tar('inner.tar', [('pkg/foo.deb', 'foo')], 'w')
+
+        zip_path = os.path.join(self.work_dir, 'outer.zip')
+        with zipfile.ZipFile(zip_path, 'w') as zip_file:
+            zip_file.write(inner, 'inner.tar')
+            zip_file.writestr('bar.deb', 'bar')
+        os.remove(inner)
+
+        self.extractor.extract_all(self.work_dir)
+
+        self.assertEqual(
+            sorted(os.listdir(self.work_dir)), ['bar.deb', 'pkg']
+        )
+        with open(os.path.join(self.work_dir, 'pkg', 'foo.deb')) as _file:
+            self.assertEqual(_file.read(), 'foo')
+
+        self.assertEqual(self.extractor.archives, 2)
+
+    def test_refuses_paths_outside(self):
+        for members in ([('../evil', 'x')], [('/tmp/evil', 'x')],
+                        [('dir/link', None)]):
+            path = self._tar('evil.tar.gz', members)
+
+            self.assertRaises(
+                extractor.ExtractionError,
+                self.extractor.extract, path, self.work_dir
+            )
+
+    def test_size_limit(self):
+        path = self._tar('big.tar.gz', [('big', '\0' * 1000001)])
+
+        self.assertRaises(
+            extractor.ExtractionError,
+            self.extractor.extract, path, self.work_dir
+        )
@@ -0,0 +1,60 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from plugins.patching.indexfreshness import IndexFreshness
+from plugins.patching.operationhandler.debhandler import DebianHandler
+
+
+class TestIndexFreshness(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+        # The apt directories, under work_dir.
+        self.lists_dir = self._path('/var/lib/apt/lists')
+        os.makedirs(os.path.join(self.lists_dir, 'partial'))
+
+        self.stamps = [
+            self._path(path) for path in DebianHandler.APT_UPDATE_STAMPS
+        ]
+
+        # Last successful update, a day ago.
+        for stamp in self.stamps:
+            os.makedirs(os.path.dirname(stamp))
+            open(stamp, 'w').close()
+            os.utime(stamp, (time.time() - 86400, time.time() - 86400))
+
+        self.freshness = IndexFreshness(
+            'apt', self.lists_dir, self.stamps, window=3600,
+            state_file=os.path.join(self.work_dir, 'state')
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def _path(self, path):
+        return os.path.join(self.work_dir, path.lstrip('/'))
+
+    def test_failed_refresh_is_not_fresh(self):
+        calls = []
+
+        def failed_update():
+            calls.append(None)
+            # As a failed 'apt-get update' does.
+            os.utime(os.path.join(self.lists_dir, 'partial'), None)
+            return False
+
+        self.assertTrue(self.freshness.refresh(failed_update))
+        self.assertFalse(self.freshness.is_fresh())
+
+        # Retried right away.
+        self.assertTrue(self.freshness.refresh(failed_update))
+        self.assertEqual(len(calls), 2)
+
+    def test_successful_refresh_is_fresh(self):
+        self.assertTrue(self.freshness.refresh(lambda: True))
+        self.assertTrue(self.freshness.is_fresh())
+        self.assertFalse(self.freshness.refresh(lambda: True))
@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from plugins.patching.distro.deb import installdates
+
+
+class TestInstallDateIndex(unittest.TestCase):
+
+    # (file name, mtime)
+    info_files = [
+        ('bash.list', 1000),
+        ('bash.md5sums', 5000),
+        ('libc6:amd64.list', 2000),
+        ('libc6:i386.list', 3000),
+        ('zlib1g:i386.list', 4000),
+        ('conffiles-only.conffiles', 6000),
+    ]
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.info_dir = os.path.join(self.work_dir, 'info')
+        os.mkdir(self.info_dir)
+
+        for file_name, mtime in self.info_files:
+            self._add(file_name, mtime)
+
+        self.scandir = installdates.scandir
+        self.index = installdates.InstallDateIndex(self.info_dir)
+
+    def tearDown(self):
+        installdates.scandir = self.scandir
+
+        shutil.rmtree(self.work_dir)
+
+    def _add(self, file_name, mtime):
+        path = os.path.join(self.info_dir, file_name)
+        open(path, 'w').close()
+        os.utime(path, (mtime, mtime))
+
+    def _check_dates(self):
+        # (package name, install date)
+        dates = [
+            ('bash', 1000),
+            # Several architectures, the newest.
+            ('libc6', 3000),
+            # Only a foreign architecture.
+            ('zlib1g', 4000),
+            # No .list file.
+            ('conffiles-only', ''),
+            ('missing', ''),
+        ]
+
+        for name, date in dates:
+            self.assertEqual(self.index.get(name), date)
+
+    def test_get(self):
+        self._check_dates()
+
+    def test_get_without_scandir(self):
+        installdates.scandir = None
+
+        self._check_dates()
+
+    def test_refresh(self):
+        self.assertEqual(self.index.get('new'), '')
+
+        self._add('new:amd64.list', 7000)
+        os.utime(self.info_dir, (8000, 8000))
+
+        self.assertEqual(self.index.get('new'), 7000)
+
+    def test_no_info_dir(self):
+        shutil.rmtree(self.info_dir)
+
+        self.assertEqual(self.index.get('bash'), '')
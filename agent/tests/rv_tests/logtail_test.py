@@ -0,0 +1,180 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from plugins.patching import logtail
+from plugins.patching.distro.deb import deb822, dpkglog, installdates
+from plugins.patching.operationhandler.debhandler import DebianHandler
+
+
+class TestLogTail(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.work_dir, 'package.log')
+
+        self._write(self.log_file, 'old 1\nold 2\n')
+
+        self.tail = logtail.LogTail(self.log_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def _write(self, path, lines, mode='w'):
+        with open(path, mode) as _file:
+            _file.write(lines)
+
+    def test_appended(self):
+        mark = self.tail.mark()
+        self._write(self.log_file, 'new 1\nnew 2\n', 'a')
+
+        self.assertEqual(self.tail.lines_since(mark), ['new 1', 'new 2'])
+
+    def test_rotated(self):
+        mark = self.tail.mark()
+        self._write(self.log_file, 'new 1\n', 'a')
+
+        os.rename(self.log_file, self.log_file + '.1')
+        self._write(self.log_file, 'new 2\n')
+
+        self.assertEqual(self.tail.lines_since(mark), ['new 1', 'new 2'])
+
+    def test_rotated_out_of_reach(self):
+        mark = self.tail.mark()
+
+        # Rotated twice, the marked file is now package.log.2.
+        os.rename(self.log_file, self.log_file + '.2')
+        self._write(self.log_file + '.1', 'new 1\n')
+        self._write(self.log_file, 'new 2\n')
+
+        self.assertIsNone(self.tail.lines_since(mark))
+
+    def test_truncated(self):
+        mark = self.tail.mark()
+
+        # copytruncate: same inode, shorter than the mark.
+        self._write(self.log_file, 'new\n')
+
+        self.assertIsNone(self.tail.lines_since(mark))
+
+    def test_no_log(self):
+        os.remove(self.log_file)
+
+        self.assertIsNone(self.tail.mark())
+        self.assertIsNone(self.tail.lines_since(None))
+
+    def test_diff_versions(self):
+        old = {'bash': set(['4.2']), 'foo': set(['1.0']),
+               'kernel': set(['3.10-1', '3.10-2'])}
+        new = {'bash': set(['4.3']), 'bar': set(['2.0']),
+               'kernel': set(['3.10-2', '3.10-3'])}
+
+        self.assertEqual(
+            logtail.diff_versions(old, new),
+            ([('bar', '2.0'), ('bash', '4.3'), ('kernel', '3.10-3')],
+             [('bash', '4.2'), ('foo', '1.0'), ('kernel', '3.10-1')])
+        )
+        self.assertEqual(logtail.diff_versions(old, old), ([], []))
+
+
+_status = """\
+Package: bash
+Status: install ok installed
+Version: {bash}
+
+Package: foo
+Status: install ok installed
+Version: 1.0
+
+"""
+
+_new_package = """\
+Package: bar
+Status: install ok installed
+Version: 2.0
+
+"""
+
+
+class _LocalDebianHandler(DebianHandler):
+    """Reads its dpkg status, log and info dir from work_dir."""
+
+    def __init__(self, work_dir):
+        self._status_cache = deb822.StatusFileCache(
+            os.path.join(work_dir, 'status')
+        )
+        self._dpkg_log = dpkglog.DpkgLog(os.path.join(work_dir, 'dpkg.log'))
+        self._install_dates = installdates.InstallDateIndex(work_dir)
+
+
+class TestRotatedDpkgLog(unittest.TestCase):
+    """The dpkg log is lost during an install, inventories are compared."""
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.status_file = os.path.join(self.work_dir, 'status')
+        self.log_file = os.path.join(self.work_dir, 'dpkg.log')
+
+        with open(self.status_file, 'w') as _file:
+            _file.write(_status.format(bash='4.2'))
+
+        with open(self.log_file, 'w') as _file:
+            _file.write('2014-03-10 11:00:00 startup archives unpack\n')
+
+        self.handler = _LocalDebianHandler(self.work_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def _install(self):
+        # dpkg replaces the status file.
+        new_status = self.status_file + '-new'
+        with open(new_status, 'w') as _file:
+            _file.write(_status.format(bash='4.3') + _new_package)
+
+        os.rename(new_status, self.status_file)
+
+    def _changes(self, inventory_mark):
+        apps_to_add, apps_to_delete = \
+            self.handler._get_apps_to_add_and_delete(inventory_mark)
+
+        return (
+            sorted((app['name'], app['version']) for app in apps_to_add),
+            sorted((app['name'], app['version']) for app in apps_to_delete)
+        )
+
+    def test_truncated(self):
+        inventory_mark = self.handler._get_inventory_mark()
+
+        self._install()
+        open(self.log_file, 'w').close()
+
+        self.assertEqual(
+            self._changes(inventory_mark),
+            ([('bar', '2.0'), ('bash', '4.3')], [('bash', '4.2')])
+        )
+
+    def test_rotated_out_of_reach(self):
+        inventory_mark = self.handler._get_inventory_mark()
+
+        self._install()
+        os.rename(self.log_file, self.log_file + '.2')
+        open(self.log_file + '.1', 'w').close()
+        open(self.log_file, 'w').close()
+
+        self.assertEqual(
+            self._changes(inventory_mark),
+            ([('bar', '2.0'), ('bash', '4.3')], [('bash', '4.2')])
+        )
+
+    def test_no_log(self):
+        os.remove(self.log_file)
+
+        inventory_mark = self.handler._get_inventory_mark()
+        self._install()
+
+        self.assertEqual(
+            self._changes(inventory_mark),
+            ([('bar', '2.0'), ('bash', '4.3')], [('bash', '4.2')])
+        )
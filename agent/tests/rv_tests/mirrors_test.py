@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.utils import mirrors
+
+
+class TestMirrorStats(unittest.TestCase):
+
+    uris = [
+        'http://slow.example.com/pool/foo.deb',
+        'http://dead.example.com/pool/foo.deb',
+        'http://fast.example.com/pool/foo.deb',
+        'http://new.example.com/pool/foo.deb'
+    ]
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.stats_file = os.path.join(self.work_dir, 'stats')
+
+        # No session, so nothing gets probed.
+        self.stats = mirrors.MirrorStats(self.stats_file)
+
+        self.stats.record_latency('slow.example.com', 0.5)
+        self.stats.record_transfer('slow.example.com', 1000000, 10)
+        self.stats.record_latency('fast.example.com', 0.1)
+        self.stats.record_transfer('fast.example.com', 1000000, 1)
+
+        for _ in range(3):
+            self.stats.record_failure('dead.example.com')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_rank(self):
+        self.assertEqual(
+            [mirrors.host_of(uri) for uri in self.stats.rank(self.uris)],
+            ['fast.example.com', 'slow.example.com', 'new.example.com',
+             'dead.example.com']
+        )
+
+    def test_stats_persist(self):
+        self.stats.save()
+
+        stats = mirrors.MirrorStats(self.stats_file)
+
+        self.assertFalse(stats.healthy('dead.example.com'))
+        self.assertAlmostEqual(
+            stats.expected_seconds('fast.example.com', 1000000), 1.1
+        )
+
+        stats.record_transfer('dead.example.com', 1000, 1)
+        self.assertTrue(stats.healthy('dead.example.com'))
@@ -0,0 +1,170 @@
+import os
+import imp
+import sys
+import shutil
+import datetime
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from src.utils import settings
+from src.data.sqlitemanager import SqliteManager
+from src.data.operationhistory import OperationHistory, OperationStatus
+from src.serveroperation.sofoperation import SofOperation
+
+
+_vfadmin = imp.load_source(
+    'vfadmin',
+    os.path.join(os.path.dirname(__file__), '..', '..', 'bin', 'vfadmin.py')
+)
+
+
+class _Args():
+
+    def __init__(self, **kwargs):
+        self.type = None
+        self.since = None
+        self.until = None
+        self.status = None
+        self.min_latency = None
+        self.limit = 50
+        self.count = False
+
+        self.__dict__.update(kwargs)
+
+
+def _operation(operation_id, operation_type):
+    operation = SofOperation()
+    operation.id = operation_id
+    operation.type = operation_type
+    operation.raw_operation = '{}'
+
+    return operation
+
+
+class TestOperationHistory(unittest.TestCase):
+
+    now = datetime.datetime(2014, 3, 10, 12, 0, 0)
+
+    # (operation_id, operation_type, received days ago, seconds to send)
+    seed = [
+        ('install-old', 'install_os_apps', 10, 30),
+        ('install-slow', 'install_os_apps', 2, 900),
+        ('install-unsent', 'install_os_apps', 1, None),
+        ('reboot', 'reboot', 1.5, 5),
+    ]
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+        self.agent_db = settings.AgentDb
+        settings.AgentDb = os.path.join(self.work_dir, 'agent.adb')
+
+        manager = SqliteManager()
+
+        for operation_id, operation_type, days_ago, to_send in self.seed:
+            received = self.now - datetime.timedelta(days_ago)
+
+            manager.add_operation(
+                _operation(operation_id, operation_type), str(received)
+            )
+
+            if to_send is not None:
+                manager.mark_result_sent(
+                    operation_id,
+                    received + datetime.timedelta(seconds=to_send)
+                )
+
+        manager.flush()
+
+        self.history = OperationHistory(db_path=settings.AgentDb)
+
+    def tearDown(self):
+        settings.AgentDb = self.agent_db
+
+        shutil.rmtree(self.work_dir)
+
+    def _ids(self, **filters):
+        return [row['operation_id'] for row in self.history.query(**filters)]
+
+    def test_query(self):
+        rows = self.history.query()
+
+        self.assertEqual(
+            [row['operation_id'] for row in rows],
+            ['install-unsent', 'reboot', 'install-slow', 'install-old']
+        )
+
+        self.assertEqual(rows[0]['status'], OperationStatus.Unsent)
+        self.assertEqual(rows[0]['latency'], None)
+        self.assertEqual(rows[0]['sent'], '')
+
+        self.assertEqual(rows[2]['status'], OperationStatus.Sent)
+        self.assertEqual(rows[2]['latency'], 900.0)
+        self.assertEqual(rows[2]['received'], '2014-03-08 12:00:00')
+        self.assertEqual(rows[2]['sent'], '2014-03-08 12:15:00')
+
+    def test_filters(self):
+        since = self.now - datetime.timedelta(3)
+
+        # (filters, operation ids)
+        cases = [
+            ({'operation_type': 'reboot'}, ['reboot']),
+            ({'since': since},
+             ['install-unsent', 'reboot', 'install-slow']),
+            ({'until': since}, ['install-old']),
+            ({'status': OperationStatus.Unsent}, ['install-unsent']),
+            ({'status': OperationStatus.Sent},
+             ['reboot', 'install-slow', 'install-old']),
+            ({'min_latency': 60}, ['install-slow']),
+            ({'operation_type': 'install_os_apps', 'since': since,
+              'status': OperationStatus.Sent}, ['install-slow']),
+            ({'limit': 2}, ['install-unsent', 'reboot']),
+        ]
+
+        for filters, operation_ids in cases:
+            self.assertEqual(self._ids(**filters), operation_ids)
+
+            filters.pop('limit', None)
+            self.assertEqual(
+                self.history.count(**filters),
+                len(self._ids(**filters))
+            )
+
+        self.assertEqual(self.history.count(), 4)
+        self.assertEqual(self.history.count_unsent(), 1)
+
+        self.assertRaises(ValueError, self.history.query, status='lost')
+
+    def test_vfadmin_history(self):
+        self.assertEqual(
+            _vfadmin._history_line(self.history.query(limit=1)[0]),
+            '2014-03-09 12:00:00         install_os_apps           unsent  '
+            '       -  install-unsent'
+        )
+
+        self.assertEqual(
+            _vfadmin._history_line(
+                self.history.query(operation_type='reboot')[0]
+            ),
+            '2014-03-09 00:00:00         reboot                    sent    '
+            '    5.0s  reboot'
+        )
+
+        agent_db = _vfadmin._agent_db
+        _vfadmin._agent_db = settings.AgentDb
+        stdout = sys.stdout
+
+        try:
+            sys.stdout = StringIO()
+            _vfadmin.operation_history(_Args(status='sent', min_latency=60))
+            _vfadmin.operation_history(_Args(count=True))
+            output = sys.stdout.getvalue().splitlines()
+
+        finally:
+            sys.stdout = stdout
+            _vfadmin._agent_db = agent_db
+
+        self.assertEqual(len(output), 3)
+        self.assertTrue(output[0].endswith('install-slow'))
+        self.assertEqual(output[1:], ['1 operation(s).', '4'])
@@ -0,0 +1,58 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from src.utils import packagecache
+
+
+class TestPackageCache(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+        # 1000 bytes
+        self.cache = packagecache.PackageCache(
+            os.path.join(self.work_dir, 'cache'), quota=0.001
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def _file(self, name, size):
+        path = os.path.join(self.work_dir, name)
+
+        with open(path, 'wb') as _file:
+            _file.write('x' * size)
+
+        return path
+
+    def test_get_links_cached_file(self):
+        source = self._file('a.deb', 100)
+        self.cache.put(source, 'AA' * 32, 100)
+
+        destination = os.path.join(self.work_dir, 'copy.deb')
+
+        self.assertTrue(self.cache.get('aa' * 32, 100, destination))
+        self.assertEqual(os.path.getsize(destination), 100)
+
+        self.assertFalse(self.cache.get('aa' * 32, 101, destination))
+        self.assertFalse(self.cache.get('', 100, destination))
+
+    def test_evicts_least_recently_used(self):
+        destination = os.path.join(self.work_dir, 'copy.deb')
+
+        self.cache.put(self._file('a.deb', 400), 'aa' * 32, 400)
+        self.cache.put(self._file('b.deb', 400), 'bb' * 32, 400)
+
+        # Make 'bb' the oldest by using 'aa' a moment later.
+        old = time.time() - 60
+        os.utime(self.cache._path('bb' * 32, 400), (old, old))
+        self.assertTrue(self.cache.get('aa' * 32, 400, destination))
+
+        self.cache.put(self._file('c.deb', 400), 'cc' * 32, 400)
+
+        self.assertTrue(self.cache.get('aa' * 32, 400, destination))
+        self.assertTrue(self.cache.get('cc' * 32, 400, destination))
+        self.assertFalse(self.cache.get('bb' * 32, 400, destination))
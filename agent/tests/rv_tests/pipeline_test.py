@@ -0,0 +1,52 @@
+import time
+import threading
+import unittest
+
+from plugins.patching.pipeline import InstallPipeline
+
+
+class TestInstallPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.downloaded = []
+        self.lock = threading.Lock()
+
+    def _download(self, item, cancel):
+        with self.lock:
+            self.downloaded.append(item)
+
+    def test_order_and_look_ahead(self):
+        pipeline = InstallPipeline(range(10), self._download, look_ahead=2)
+
+        installed = []
+
+        try:
+            for item in pipeline:
+                # Give the thread time to run as far ahead as it may.
+                time.sleep(0.02)
+
+                with self.lock:
+                    self.assertTrue(len(self.downloaded) <= item + 3)
+
+                installed.append(item)
+
+        finally:
+            pipeline.cancel()
+
+        self.assertEqual(installed, range(10))
+
+    def test_cancel_stops_downloads(self):
+        pipeline = InstallPipeline(range(10), self._download, look_ahead=1)
+
+        try:
+            for item in pipeline:
+                time.sleep(0.02)
+                raise RuntimeError('install failed')
+
+        except RuntimeError:
+            pass
+
+        finally:
+            pipeline.cancel()
+
+        self.assertEqual(self.downloaded, [0, 1])
@@ -0,0 +1,137 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+
+from src.utils import settings, downloader, packagecache
+from plugins.patching.prefetcher import Prefetcher
+from plugins.patching.data.application import Application
+from plugins.patching.patchingsofoperation import PatchingOperationKey
+
+
+def _app(*files):
+    """files: (name, size, file_hash)"""
+
+    app = Application()
+    app.file_data = [
+        {
+            PatchingOperationKey.FileUri: 'http://example.com/' + name,
+            PatchingOperationKey.FileSize: size,
+            PatchingOperationKey.FileHash: file_hash
+        }
+        for name, size, file_hash in files
+    ]
+
+    return app
+
+
+class _SlowDownloader():
+    """Downloads until cancelled, then takes a moment to stop."""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.started = threading.Event()
+        self.stopped = threading.Event()
+
+    def set_rate(self, rate):
+        pass
+
+    def fetch_all(self, jobs, cancel=None):
+        self.started.set()
+        cancel.wait(10)
+        time.sleep(0.2)
+        self.stopped.set()
+
+        return [None] * len(jobs)
+
+
+class TestPrefetcher(unittest.TestCase):
+
+    sha256 = 'a' * 64
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+        self.settings = (settings.PrefetchQuota, settings.PrefetchSchedule,
+                         settings.PrefetchDirectory)
+
+        # 1000 bytes
+        settings.PrefetchQuota = 0.001
+        settings.PrefetchSchedule = '00:00-24:00=0'
+        settings.PrefetchDirectory = os.path.join(self.work_dir, 'prefetch')
+
+        self.cache = packagecache.PackageCache(
+            os.path.join(self.work_dir, 'cache'), quota=1
+        )
+
+        self.prefetcher = Prefetcher(downloader.Downloader(
+            partial_dir=os.path.join(self.work_dir, 'partial'),
+            cache=self.cache
+        ))
+
+    def tearDown(self):
+        (settings.PrefetchQuota, settings.PrefetchSchedule,
+         settings.PrefetchDirectory) = self.settings
+
+        shutil.rmtree(self.work_dir)
+
+    def test_set_updates(self):
+        self.prefetcher.set_updates([
+            _app(('a.deb', '600', self.sha256),
+                 ('no-hash.deb', '100', ''),
+                 ('unknown-hash.deb', '100', 'abc'),
+                 ('bad-size.deb', '1 KB', self.sha256),
+                 ('no-size.deb', None, self.sha256)),
+            _app(('b.deb', '300', self.sha256),
+                 ('over-quota.deb', '500', self.sha256),
+                 ('c.deb', '100', self.sha256))
+        ])
+
+        self.assertEqual(
+            [job.uris[0] for job in self.prefetcher._pending_jobs()],
+            ['http://example.com/a.deb', 'http://example.com/b.deb',
+             'http://example.com/c.deb']
+        )
+
+        # Replaced, not added to.
+        self.prefetcher.set_updates([])
+        self.assertEqual(self.prefetcher._pending_jobs(), [])
+
+    def test_cached_files_not_in_quota(self):
+        cached_hash = 'b' * 64
+        cached_file = os.path.join(self.work_dir, 'cached.deb')
+
+        with open(cached_file, 'w') as _file:
+            _file.write('x' * 900)
+
+        self.cache.put(cached_file, cached_hash, 900)
+
+        self.prefetcher.set_updates([
+            _app(('cached.deb', '900', cached_hash),
+                 ('a.deb', '600', self.sha256))
+        ])
+
+        self.assertEqual(
+            [job.uris[0] for job in self.prefetcher._pending_jobs()],
+            ['http://example.com/a.deb']
+        )
+
+    def test_pause_waits_for_run(self):
+        slow_downloader = _SlowDownloader(self.cache)
+        prefetcher = Prefetcher(slow_downloader)
+        prefetcher.set_updates([_app(('a.deb', '600', self.sha256))])
+
+        run = threading.Thread(target=prefetcher.run)
+        run.start()
+
+        try:
+            self.assertTrue(slow_downloader.started.wait(10))
+
+            self.assertTrue(prefetcher.pause())
+            self.assertTrue(slow_downloader.stopped.is_set())
+
+        finally:
+            prefetcher.resume()
+            run.join()
@@ -0,0 +1,170 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+import requests
+
+from src.utils import settings
+from plugins.patching.distro.deb import releasedates
+
+
+_last_modified = 'Tue, 15 Nov 1994 08:12:31 GMT'
+
+
+class _Response():
+
+    def __init__(self, status_code, headers):
+        self.status_code = status_code
+        self.headers = headers
+        self.closed = False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(str(self.status_code))
+
+    def close(self):
+        self.closed = True
+
+
+class _Requests():
+    """Stands in for the requests module, answers from responses.
+
+    responses: {(method, uri): (status_code, headers)}
+    """
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+        self.gets = []
+
+    def _request(self, method, uri):
+        self.requests.append((method, uri))
+
+        if (method, uri) not in self.responses:
+            raise requests.ConnectionError(uri)
+
+        status_code, headers = self.responses[(method, uri)]
+
+        return _Response(status_code, headers)
+
+    def head(self, uri, timeout=None, allow_redirects=False):
+        return self._request('HEAD', uri)
+
+    def get(self, uri, timeout=None, stream=False):
+        response = self._request('GET', uri)
+        self.gets.append(response)
+
+        return response
+
+
+class TestReleaseDateFetcher(unittest.TestCase):
+
+    uri = 'http://archive.ubuntu.com/ubuntu/pool/main/b/bash/bash.deb'
+    sha256 = 'a' * 64
+
+    release_date = datetime(1994, 11, 15, 8, 12, 31).strftime(
+        settings.DATE_FORMAT
+    )
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.work_dir, 'releasedates.json')
+
+    def tearDown(self):
+        releasedates.requests = requests
+
+        shutil.rmtree(self.work_dir)
+
+    def _fetcher(self, responses):
+        releasedates.requests = _Requests(responses)
+
+        return releasedates.ReleaseDateFetcher(self.cache_file, workers=2)
+
+    def test_cache(self):
+        fetcher = self._fetcher({
+            ('HEAD', self.uri): (200, {'last-modified': _last_modified})
+        })
+
+        self.assertEqual(fetcher.get(self.uri, self.sha256),
+                         self.release_date)
+        self.assertEqual(releasedates.requests.requests,
+                         [('HEAD', self.uri)])
+
+        # Same file, from memory then from disk.
+        self.assertEqual(fetcher.get(self.uri, self.sha256),
+                         self.release_date)
+
+        fetcher = self._fetcher({})
+        self.assertEqual(fetcher.get(self.uri, self.sha256),
+                         self.release_date)
+        self.assertEqual(releasedates.requests.requests, [])
+
+        with open(self.cache_file) as _file:
+            self.assertEqual(
+                json.load(_file),
+                {self.uri + '|' + self.sha256: self.release_date}
+            )
+
+        # Another build at the same uri is a miss.
+        fetcher.get(self.uri, 'b' * 64)
+        self.assertEqual(releasedates.requests.requests,
+                         [('HEAD', self.uri), ('GET', self.uri)])
+
+    def test_prefetch(self):
+        uris = [self.uri + str(i) for i in range(5)]
+
+        responses = dict(
+            (('HEAD', uri), (200, {'last-modified': _last_modified}))
+            for uri in uris
+        )
+        fetcher = self._fetcher(responses)
+
+        fetcher.prefetch([(uri, self.sha256) for uri in uris + ['']])
+
+        self.assertEqual(
+            sorted(releasedates.requests.requests),
+            [('HEAD', uri) for uri in uris]
+        )
+
+        for uri in uris:
+            self.assertEqual(fetcher.get(uri, self.sha256), self.release_date)
+
+        self.assertEqual(len(releasedates.requests.requests), 5)
+
+    def test_last_modified(self):
+        # (last-modified header, release date)
+        headers = [
+            ({'last-modified': _last_modified}, self.release_date),
+            ({'last-modified': '1994-11-15 08:12:31'}, ''),
+            ({}, ''),
+        ]
+
+        for i, (header, release_date) in enumerate(headers):
+            fetcher = self._fetcher({('HEAD', self.uri): (200, header)})
+
+            self.assertEqual(fetcher.get(self.uri, str(i)), release_date)
+
+    def test_head_refused(self):
+        fetcher = self._fetcher({
+            ('HEAD', self.uri): (405, {}),
+            ('GET', self.uri): (200, {'last-modified': _last_modified})
+        })
+
+        self.assertEqual(fetcher.get(self.uri), self.release_date)
+        self.assertEqual(releasedates.requests.requests,
+                         [('HEAD', self.uri), ('GET', self.uri)])
+
+        # The body is never read.
+        self.assertTrue(releasedates.requests.gets[0].closed)
+
+    def test_unreachable(self):
+        fetcher = self._fetcher({('GET', self.uri): (404, {})})
+
+        self.assertEqual(fetcher.get(self.uri), '')
+
+        # Not cached, tried again next time.
+        fetcher.get(self.uri)
+        self.assertEqual(len(releasedates.requests.requests), 4)
@@ -0,0 +1,50 @@
+import unittest
+
+from plugins.patching.distro.redhat import rpmdb
+
+
+class _SlowStream():
+    """Hands out a few bytes per read, records end up split across reads.
+    """
+
+    def __init__(self, data, size=7):
+        self.data = data
+        self.size = size
+
+    def read(self, _):
+        data, self.data = self.data[:self.size], self.data[self.size:]
+        return data
+
+
+def _record(*fields):
+    return rpmdb.FIELD_SEPARATOR.join(fields) + rpmdb.RECORD_SEPARATOR
+
+
+class TestRpmDb(unittest.TestCase):
+
+    output = (
+        _record('bash', '4.2.46-34.el7', '1400000000', '1390000000',
+                '3667773', 'CentOS', 'http://www.gnu.org/software/bash',
+                'The GNU Bourne Again shell.\nIt is compatible.') +
+        _record('gpg-pubkey', 'f4a80eb5-53a7ff4b', '1400000001',
+                '1400000001', '0', '(none)', '(none)', 'gpg(CentOS-7)') +
+        'truncated' + rpmdb.FIELD_SEPARATOR + 'record' +
+        rpmdb.RECORD_SEPARATOR
+    )
+
+    def test_iter_packages(self):
+        packages = list(rpmdb.iter_packages(_SlowStream(self.output)))
+
+        self.assertEqual(len(packages), 2)
+
+        bash, pubkey = packages
+
+        self.assertEqual(bash.name, 'bash')
+        self.assertEqual(bash.version, '4.2.46-34.el7')
+        self.assertEqual(bash.build_time, '1390000000')
+        self.assertEqual(
+            bash.description, 'The GNU Bourne Again shell. It is compatible.'
+        )
+
+        self.assertEqual(pubkey.vendor, '')
+        self.assertEqual(pubkey.url, '')
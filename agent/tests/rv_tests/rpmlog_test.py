@@ -0,0 +1,130 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from plugins.patching.distro.redhat import rpmlog
+
+
+class TestRpmLog(unittest.TestCase):
+
+    dnf_lines = (
+        "2014-03-10T12:00:01Z SUBDEBUG Upgrade: bash-4.3-1.fc20.x86_64\n"
+        "2014-03-10T12:00:02Z SUBDEBUG Installed: newdep-0.5-1.fc20.noarch\n"
+        "2014-03-10T12:00:03Z SUBDEBUG Upgraded: bash-4.2-1.fc20.x86_64\n"
+        "2014-03-10T12:00:04Z SUBDEBUG Erase: bar-2.0-1.fc20.x86_64\n"
+        "2014-03-10T12:00:05Z SUBDEBUG Obsoleted: old-1:1.0-1.fc20.noarch\n"
+        "2014-03-10T12:00:06Z INFO --- logging initialized ---\n"
+    )
+
+    yum_lines = (
+        "Mar 10 12:00:01 Updated: bash-4.3-1.el7.x86_64\n"
+        "Mar 10 12:00:02 Installed: 1:newdep-0.5-1.el7.noarch\n"
+        "Mar 10 12:00:03 Erased: bar\n"
+    )
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.yum_log = rpmlog.YUM_LOG
+
+    def tearDown(self):
+        rpmlog.YUM_LOG = self.yum_log
+        shutil.rmtree(self.work_dir)
+
+    def _log(self, name, lines=''):
+        path = os.path.join(self.work_dir, name)
+
+        with open(path, 'w') as _file:
+            _file.write(lines)
+
+        return path
+
+    def test_parse_nevra(self):
+        nevras = [
+            ('bash-4.3-1.el7.x86_64', ('bash', '4.3-1.el7')),
+            ('1:bash-4.3-1.el7.x86_64', ('bash', '4.3-1.el7')),
+            ('bash-1:4.3-1.fc20.x86_64', ('bash', '4.3-1.fc20')),
+            ('python-libs-2.7.5-90.el7.x86_64',
+             ('python-libs', '2.7.5-90.el7')),
+        ]
+
+        for nevra, parsed in nevras:
+            self.assertEqual(rpmlog.parse_nevra(nevra), parsed)
+
+        self.assertRaises(ValueError, rpmlog.parse_nevra, 'bash')
+
+    def test_net_changes(self):
+        lines = [
+            "Mar 10 12:00:01 Installed: foo-1.0-1.el7.x86_64",
+            "Mar 10 12:00:02 Erased: foo",
+            "Mar 10 12:00:03 Erased: bar",
+            "Mar 10 12:00:04 Installed: bar-1.0-1.el7.x86_64",
+        ]
+
+        # A name-only erase can't cancel an install of a version.
+        self.assertEqual(
+            rpmlog.parse_changes(lines, ('Installed',), ('Erased',),
+                                 ('Erased',)),
+            ([('bar', '1.0-1.el7'), ('foo', '1.0-1.el7')],
+             [('bar', None), ('foo', None)])
+        )
+
+        lines = [
+            "2014-03-10T12:00:01Z SUBDEBUG Install: foo-1.0-1.fc20.x86_64",
+            "2014-03-10T12:00:02Z SUBDEBUG Erase: foo-1.0-1.fc20.x86_64",
+        ]
+
+        self.assertEqual(
+            rpmlog.parse_changes(lines, ('Install',), ('Erase',)), ([], [])
+        )
+
+    def test_dnf_log(self):
+        log = rpmlog.RpmTransactionLog(self._log('dnf.rpm.log'))
+        mark = log.mark()
+
+        with open(log.log_file, 'a') as _file:
+            _file.write(self.dnf_lines)
+
+        self.assertTrue(log.logs_removed_versions())
+        self.assertEqual(
+            log.changes_since(mark),
+            ([('bash', '4.3-1.fc20'), ('newdep', '0.5-1.fc20')],
+             [('bar', '2.0-1.fc20'), ('bash', '4.2-1.fc20'),
+              ('old', '1.0-1.fc20')])
+        )
+
+    def test_yum_log(self):
+        rpmlog.YUM_LOG = self._log('yum.log')
+
+        log = rpmlog.RpmTransactionLog(rpmlog.YUM_LOG)
+        mark = log.mark()
+
+        with open(log.log_file, 'a') as _file:
+            _file.write(self.yum_lines)
+
+        self.assertFalse(log.logs_removed_versions())
+        self.assertEqual(
+            log.changes_since(mark),
+            ([('bash', '4.3-1.el7'), ('newdep', '0.5-1.el7')],
+             [('bar', None)])
+        )
+
+    def test_rotated_log(self):
+        log = rpmlog.RpmTransactionLog(self._log('dnf.rpm.log'))
+        mark = log.mark()
+
+        os.rename(log.log_file, log.log_file + '.1')
+        self._log('dnf.rpm.log', self.dnf_lines)
+
+        added, _ = log.changes_since(mark)
+        self.assertEqual(
+            added, [('bash', '4.3-1.fc20'), ('newdep', '0.5-1.fc20')]
+        )
+
+    def test_truncated_log(self):
+        log = rpmlog.RpmTransactionLog(self._log('dnf.rpm.log', 'x' * 100))
+        mark = log.mark()
+
+        self._log('dnf.rpm.log', self.dnf_lines[:50])
+
+        self.assertIsNone(log.changes_since(mark))
@@ -0,0 +1,124 @@
+import os
+import time
+import shutil
+import sqlite3
+import datetime
+import tempfile
+import unittest
+
+from src.utils import settings
+from src.data.sqlitemanager import SqliteManager, OperationColumn
+from src.serveroperation.sofoperation import SofOperation
+
+
+def _operation(operation_id, operation_type='install_os_apps'):
+    operation = SofOperation()
+    operation.id = operation_id
+    operation.type = operation_type
+    operation.raw_operation = '{"operation_id": "%s"}' % operation_id
+
+    return operation
+
+
+def _now():
+    return str(datetime.datetime.now())
+
+
+class TestSqliteManager(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+        self.settings = (settings.AgentDb, settings.DbBatchSize,
+                         settings.DbBatchMaxAge)
+
+        settings.AgentDb = os.path.join(self.work_dir, 'agent.adb')
+        settings.DbBatchSize = 20
+        settings.DbBatchMaxAge = 60
+
+        self.manager = SqliteManager()
+
+    def tearDown(self):
+        (settings.AgentDb, settings.DbBatchSize,
+         settings.DbBatchMaxAge) = self.settings
+
+        shutil.rmtree(self.work_dir)
+
+    def _rows(self):
+        """Rows as another connection, ex: vfadmin, sees them."""
+
+        connection = sqlite3.connect(settings.AgentDb)
+        connection.row_factory = sqlite3.Row
+
+        try:
+            cursor = connection.cursor()
+            cursor.execute(
+                "SELECT * FROM operations ORDER BY %s" % OperationColumn.Id
+            )
+
+            return cursor.fetchall()
+
+        finally:
+            connection.close()
+
+    def _operation_ids(self):
+        return [row[OperationColumn.OperationId] for row in self._rows()]
+
+    def test_flush(self):
+        self.manager.add_operation(_operation('a'), _now())
+        self.manager.add_operation(_operation('b'), _now())
+
+        self.assertEqual(self._operation_ids(), [])
+
+        self.manager.flush()
+        self.assertEqual(self._operation_ids(), ['a', 'b'])
+
+    def test_batch_max_age(self):
+        settings.DbBatchMaxAge = 0.2
+
+        self.manager.add_operation(_operation('a'), _now())
+        self.assertEqual(self._operation_ids(), [])
+
+        time.sleep(0.3)
+
+        # Written along with the row that finds the batch too old.
+        self.manager.add_operation(_operation('b'), _now())
+        self.assertEqual(self._operation_ids(), ['a', 'b'])
+
+    def test_edit_operation_quotes(self):
+        operation = _operation('a')
+        self.manager.add_operation(operation, _now())
+
+        operation.raw_operation = '{"name": "it\'s \\"quoted\\""}'
+        operation.raw_result = "'; DROP TABLE operations; --"
+        self.manager.edit_operation(operation, True, 'sent "now"')
+
+        rows = self._rows()
+        self.assertEqual(len(rows), 1)
+
+        row = rows[0]
+        self.assertEqual(row[OperationColumn.RawOperation],
+                         operation.raw_operation)
+        self.assertEqual(row[OperationColumn.RawResult], operation.raw_result)
+        self.assertEqual(row[OperationColumn.DateTimeSent], 'sent "now"')
+        self.assertEqual(row[OperationColumn.ResultsSent], 1)
+
+    def test_retention(self):
+        now = datetime.datetime.now()
+        old = str(now - datetime.timedelta(40))
+
+        self.manager.add_operation(_operation('old-sent'), old)
+        self.manager.add_operation(_operation('old-unsent'), old)
+        self.manager.add_operation(_operation('new-sent'), str(now))
+        self.manager.add_operation(_operation('new-unsent'), str(now))
+
+        self.manager.mark_result_sent('old-sent', now)
+        self.manager.mark_result_sent('new-sent', now)
+
+        self.assertEqual(self.manager.apply_retention(30, 100), 1)
+        self.assertEqual(self._operation_ids(),
+                         ['old-unsent', 'new-sent', 'new-unsent'])
+
+        # The row cap spares unsent rows too.
+        self.assertEqual(self.manager.apply_retention(30, 0), 1)
+        self.assertEqual(self._operation_ids(), ['old-unsent', 'new-unsent'])
@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.utils import staging
+
+
+class TestStager(unittest.TestCase):
+
+    file_names = ['a.deb', 'b.deb', 'c.deb']
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+        self.source_dir = os.path.join(self.work_dir, 'source')
+        self.destination_dir = os.path.join(self.work_dir, 'destination')
+        os.mkdir(self.source_dir)
+        os.mkdir(self.destination_dir)
+
+        for file_name in self.file_names:
+            with open(os.path.join(self.source_dir, file_name), 'w') as _file:
+                _file.write(file_name)
+
+        self.stager = staging.Stager()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_stage_dir(self):
+        staged = self.stager.stage_dir(self.source_dir, self.destination_dir)
+
+        self.assertEqual(staged, [
+            os.path.join(self.destination_dir, file_name)
+            for file_name in self.file_names
+        ])
+        self.assertEqual(os.listdir(self.source_dir), [])
+        self.assertEqual(self.stager.stats[staging.LINK][0], 3)
+        self.assertEqual(self.stager.bytes_copied(), 0)
+
+    def test_stage_dir_rolls_back(self):
+        # Can't be replaced by a file, so the last one fails.
+        os.mkdir(os.path.join(self.destination_dir, 'c.deb'))
+
+        self.assertRaises(
+            OSError,
+            self.stager.stage_dir, self.source_dir, self.destination_dir
+        )
+
+        self.assertEqual(os.listdir(self.destination_dir), ['c.deb'])
+        self.assertEqual(
+            sorted(os.listdir(self.source_dir)), self.file_names
+        )
@@ -0,0 +1,40 @@
+import time
+import unittest
+
+from src.utils import throd
+
+
+def _at(hour, minute):
+    return time.mktime((2014, 3, 10, hour, minute, 0, 0, 0, -1))
+
+
+class TestBandwidthSchedule(unittest.TestCase):
+
+    schedule = '08:00-18:00=256, 18:00-01:00=0, 03:00-04:00=64'
+
+    def test_parse(self):
+        self.assertEqual(
+            throd.parse_schedule(self.schedule + ', bad'),
+            [(480, 1080, 256), (1080, 60, 0), (180, 240, 64)]
+        )
+
+    def test_scheduled_rate(self):
+        entries = throd.parse_schedule(self.schedule)
+
+        self.assertEqual(throd.scheduled_rate(entries, _at(9, 30)), 256)
+        self.assertEqual(throd.scheduled_rate(entries, _at(3, 0)), 64)
+
+        # Unlimited, past midnight, and not covered.
+        self.assertIsNone(throd.scheduled_rate(entries, _at(0, 30)))
+        self.assertIsNone(throd.scheduled_rate(entries, _at(2, 0)))
+
+    def test_lowest_rate_wins(self):
+        bucket = throd.TokenBucket(rate=100, schedule='00:00-23:59=50')
+        self.assertEqual(bucket.rate(_at(12, 0)), 50000)
+
+        bucket.set_rate(20)
+        self.assertEqual(bucket.rate(_at(12, 0)), 20000)
+
+        bucket.set_schedule('')
+        bucket.set_rate(0)
+        self.assertIsNone(bucket.rate(_at(12, 0)))
@@ -0,0 +1,171 @@
+import os
+import unittest
+
+from plugins.patching.distro.redhat import yumtransaction
+from plugins.patching.patchingsofoperation import InstallData, \
+    attribute_changes
+
+# The yum package, and so rpmhandler, exits the agent on import without yum.
+_has_yum = os.path.exists('/usr/bin/yum')
+
+
+# yum 3, EL7
+_yum_output = """\
+Resolving Dependencies
+--> Running transaction check
+---> Package glibc.i686 0:2.17-317.el7 will be updated
+---> Package glibc.i686 0:2.17-326.el7_9 will be an update
+---> Package glibc.x86_64 0:2.17-317.el7 will be updated
+---> Package glibc.x86_64 0:2.17-326.el7_9 will be an update
+---> Package bash.x86_64 0:4.2.46-34.el7 will be updated
+---> Package bash.x86_64 0:4.2.46-35.el7_9 will be an update
+--> Finished Dependency Resolution
+Running transaction
+  Updating   : glibc-common-2.17-326.el7_9.x86_64                    1/8
+  Cleanup    : bash-4.2.46-34.el7.x86_64                             8/8
+
+Updated:
+  bash.x86_64 0:4.2.46-35.el7_9        glibc.i686 0:2.17-326.el7_9
+  glibc.x86_64 0:2.17-326.el7_9
+
+Dependency Updated:
+  glibc-common.x86_64 0:2.17-326.el7_9
+
+Complete!
+"""
+
+# dnf, EL9
+_dnf_output = """\
+Dependencies resolved.
+Running transaction
+  Upgrading        : openssl-libs-1:3.0.7-24.el9.x86_64                  1/4
+  Cleanup          : openssl-libs-1:3.0.7-6.el9_2.x86_64                 4/4
+
+Upgraded:
+  openssl-1:3.0.7-24.el9.x86_64     openssl-libs-1:3.0.7-24.el9.x86_64
+Installed:
+  kernel-core-5.14.0-362.8.1.el9_3.x86_64
+
+Complete!
+"""
+
+_nothing_output = """\
+No package nosuch available.
+Error: Nothing to do
+"""
+
+
+class _FakeCmds():
+
+    def __init__(self, output):
+        self.output = output
+
+    def run_command(self, cmd):
+        return self.output, ''
+
+
+def _fake_rpm_handler(output, apps_to_add):
+    """An RpmOpHandler running _yum_transaction against a canned output."""
+
+    from plugins.patching.operationhandler.rpmhandler import RpmOpHandler
+
+    class _FakeRpmOpHandler(RpmOpHandler):
+
+        def __init__(self):
+            self.utilcmds = _FakeCmds(output)
+            self.serial = []
+
+        def _get_inventory_mark(self):
+            return None, {}
+
+        def _get_apps_to_add_and_delete(self, inventory_mark):
+            return apps_to_add, []
+
+        def serial_install(self, install_data):
+            self.serial.append(install_data.name)
+            return 'serial'
+
+    return _FakeRpmOpHandler()
+
+
+def _install_data(name):
+    install_data = InstallData()
+    install_data.name = name
+    install_data.id = name + '-id'
+
+    return install_data
+
+
+class TestYumTransaction(unittest.TestCase):
+
+    # (output, names installed)
+    transcripts = [
+        (_yum_output, set(['bash', 'glibc', 'glibc-common'])),
+        (_dnf_output, set(['openssl', 'openssl-libs', 'kernel-core'])),
+        (_nothing_output, set()),
+    ]
+
+    def test_parse(self):
+        for output, names in self.transcripts:
+            self.assertEqual(yumtransaction.parse(output), names)
+
+    def test_attribute_changes(self):
+        apps = [{'name': 'bash'}, {'name': 'glibc'}, {'name': 'glibc-common'}]
+        requested = set(['bash', 'glibc', 'zsh'])
+
+        # (name, first_success, names attributed)
+        cases = [
+            ('bash', 'bash', ['bash', 'glibc-common']),
+            ('glibc', 'bash', ['glibc']),
+            ('zsh', 'bash', []),
+            ('zsh', None, []),
+        ]
+
+        for name, first_success, names in cases:
+            self.assertEqual(
+                [app['name'] for app in
+                 attribute_changes(apps, name, requested, first_success)],
+                names
+            )
+
+    @unittest.skipUnless(_has_yum, 'needs yum')
+    def test_transaction(self):
+        handler = _fake_rpm_handler(
+            _yum_output,
+            [{'name': 'bash'}, {'name': 'glibc'}, {'name': 'glibc-common'}]
+        )
+
+        results = handler._yum_transaction(
+            [_install_data('zsh'), _install_data('bash'),
+             _install_data('glibc')],
+            ['update', '-y', 'zsh', 'bash', 'glibc'],
+            handler.serial_install
+        )
+
+        self.assertEqual(handler.serial, [])
+        self.assertEqual(results['zsh-id'].successful, 'false')
+        self.assertEqual(results['bash-id'].successful, 'true')
+        self.assertEqual(results['bash-id'].app_json, {'name': 'bash'})
+        self.assertEqual(
+            [app['name'] for app in results['bash-id'].apps_to_add],
+            ['bash', 'glibc-common']
+        )
+        self.assertEqual(
+            [app['name'] for app in results['glibc-id'].apps_to_add],
+            ['glibc']
+        )
+
+    @unittest.skipUnless(_has_yum, 'needs yum')
+    def test_transaction_one_at_a_time(self):
+        handler = _fake_rpm_handler(_nothing_output, [])
+
+        results = handler._yum_transaction(
+            [_install_data('nosuch'), _install_data('bash')],
+            ['update', '-y', 'nosuch', 'bash'],
+            handler.serial_install
+        )
+
+        self.assertEqual(handler.serial, ['nosuch', 'bash'])
+        self.assertEqual(
+            results, {'nosuch-id': 'serial', 'bash-id': 'serial'}
+        )